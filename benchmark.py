@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+
+import os, sys, time, io, struct, resource, json, argparse, contextlib
+
+from PIL import Image
+
+import jpgfolder2kml
+
+'''
+    Benchmark for jpgfolder2kml - no real flight images needed.
+
+    Generates synthetic drone jpg files (realistic exif gps block, dji / autel xmp packet) into folder tree,
+    then times each stage separately and reports images per second and peak memory (RSS):
+        walk                    listing of folder tree (jpg files, scandir walker)
+        exif_dict_from_file     exif + xmp reading and parsing
+        get_usefuldetail        details from exif (includes exif_dict_from_file), no frame
+        get_usefuldetail prefetch   same, with jpg headers read ahead in threads (--prefetch)
+        ImageTable              image detail dicts of folder to columns (numpy arrays), sorted by time
+        make_frameonground      ground frames for all images (numpy batch; geopy reference on sample; dem - over synthetic terrain)
+        flight segments         per-image legs (distance, azimuth, speed, climb), split to flights, flight stats
+        list_to_kml             kml file per folder, then size / write / parse time of kml, --compact, --precision 5, --kmz output
+        list_to_fgb             FlatGeobuf files per folder (--fgb: camera points, ground frames, flight lines), then their size
+        catalog_add             images to sqlite catalog (--catalog-copies times), then point / bbox / time query ms
+        write_kml_index         final set_of_N_files.kml
+        process_tree            whole run as script does it (pipelined walk / parse / kml, with --workers), without opening google earth
+        cold start              python start + import of jpgfolder2kml, and script --help (no image processing)
+
+    usage:
+        python3 benchmark.py --images 10000
+        python3 benchmark.py --images 100000 --folders 50 --workers 8 --json bench.json
+        python3 benchmark.py --keep /tmp/bench_images     (generated images are kept and reused next time)
+        python3 benchmark.py --images 2000 --latency-ms 5 --prefetch 16     (slow media stand-in, shows prefetch gain)
+
+    image mix (by index): FC7303 (dji mini2, gimbal pitch always 0), FC3582 (dji with gimbal pitch),
+    XL801 (autel 4T, own xmp tags), dji without gimbal tags, and some files without gps (must be rejected).
+    autel xmp layout approximates real files - only tags used by get_usefuldetail are important.
+'''
+
+
+# ================ SYNTHETIC JPG GENERATOR ===================
+
+MODELS = ['FC7303', 'FC3582', 'XL801', 'FC7303-nogimbal', 'FC3582', 'FC7303']
+NO_GPS_EVERY = 50 # every Nth file has no gps block
+
+def dji_xmp(model, i, lat, lon, gimbal=True):
+    yaw = (i * 7) % 360 - 180
+    gimbal_xml = ''
+    if gimbal:
+        gimbal_pitch = '+0.00' if model == 'FC7303' else f'-{30 + i % 60}.50' # mini2 does not report gimbal pitch
+        gimbal_xml = f'''
+   drone-dji:GimbalRollDegree="+0.00"
+   drone-dji:GimbalYawDegree="{yaw + 0.3:+.2f}"
+   drone-dji:GimbalPitchDegree="{gimbal_pitch}"'''
+    return f'''<?xpacket begin="﻿" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about="DJI Meta Data"
+    xmlns:tiff="http://ns.adobe.com/tiff/1.0/"
+    xmlns:exif="http://ns.adobe.com/exif/1.0/"
+    xmlns:xmp="http://ns.adobe.com/xap/1.0/"
+    xmlns:xmpMM="http://ns.adobe.com/xap/1.0/mm/"
+    xmlns:dc="http://purl.org/dc/elements/1.1/"
+    xmlns:crs="http://ns.adobe.com/camera-raw-settings/1.0/"
+    xmlns:drone-dji="http://www.dji.com/drone-dji/1.0/"
+   xmp:ModifyDate="2023-05-01"
+   xmp:CreateDate="2023-05-01"
+   tiff:Make="DJI"
+   tiff:Model="{model}"
+   dc:format="image/jpg"
+   drone-dji:Version="1.0"
+   drone-dji:GpsLatitude="{lat:.8f}"
+   drone-dji:GpsLongitude="{lon:+.8f}"
+   drone-dji:AbsoluteAltitude="{150 + i % 40:+.2f}"
+   drone-dji:RelativeAltitude="{50 + i % 40:+.2f}"{gimbal_xml}
+   drone-dji:FlightRollDegree="+1.20"
+   drone-dji:FlightYawDegree="{yaw:+.2f}"
+   drone-dji:FlightPitchDegree="-2.30"
+   crs:Version="7.0"
+   crs:HasSettings="False"
+   crs:HasCrop="False"
+   crs:AlreadyApplied="False">
+   <xmpMM:DocumentID>xmp.did:{i:08x}-0000-0000-0000-000000000000</xmpMM:DocumentID>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>'''
+
+def autel_xmp(i, lat, lon):
+    return f'''<?xpacket begin="﻿" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about=""
+    xmlns:tiff="http://ns.adobe.com/tiff/1.0/"
+    xmlns:Camera="http://pix4d.com/camera/1.0/"
+    xmlns:drone="http://www.autelrobotics.com/drone/1.0/"
+   tiff:Make="Autel Robotics"
+   tiff:Model="XL801"
+   Camera:Yaw="{(i * 7) % 360:.2f}"
+   Camera:Pitch="-{20 + i % 60}.40"
+   Camera:Roll="0.00"
+   drone:AboveGroundAltitude="{130 + i % 40:.2f}"
+   drone:LRFTargetDistance="{100 + i % 50:.2f}"
+   drone:LRFTargetLon="{lon:.8f}"
+   drone:LRFTargetLat="{lat:.8f}"
+   drone:LRFTargetAbsAlt="{20 + i % 5:.2f}"/>
+ </rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>'''
+
+def exif_bytes(model, i, lat, lon, gps=True):
+    def dms(value):
+        d = int(value); m = int((value - d) * 60); s = ((value - d) * 60 - m) * 60
+        return (float(d), float(m), round(s, 4))
+    exif = Image.Exif()
+    exif[0x010F] = 'Autel Robotics' if model == 'XL801' else 'DJI' # Make
+    exif[0x0110] = model # Model
+    exif[0x0132] = f'2023:05:{1 + i // 20000:02d} {8 + (i // 3600) % 10:02d}:{(i // 60) % 60:02d}:{i % 60:02d}' # DateTime
+    exif[0x8769] = { # exif ifd
+        0x829A: 1 / 500, # ExposureTime
+        0x829D: 2.8, # FNumber
+        0x8827: 100, # ISO
+        0x9003: exif[0x0132], # DateTimeOriginal
+        0x920A: 4.49, # FocalLength
+        0xA002: 8000 if model == 'XL801' else 4000, # ExifImageWidth
+        0xA003: 6000 if model == 'XL801' else 3000, # ExifImageHeight
+        0xA404: 1.0 + (i % 4) * 0.5, # DigitalZoomRatio
+        0xA405: 26 if model == 'XL801' else 24, # FocalLengthIn35mmFilm
+    }
+    if gps:
+        exif[0x8825] = {0: b'\x02\x03\x00\x00', 1: 'N' if lat >= 0 else 'S', 2: dms(abs(lat)),
+                        3: 'E' if lon >= 0 else 'W', 4: dms(abs(lon)), 5: b'\x00', 6: 150.0 + i % 40}
+    return exif.tobytes()
+
+def jpeg_body(width, height, quality=85):
+    # compressed image data, made once and reused for all files (without SOI marker)
+    image = Image.effect_noise((width, height), 40).convert('RGB')
+    b = io.BytesIO()
+    image.save(b, 'JPEG', quality=quality)
+    return b.getvalue()[2:]
+
+def app_segment(marker, payload):
+    return b'\xff' + bytes([marker]) + struct.pack('>H', len(payload) + 2) + payload
+
+def make_synthetic_jpeg(path, i, body, filler=b''):
+    model = MODELS[i % len(MODELS)]
+    gimbal = not model.endswith('-nogimbal')
+    model = model.replace('-nogimbal', '')
+    lat = 56.95 + (i % 5000) * 0.00002 + (i // 5000) * 0.01
+    lon = 24.10 + ((i * 37) % 400) * 0.00003
+    gps = i % NO_GPS_EVERY != NO_GPS_EVERY - 1
+
+    xmp = autel_xmp(i, lat, lon) if model == 'XL801' else dji_xmp(model, i, lat, lon, gimbal)
+    data = (b'\xff\xd8'
+            + app_segment(0xE1, b'Exif\x00\x00' + exif_bytes(model, i, lat, lon, gps))
+            + app_segment(0xE1, b'http://ns.adobe.com/xap/1.0/\x00' + xmp.encode())
+            + (app_segment(0xE4, filler) if filler else b'') # dji puts own data into app segments, makes header bigger
+            + body)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def generate_dem(root):
+    # SRTM3 like .hgt tiles (rolling hills, 0-150m) under generated images, in bench_dem folder
+    import numpy
+    dem_folder = os.path.join(root, 'bench_dem')
+    os.makedirs(dem_folder, exist_ok=True)
+    size = 1201
+    for south in (56, 57):
+        lat = (south + 1 - numpy.arange(size) / (size - 1))[:, None]
+        lon = (24 + numpy.arange(size) / (size - 1))[None, :]
+        heights = 75 + 40 * numpy.sin(lat * 300) + 35 * numpy.cos(lon * 250)
+        heights.astype('>i2').tofile(os.path.join(dem_folder, f'N{south}E024.hgt'))
+    return dem_folder
+
+def generate_tree(root, images, folders, width, height, header_filler_kb):
+    # images are spread over folders (root and subfolders), file names as from dji
+    body = jpeg_body(width, height)
+    filler = os.urandom(header_filler_kb * 1024) if header_filler_kb else b''
+    per_folder = -(-images // folders)
+    for i in range(images):
+        folder = root if i // per_folder == 0 else os.path.join(root, f'{100 + i // per_folder}MEDIA')
+        if i % per_folder == 0: os.makedirs(folder, exist_ok=True)
+        make_synthetic_jpeg(os.path.join(folder, f'DJI_{i % per_folder:04d}.JPG'), i, body, filler)
+
+
+# ================ STAGE TIMING ===================
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # linux reports ru_maxrss in kilobytes. for RUSAGE_CHILDREN it is the biggest worker process
+    return resource.getrusage(who).ru_maxrss / 1024
+
+class Stages:
+    def __init__(self):
+        self.results = []
+
+    def run(self, name, images, function):
+        # images can be function of stage result (when count is known only after stage)
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        ret = function()
+        wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+        if callable(images): images = images(ret)
+        self.results.append({'stage': name, 'images': images, 'wall_s': round(wall, 4), 'cpu_s': round(cpu, 4),
+                             'images_per_s': round(images / wall, 1) if wall else None, 'peak_rss_mb': round(peak_rss_mb(), 1),
+                             'peak_rss_worker_mb': round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1)})
+        print(f"{name:28} {images:8} images {wall:8.3f}s wall {cpu:8.3f}s cpu {images / wall if wall else 0:10.1f} img/s  peak rss {peak_rss_mb():7.1f} MB")
+        return ret
+
+class SlowOpen:
+    # stand-in for slow media (network share, card reader): open that waits latency_ms first.
+    # sleep releases gil as real io does, so waits of prefetch threads overlap the same way.
+    # class, not closure - it is pickled to worker processes (see jpgfolder2kml.start_worker_pool)
+    def __init__(self, latency_ms):
+        self.latency_ms = latency_ms
+
+    def __call__(self, *args, **kwargs):
+        import builtins
+        time.sleep(self.latency_ms / 1000)
+        return builtins.open(*args, **kwargs)
+
+def throttle_opens(latency_ms):
+    # every file open in jpgfolder2kml (and its worker processes) waits latency_ms
+    jpgfolder2kml.open = SlowOpen(latency_ms)
+
+def walk_tree(root):
+    folders = []
+    for folder, jpg_entries in jpgfolder2kml.walk_folders(root):
+        if jpg_entries: folders.append((folder, [filename for full_path, filename, size, mtime_ns in jpg_entries]))
+    return folders
+
+def benchmark(root, args):
+    stages = Stages()
+    folders = stages.run('walk', lambda folders: sum(len(jpgs) for folder, jpgs in folders), lambda: walk_tree(root))
+    files = [(os.path.join(folder, f), f) for folder, jpgs in folders for f in jpgs]
+    print(f"   {len(files)} images in {len(folders)} folders")
+
+    def exif_all():
+        ok = 0
+        for full_path, filename in files:
+            try:
+                jpgfolder2kml.exif_dict_from_file(full_path)
+                ok += 1
+            except Exception:
+                pass
+        return ok
+    stages.run('exif_dict_from_file', len(files), exif_all)
+
+    def details_all():
+        details_by_folder = []
+        for folder, jpgs in folders:
+            details_list = [jpgfolder2kml.get_usefuldetail_with_stats((os.path.join(folder, f), f))[0] for f in jpgs]
+            details_by_folder.append((folder, [d for d in details_list if isinstance(d, dict)]))
+        return details_by_folder
+    details_by_folder = stages.run('get_usefuldetail', len(files), details_all)
+
+    jpgfolder2kml.PREFETCH = args.prefetch
+    def details_prefetch_all():
+        for folder, jpgs in folders:
+            jpgfolder2kml.get_usefuldetail_list_with_stats([(os.path.join(folder, f), f) for f in jpgs])
+    if args.prefetch: stages.run('get_usefuldetail prefetch', len(files), details_prefetch_all)
+    all_details = [d for folder, details_list in details_by_folder for d in details_list]
+
+    tables = stages.run('ImageTable', len(all_details), lambda: [(folder, jpgfolder2kml.ImageTable(details_list).sorted_by_datetime()) for folder, details_list in details_by_folder])
+    stages.run('make_frameonground', len(all_details), lambda: [jpgfolder2kml.make_frameonground_batch(table) for folder, table in tables])
+    dem_folder = generate_dem(root)
+    def frames_dem_all():
+        jpgfolder2kml.DEM = dem_folder
+        for folder, table in tables: jpgfolder2kml.make_frameonground_batch(table)
+        jpgfolder2kml.DEM = jpgfolder2kml.DEM_RASTERS = None
+    stages.run('make_frameonground dem', len(all_details), frames_dem_all)
+    for folder, table in tables: jpgfolder2kml.make_frameonground_batch(table) # flat frames again for kml stages
+    sample = [dict(d) for d in all_details[:args.geopy_sample]]
+    stages.run('make_frameonground geopy', len(sample), lambda: [jpgfolder2kml.make_frameonground(d) for d in sample])
+
+    def flights_all():
+        for folder, table in tables:
+            legs = table.legs()
+            [jpgfolder2kml.flight_summary(table, legs, start, stop) for start, stop in jpgfolder2kml.flight_segments(legs)]
+    stages.run('flight segments', len(all_details), flights_all)
+
+    jpgfolder2kml.global_kml_list.clear()
+    jpgfolder2kml.folder_path = root
+    def kml_all():
+        for folder, table in tables:
+            jpgfolder2kml.list_to_kml(table, folder)
+    stages.run('list_to_kml', len(all_details), kml_all)
+    stages.run('list_to_fgb', len(all_details), lambda: [jpgfolder2kml.list_to_fgb(table, folder) for folder, table in tables])
+    format_results = kml_formats([table for folder, table in tables])
+    stages.run('write_kml_index', len(all_details), jpgfolder2kml.write_kml_index)
+
+    # catalog of folders added catalog_copies times (as flights of other days and areas), then point / bbox / time queries
+    catalog_path = os.path.join(root, 'bench_catalog.sqlite')
+    if os.path.exists(catalog_path): os.remove(catalog_path)
+    copies = [[(f'{folder}_{copy}', shifted_copy(table, copy)) for folder, table in tables] for copy in range(args.catalog_copies)]
+    def catalog_all():
+        connection = jpgfolder2kml.open_catalog(catalog_path)
+        for copy_tables in copies:
+            for folder, table in copy_tables:
+                jpgfolder2kml.catalog_add(connection, folder, table)
+        connection.close()
+    stages.run('catalog_add', len(all_details) * args.catalog_copies, catalog_all)
+    query_results = catalog_queries(catalog_path, [table for copy_tables in copies for folder, table in copy_tables], args.catalog_queries)
+    del copies
+    os.remove(catalog_path)
+    del details_by_folder, all_details, sample, tables
+
+    # whole run, as script does it (images are parsed again - cache is off)
+    options = jpgfolder2kml.Options(workers=args.workers, prefetch=args.prefetch, use_cache=False)
+    def run_all():
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull): # per file lines
+            jpgfolder2kml.process_tree(root, options)
+    stages.run('process_tree', len(files), run_all)
+    return stages.results, query_results, format_results
+
+def kml_formats(tables):
+    # size, write time, parse time (xml parser reading whole document - stand-in for google earth load time) and
+    # feature count (Folder and Placemark elements, google earth builds a tree node for each) of kml output options
+    import tempfile, zipfile, xml.etree.ElementTree as ElementTree
+    formats = {'kml': {}, 'compact': {'COMPACT': True}, 'compact precision 5': {'COMPACT': True, 'COORDINATE_PRECISION': 5}, 
+               'compact kmz': {'COMPACT': True, 'KMZ': True}}
+    defaults = {setting: getattr(jpgfolder2kml, setting) for setting in ('COMPACT', 'COORDINATE_PRECISION', 'KMZ')}
+    results = {}
+    for name, settings in formats.items():
+        with tempfile.TemporaryDirectory(prefix='jpgfolder2kml_format_') as out:
+            vars(jpgfolder2kml).update(settings)
+            start = time.perf_counter()
+            files = [jpgfolder2kml.list_to_kml(table, out) for table in tables]
+            write = time.perf_counter() - start
+            vars(jpgfolder2kml).update(defaults)
+            size = sum(os.path.getsize(path) for path in files)
+            start, features = time.perf_counter(), 0
+            for path in files:
+                if path.endswith('.kmz'):
+                    with zipfile.ZipFile(path) as kmz: root = ElementTree.fromstring(kmz.read('doc.kml'))
+                else:
+                    root = ElementTree.parse(path).getroot()
+                features += sum(1 for element in root.iter() if element.tag.endswith(('}Folder', '}Placemark')))
+            parse = time.perf_counter() - start
+        results[name] = {'bytes': size, 'write_s': round(write, 4), 'parse_s': round(parse, 4), 'features': features}
+        print(f"kml format {name:29} {size / 1e6:8.2f} MB  write {write:7.3f}s  parse {parse:7.3f}s  features {features:7}")
+    with tempfile.TemporaryDirectory(prefix='jpgfolder2kml_format_') as out:
+        start = time.perf_counter()
+        files = [path for table in tables for path in jpgfolder2kml.list_to_fgb(table, out)]
+        write = time.perf_counter() - start
+        size = sum(os.path.getsize(path) for path in files)
+    results['fgb'] = {'bytes': size, 'write_s': round(write, 4)}
+    print(f"fgb (images, frames, flights)       {size / 1e6:8.2f} MB  write {write:7.3f}s")
+    return results
+
+def shifted_copy(table, copy):
+    # ImageTable moved by copy days and to other area (0.1 degree steps, 100 areas per row)
+    import numpy
+    if not copy: return table
+    shifted = table.take(range(len(table)))
+    offset = numpy.array((0.1 * (copy % 100), 0.1 * (copy // 100), 0))
+    shifted.lon_lat_alt = table.lon_lat_alt + offset
+    shifted.frameonground = table.frameonground + offset
+    days = {date: str(numpy.datetime64(date.replace(':', '-')) + copy).replace('-', ':') for date in set(dt[:10] for dt in table.DateTime)}
+    shifted.DateTime = [days[dt[:10]] + dt[10:] for dt in table.DateTime]
+    return shifted
+
+def catalog_queries(catalog_path, tables, count):
+    # ms per query (average of count), at frame centres of random images. time range is one hour around image
+    import random
+    random.seed(1)
+    picks = [(table, random.randrange(len(table))) for table in random.choices([table for table in tables if len(table)], k=count)]
+    queries = {
+        'point': lambda table, i: {'point': tuple(table.frameonground[i, 0, :2].tolist())},
+        'bbox 1km': lambda table, i: {'bbox': tuple((table.frameonground[i, 0, :2] + (-0.01, -0.005)).tolist() + (table.frameonground[i, 0, :2] + (0.01, 0.005)).tolist())},
+        'time 1h': lambda table, i: {'time_range': (table.seconds()[i] - 1800, table.seconds()[i] + 1800)},
+    }
+    results = {}
+    for name, query in queries.items():
+        arguments = [query(table, i) for table, i in picks]
+        found = 0
+        start = time.perf_counter()
+        for kwargs in arguments:
+            found += len(jpgfolder2kml.catalog_query(catalog_path, **kwargs))
+        results[name] = {'ms': round((time.perf_counter() - start) * 1000 / len(arguments), 3), 'images_found': round(found / len(arguments), 1)}
+        print(f"catalog query {name:26} {results[name]['ms']:8.3f} ms  {results[name]['images_found']:10.1f} images found (average of {len(arguments)})")
+    return results
+
+def cold_start_ms(command, runs=5):
+    # best of runs, ms - python start, imports and module code, as when folder is dropped on script
+    import subprocess
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + command, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return round(min(times), 1)
+
+def cold_start():
+    script_dir = os.path.dirname(os.path.abspath(jpgfolder2kml.__file__))
+    results = {'python': cold_start_ms(['-c', 'pass']),
+               'import jpgfolder2kml': cold_start_ms(['-c', f'import sys; sys.path.insert(0, {script_dir!r}); import jpgfolder2kml']),
+               'jpgfolder2kml.py --help': cold_start_ms([os.path.join(script_dir, 'jpgfolder2kml.py'), '--help'])}
+    for name, ms in results.items(): print(f"cold start {name:28} {ms:8.1f} ms")
+    return results
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Benchmark jpgfolder2kml stages on synthetic drone images')
+    arg_parser.add_argument('--images', type=int, default=5000, help='number of images to generate')
+    arg_parser.add_argument('--folders', type=int, default=5, help='images are spread over this many folders')
+    arg_parser.add_argument('--width', type=int, default=640, help='pixels of generated image data (reported exif size is always 4000x3000 or 8000x6000)')
+    arg_parser.add_argument('--height', type=int, default=480)
+    arg_parser.add_argument('--header-filler-kb', type=int, default=16, help='extra app segment, real dji headers are 20-60KB')
+    arg_parser.add_argument('--workers', type=int, default=1, help='workers for process_tree stage')
+    arg_parser.add_argument('--prefetch', type=int, default=16, help='headers read ahead for prefetch stage and process_tree, 0 = off')
+    arg_parser.add_argument('--latency-ms', type=float, default=0, help='slow media stand-in: delay of every file open while benchmarking')
+    arg_parser.add_argument('--geopy-sample', type=int, default=200, help='images for geopy reference make_frameonground stage')
+    arg_parser.add_argument('--catalog-copies', type=int, default=1, help='images are added to catalog this many times (catalog of millions of rows from fewer images)')
+    arg_parser.add_argument('--catalog-queries', type=int, default=200, help='queries of each kind timed on catalog')
+    arg_parser.add_argument('--keep', help='generate images into this folder and keep them (reused if it exists)')
+    arg_parser.add_argument('--json', help='write results to this json file')
+    args = arg_parser.parse_args()
+
+    import tempfile
+    tmp = None
+    root = args.keep
+    if not root:
+        tmp = tempfile.TemporaryDirectory(prefix='jpgfolder2kml_bench_')
+        root = tmp.name
+    if not os.path.isdir(root) or not os.listdir(root):
+        start = time.perf_counter()
+        generate_tree(root, args.images, args.folders, args.width, args.height, args.header_filler_kb)
+        print(f"generated {args.images} images in {time.perf_counter() - start:.1f}s into {root}")
+
+    if args.latency_ms: throttle_opens(args.latency_ms)
+    results, query_results, format_results = benchmark(root, args)
+    cold_start_results = cold_start()
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'stages': results, 'catalog_query': query_results, 'kml_formats': format_results, 'cold_start_ms': cold_start_results}, f, indent=2)
+    if tmp: tmp.cleanup()
@@ -1,20 +1,9 @@
 #!/usr/bin/env python3
 
-import os, sys, platform, subprocess, math, re, mmap, time
+import os, sys, math, re, time, copy, contextlib, heapq, threading, queue
 
-import psutil
-import numpy
-from pprint import pprint
-
-from PIL import Image
-from PIL.ExifTags import TAGS, GPSTAGS
-
-import lxml.etree as ET
-
-parser = ET.XMLParser(remove_blank_text=True)
-
-from geopy.distance import geodesic, distance
-from geopy import Point
+# heavy modules (numpy, PIL, lxml, geopy, psutil) are imported in functions that use them:
+# script starts fast, and importing it as library (see process_tree) does not load what is not used
 
 ''' 
     2023-05 creator notes
@@ -33,7 +22,7 @@ from geopy import Point
         1) exif is used for date and gps information.
             it is converted to dictionary with exif-key converted to text key. 
         2) xmp is used for yaw data. 
-            xmp is not read by regular exif extraction - using file search here. 
+            xmp is not read by regular exif extraction - reading jpg APP1 segments here (file search for odd files). 
             xmp is "flattened" - all elements are in dictionary root, not cascaded down
             xmp key names are shortened only to include related name
         3) note that gimbalpitch is not availalbe in dji mini 2 data; this is dji intentional decision; 
@@ -42,12 +31,173 @@ from geopy import Point
     2025-05 changed:
         added autel 4T specific tag processing. (altitude, pitch, azimuth, zoom)
 
+    2026 changed:
+        exif and xmp are read from jpg header only (segments before image data, usually <64KB), 
+            not from whole file. full file read is kept as fallback for odd files.
+        kml is written to file as text while generated, not built as xml tree in memory.
+        can be used as library (process_tree, see LIBRARY API), heavy modules are imported when first used.
+
 '''
 
 
 # ================ JPG FILE PARSER ===================
 
+class NotSuitableImage(Exception):
+    # image has no data needed for kml. message is error category (in run report, see --report)
+    pass
+
+JPEG_HEADER_READ_SIZE = 64 * 1024 # first read, drone jpg metadata (exif+xmp+thumbnail) usually fits
+JPEG_HEADER_MAX_SIZE = 1024 * 1024 # if metadata part is bigger than this - file is odd, use full file path
+
+def read_jpeg_header(file_path):
+    # returns bytes of jpg from start of file up to start-of-scan marker (all APPn segments)
+    # reads only what is needed, not whole 10-20MB file. returns None if file does not look as expected
+    if PREFETCHER:
+        prefetched = PREFETCHER.take(file_path)
+        if prefetched:
+            header, bytes_read = prefetched
+            FILE_STATS['bytes_read'] = FILE_STATS.get('bytes_read', 0) + bytes_read
+            return header
+    with open(file_path, 'rb') as file:
+        try:
+            return jpeg_header_from_file(file)
+        finally:
+            FILE_STATS['bytes_read'] = FILE_STATS.get('bytes_read', 0) + file.tell()
+
+def jpeg_header_from_file(file):
+    buf = file.read(JPEG_HEADER_READ_SIZE)
+    if buf[:2] != b'\xff\xd8': return None
+    pos = 2
+    while True:
+        if pos + 4 > len(buf):
+            more = file.read(JPEG_HEADER_READ_SIZE)
+            if not more: return None # end of file before image data
+            buf += more
+            continue
+        if buf[pos] != 0xFF: return None # lost sync, not a marker
+        marker = buf[pos+1]
+        if marker == 0xFF: # fill byte
+            pos += 1
+            continue
+        if marker == 0xDA: # start of scan - compressed image data follows, metadata is over
+            return buf[:pos]
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01: # markers without length
+            pos += 2
+            continue
+        segment_end = pos + 2 + int.from_bytes(buf[pos+2:pos+4], 'big')
+        if segment_end > JPEG_HEADER_MAX_SIZE: return None
+        if segment_end + 4 > len(buf):
+            more = file.read(max(segment_end + 4 - len(buf), JPEG_HEADER_READ_SIZE))
+            if not more: return None
+            buf += more
+            continue
+        pos = segment_end
+
+def prefetch_jpeg_header(file_path):
+    # runs in prefetch thread. returns (header, bytes read)
+    with open(file_path, 'rb') as file:
+        if hasattr(os, 'posix_fadvise'): # os starts reading header while open/read calls go
+            os.posix_fadvise(file.fileno(), 0, JPEG_HEADER_READ_SIZE, os.POSIX_FADV_WILLNEED)
+        header = jpeg_header_from_file(file)
+        return header, file.tell()
+
+class HeaderPrefetcher:
+    # reads jpg headers of next files in threads, while current file is parsed (see --prefetch).
+    # on card readers and network shares most of time is waiting for open/read - with many reads at once waits overlap.
+    # at most `depth` headers are read ahead, files must be taken in given order (not taken are skipped)
+    def __init__(self, file_paths, depth):
+        import concurrent.futures, collections
+        self.executor = concurrent.futures.ThreadPoolExecutor(depth, thread_name_prefix='prefetch')
+        self.file_paths = iter(file_paths)
+        self.pending = collections.deque()
+        for i in range(depth): self.submit_next()
+
+    def submit_next(self):
+        file_path = next(self.file_paths, None)
+        if file_path is not None:
+            self.pending.append((file_path, self.executor.submit(prefetch_jpeg_header, file_path)))
+
+    def take(self, file_path):
+        # returns (header, bytes read), or None if file is not prefetched or read failed (caller reads it again, gets error)
+        while self.pending:
+            pending_path, future = self.pending.popleft()
+            self.submit_next()
+            if pending_path == file_path:
+                try:
+                    return future.result()
+                except OSError:
+                    return None
+        return None
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+@contextlib.contextmanager
+def prefetching(file_paths):
+    # headers of file_paths are read ahead while inside `with` (if --prefetch is on)
+    global PREFETCHER
+    if PREFETCH <= 0 or len(file_paths) < 2:
+        yield
+        return
+    PREFETCHER = HeaderPrefetcher(file_paths, PREFETCH)
+    try:
+        yield
+    finally:
+        PREFETCHER.close()
+        PREFETCHER = None
+
+NETWORK_FILESYSTEMS = {'unc', 'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'fuse.sshfs', 'fuse.rclone', '9p', 'afs', 'ceph', 'glusterfs', 'davfs', 'fuse.gvfsd-fuse'}
+REMOVABLE_FILESYSTEMS = {'vfat', 'msdos', 'exfat', 'fuseblk', 'ntfs', 'ntfs3'} # sd cards, usb drives
+
+def filesystem_type(folder_path):
+    # filesystem of folder from /proc/mounts ('ext4', 'nfs', 'vfat' ...), 'unc' for windows network path, '' if not known
+    folder_path = os.path.realpath(folder_path)
+    if folder_path.startswith('\\\\'): # windows unc path \\server\share
+        return 'unc'
+    fs_type, mount_len = '', -1
+    try:
+        with open('/proc/mounts') as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) < 3: continue
+                mount_point = fields[1].replace('\\040', ' ')
+                if (folder_path == mount_point or folder_path.startswith(mount_point.rstrip('/') + '/')) and len(mount_point) > mount_len:
+                    fs_type, mount_len = fields[2], len(mount_point)
+    except OSError: # not linux
+        pass
+    return fs_type
+
+def default_prefetch(folder_path):
+    # prefetch depth for folder: off for local disk (ssd - reading ahead only adds thread overhead),
+    # on for network share and usb/sd card filesystems (where every open/read waits for device or network)
+    fs_type = filesystem_type(folder_path)
+    if fs_type in NETWORK_FILESYSTEMS: return PREFETCH_NETWORK
+    if fs_type in REMOVABLE_FILESYSTEMS: return PREFETCH_REMOVABLE
+    return 0
+
+def parse_jpeg_header(header):
+    # returns (exif_bytes, xmp_bytes) from APP1 segments of jpg header (see read_jpeg_header)
+    exif_bytes, xmp_bytes = None, None
+    pos = 2
+    while pos + 4 <= len(header):
+        marker = header[pos+1]
+        if marker == 0xFF or 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            pos += 1 if marker == 0xFF else 2
+            continue
+        segment_end = pos + 2 + int.from_bytes(header[pos+2:pos+4], 'big')
+        if marker == 0xE1: 
+            payload = header[pos+4:segment_end]
+            if exif_bytes is None and payload.startswith(b'Exif\x00\x00'): 
+                exif_bytes = payload
+            elif xmp_bytes is None and payload.startswith(b'http://ns.adobe.com/xap/1.0/\x00'): 
+                xmp_bytes = payload
+        pos = segment_end
+    return exif_bytes, xmp_bytes
+
 def exif_dict_from_file(file_path):
+    from PIL import Image
+    from PIL.ExifTags import TAGS, GPSTAGS
+    import lxml.etree as ET
     def etree_to_flat_dict(t):
         d = {}
         children = list(t)
@@ -65,10 +215,9 @@ def exif_dict_from_file(file_path):
                 d[t.tag] = text
         return d
 
-    def image_exif_to_dict(file_path):
-        image = Image.open(file_path)
+    def exif_items_to_dict(exif_items):
         d = {}
-        for (k,v) in image._getexif().items():
+        for (k,v) in exif_items:
             if TAGS.get(k)=='GPSInfo':
                 for k1 in v:
                     d[GPSTAGS.get(k1)] = v[k1]
@@ -77,7 +226,23 @@ def exif_dict_from_file(file_path):
             d[TAGS.get(k)] = v
         return d
 
+    def image_exif_to_dict(file_path):
+        image = Image.open(file_path)
+        exif = image._getexif()
+        if not exif: raise NotSuitableImage('no_exif')
+        return exif_items_to_dict(exif.items())
+
+    def exif_bytes_to_dict(exif_bytes):
+        # same content as Image._getexif() - root ifd merged with exif ifd, gps ifd as sub dictionary
+        exif = Image.Exif()
+        exif.load(exif_bytes)
+        merged = dict(exif)
+        merged.update(exif.get_ifd(0x8769))
+        if 0x8825 in exif: merged[0x8825] = exif.get_ifd(0x8825)
+        return exif_items_to_dict(merged.items())
+
     def read_xmp(file_path):
+        import mmap
         with open(file_path, 'rb', 0) as file:
             s = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
             
@@ -86,27 +251,52 @@ def exif_dict_from_file(file_path):
             if xmp_start: return s[xmp_start:xmp_end+12].decode()
             return ''
     
-    xmp_str = read_xmp(file_path)
-    xmp_xml = ET.XML(xmp_str)
-    xmp_dict2 = etree_to_flat_dict(xmp_xml)
+    def xmp_from_segment(xmp_bytes):
+        xmp_start = xmp_bytes.find(b'<x:xmpmeta')
+        xmp_end = xmp_bytes.find(b'</x:xmpmeta')
+        if xmp_start < 0 or xmp_end < 0: return None
+        return xmp_bytes[xmp_start:xmp_end+12].decode()
+
+    # fast path - single bounded read of jpg header. odd files (no exif/xmp in APP1) use full file read
+    with timed_file('read'):
+        header = read_jpeg_header(file_path)
+    with timed_file('parse'):
+        exif_bytes, xmp_bytes = parse_jpeg_header(header) if header else (None, None)
+        xmp_str = xmp_from_segment(xmp_bytes) if xmp_bytes else None
+        if exif_bytes and xmp_str:
+            exif_dict = exif_bytes_to_dict(exif_bytes)
+    if not exif_bytes or not xmp_str:
+        with timed_file('read_full_file'):
+            FILE_STATS['bytes_read'] = FILE_STATS.get('bytes_read', 0) + os.path.getsize(file_path)
+            xmp_str = read_xmp(file_path)
+            if not xmp_str: raise NotSuitableImage('no_xmp')
+            exif_dict = image_exif_to_dict(file_path)
+
+    with timed_file('parse'):
+        xmp_xml = ET.XML(xmp_str)
+        xmp_dict2 = etree_to_flat_dict(xmp_xml)
 
-    exif_dict = image_exif_to_dict(file_path)
     exif_dict.update(xmp_dict2)
     
     # delete known big fields that will make review of tags harder
     if 'XPComment' in exif_dict: del exif_dict['XPComment']
     if 'XPKeywords' in exif_dict: del exif_dict['XPKeywords']
     
-    if DEBUG_PRINT: pprint(exif_dict)
+    if DEBUG_PRINT: 
+        from pprint import pprint
+        pprint(exif_dict)
     
     if 'GPSLatitude' not in exif_dict or 'GPSLongitude' not in exif_dict: 
-        raise "No gps data" # not suitable image
+        raise NotSuitableImage('no_gps')
     return exif_dict
 
 
 # ============== vector calculations for frame =======
 
 def make_frameonground(details):
+    import numpy
+    from geopy.distance import geodesic
+    from geopy import Point
     def rotate_z(vector1, angle_z):
         angle_z_rad = numpy.radians(-angle_z)
         rotation_z = numpy.array([[numpy.cos(angle_z_rad), -numpy.sin(angle_z_rad), 0],
@@ -201,8 +391,315 @@ def make_frameonground(details):
     details['frameonground'] = corners
 
 
+WGS84_A = 6378137.0 # semi-major axis, meters
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+ENU_APPROXIMATION_MAX_METERS = 5000 # further offsets use geodesic in make_frameonground_batch
+
+def enu_to_lonlat(lon, lat, east, north):
+    # numpy arrays version of geo_move in make_frameonground: move east along geodesic, then north along meridian. 
+    # east step is great circle on sphere with prime vertical radius, north step is meridian arc with mid latitude radius. 
+    # differs from geopy geodesic by <1mm up to 5km offset, ~10cm at 20km. 
+    import numpy
+    lat_rad = numpy.radians(lat)
+    sin_lat = numpy.sin(lat_rad)
+    prime_vertical_radius = WGS84_A / numpy.sqrt(1 - WGS84_E2 * sin_lat**2)
+    east_angle = east / prime_vertical_radius
+    lat_east = numpy.arcsin(sin_lat * numpy.cos(east_angle))
+    lon_offset = numpy.arctan2(numpy.sin(east_angle), numpy.cos(lat_rad) * numpy.cos(east_angle))
+
+    def meridian_radius(lat_rad):
+        return WGS84_A * (1 - WGS84_E2) / (1 - WGS84_E2 * numpy.sin(lat_rad)**2)**1.5
+    lat_north = lat_east + north / meridian_radius(lat_east)
+    for _ in range(2):
+        lat_north = lat_east + north / meridian_radius((lat_east + lat_north) / 2)
+
+    lon_out = (lon + numpy.degrees(lon_offset) + 180) % 360 - 180
+    return lon_out, numpy.degrees(lat_north)
+
+def camera_rays(table):
+    # directions from camera (east, north, up - (n, 6) arrays: centre, 4 corners, first corner again) of all images 
+    # of ImageTable, and focal length in pixels (n)
+    import numpy
+    azimuth = table.camera_azimuth_assumed
+    pitch = table.camera_pitch_assumed
+    focal_length_35mm_equivalent = table.FocalLengthIn35mmFilm
+    frame_width_pixels = table.ExifImageWidth
+    frame_height_pixels = table.ExifImageHeight
+    digital_zoom = table.DigitalZoomRatio
+
+    # same defaults as make_frameonground
+    pitch = numpy.where(pitch >= 0, PITCH_IF_NOT_REDABLE, pitch)
+    focal_length_35mm_equivalent = numpy.where(focal_length_35mm_equivalent == 0, 24.0, focal_length_35mm_equivalent)
+    no_size = (frame_width_pixels == 0) | (frame_height_pixels == 0)
+    frame_width_pixels = numpy.where(no_size, 4000, frame_width_pixels)
+    frame_height_pixels = numpy.where(no_size, 3000, frame_height_pixels)
+    digital_zoom = numpy.where(digital_zoom == 0, 1.4, digital_zoom)
+
+    sensor_diagonal_35mm = math.sqrt(36**2 + 24**2)
+    diagonal_pixels = numpy.sqrt(frame_width_pixels**2 + frame_height_pixels**2)
+    focal_length_pixels = (focal_length_35mm_equivalent * digital_zoom / sensor_diagonal_35mm) * diagonal_pixels
+
+    # vectors when shot facing north horizontal: centre, 4 corners, first corner again (to close frame)
+    n = len(table)
+    vectors = numpy.zeros((n, 6, 3))
+    vectors[:, 0] = (0, 1, 0)
+    for i, (cx, cy) in enumerate([(-1,-1),(-1,+1),(+1,+1),(+1,-1),(-1,-1)]):
+        vectors[:, i+1, 0] = frame_width_pixels / 2 * cx
+        vectors[:, i+1, 1] = focal_length_pixels
+        vectors[:, i+1, 2] = frame_height_pixels / 2 * cy
+    vectors[:, 1:] *= 50 / numpy.linalg.norm(vectors[:, 1:], axis=2, keepdims=True)
+
+    # rotate around x by pitch, then around z by azimuth (clockwise)
+    cos_x, sin_x = numpy.cos(numpy.radians(pitch))[:, None], numpy.sin(numpy.radians(pitch))[:, None]
+    cos_z, sin_z = numpy.cos(numpy.radians(-azimuth))[:, None], numpy.sin(numpy.radians(-azimuth))[:, None]
+    x = vectors[:, :, 0]
+    y = cos_x * vectors[:, :, 1] - sin_x * vectors[:, :, 2]
+    z = sin_x * vectors[:, :, 1] + cos_x * vectors[:, :, 2]
+    x, y = cos_z * x - sin_z * y, sin_z * x + cos_z * y
+    return x, y, z, focal_length_pixels
+
+def make_frameonground_batch(table):
+    # same as make_frameonground, but for all images of ImageTable at once, with numpy arrays. 
+    # no rotation matrix per vector and no geodesic solve per corner - this was most of cpu time. 
+    # make_frameonground is kept as reference (see --geo-engine geopy)
+    if not len(table): return
+    import numpy
+    lon, lat, alt = table.lon_lat_alt.T
+    x, y, z, focal_length_pixels = camera_rays(table)
+    rays = x, y, z # directions from camera, for terrain (see --dem)
+
+    # extend to ground plane, or 500m if vector points above horizon
+    alt_offset = (GROUND_FRAME_HEIGHT - alt)[:, None]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        scale = numpy.where(z * alt_offset < 0, 500 / numpy.sqrt(x**2 + y**2 + z**2), alt_offset / z)
+    x, y, z = x * scale, y * scale, z * scale
+
+    frame_lon, frame_lat = enu_to_lonlat(lon[:, None], lat[:, None], x, y)
+    frame_alt = alt[:, None] + z
+
+    # frame far away (camera close to horizontal) - approximation error grows, use geodesic for these few
+    for i, k in zip(*numpy.nonzero(numpy.hypot(x, y) > ENU_APPROXIMATION_MAX_METERS)):
+        from geopy.distance import geodesic
+        from geopy import Point
+        east_offset = geodesic(meters=x[i, k]).destination(Point(lat[i], lon[i]), 90)
+        north_offset = geodesic(meters=y[i, k]).destination(east_offset, 0)
+        frame_lon[i, k], frame_lat[i, k] = north_offset.longitude, north_offset.latitude
+
+    table.frameonground = numpy.stack([frame_lon, frame_lat, frame_alt], axis=2)
+    table.pixel_size_mrad = 1000 / focal_length_pixels
+    if DEM: make_frameonground_dem(table, *rays)
+
+def make_frameonground_all(table):
+    if GEO_ENGINE == 'geopy':
+        for i in range(len(table)):
+            details = table.row(i)
+            make_frameonground(details)
+            table.frameonground[i] = details['frameonground'][1:]
+            table.pixel_size_mrad[i] = details['pixel_size_mrad']
+        if DEM and len(table): make_frameonground_dem(table, *camera_rays(table)[:3]) # terrain as in batch, flat frame where rays miss
+    else:
+        make_frameonground_batch(table)
+
+
+# ===== terrain from local DEM file(s) - frame is where camera ray hits ground, not flat plane (see --dem) ====
+class ElevationRaster:
+    # one DEM file, memory mapped - heights are read only where rays go:
+    #   SRTM .hgt - raw big endian int16 grid, named by south west corner (N57E024.hgt), 1201 or 3601 pixels square
+    #   GeoTIFF in lon/lat degrees (EPSG:4326), int or float, uncompressed or deflate, in strips or tiles.
+    # compressed blocks (strips / tiles) are decoded on first use and recently used ones kept (DEM_CACHE_BLOCKS)
+    TIFF_TYPES = {1: 'B', 2: 's', 3: 'H', 4: 'I', 11: 'f', 12: 'd', 16: 'Q'}
+    TIFF_DTYPES = {(1, 8): 'u1', (1, 16): 'u2', (1, 32): 'u4', (2, 8): 'i1', (2, 16): 'i2', (2, 32): 'i4', (3, 32): 'f4', (3, 64): 'f8'}
+
+    def __init__(self, path):
+        import numpy
+        self.path = path
+        self.data = numpy.memmap(path, dtype='u1', mode='r')
+        self.blocks = {} # decoded blocks, least recently used first
+        if path.lower().endswith('.hgt'): self.init_hgt()
+        else: self.init_geotiff()
+
+    def init_hgt(self):
+        match = re.match(r'([NS])(\d+)([EW])(\d+)', os.path.basename(self.path).upper())
+        size = int(math.isqrt(len(self.data) // 2))
+        if not match or size * size * 2 != len(self.data): raise ValueError(f"{self.path}: not SRTM hgt file (name like N57E024.hgt, 1201x1201 or 3601x3601 int16)")
+        south = int(match.group(2)) * (1 if match.group(1) == 'N' else -1)
+        west = int(match.group(4)) * (1 if match.group(3) == 'E' else -1)
+        self.width = self.height = self.block_width = self.block_height = size
+        self.step_lon = self.step_lat = 1 / (size - 1)
+        self.lon0, self.lat0 = west, south + 1 # centre of pixel 0, 0 (north west)
+        self.nodata = -32768
+        self.compression, self.predictor = 1, 1
+        self.dtype = '>i2'
+        self.offsets = [0]
+        self.blocks_across = 1
+
+    def init_geotiff(self):
+        import struct
+        byte_order = {b'II': '<', b'MM': '>'}.get(bytes(self.data[:2]))
+        if not byte_order or struct.unpack(byte_order + 'H', self.data[2:4])[0] != 42:
+            raise ValueError(f"{self.path}: not a TIFF file (BigTIFF is not supported)")
+        tags = {}
+        ifd = struct.unpack(byte_order + 'I', self.data[4:8])[0]
+        for entry in range(struct.unpack(byte_order + 'H', self.data[ifd:ifd+2])[0]):
+            tag, kind, count = struct.unpack(byte_order + 'HHI', self.data[ifd+2+entry*12:ifd+10+entry*12])
+            if kind not in self.TIFF_TYPES: continue
+            size = struct.calcsize(self.TIFF_TYPES[kind]) * count
+            offset = ifd + 10 + entry * 12 if size <= 4 else struct.unpack(byte_order + 'I', self.data[ifd+10+entry*12:ifd+14+entry*12])[0]
+            raw = bytes(self.data[offset:offset+size])
+            tags[tag] = raw.rstrip(b'\0').decode('latin-1') if kind == 2 else struct.unpack(f'{byte_order}{count}{self.TIFF_TYPES[kind]}', raw)
+        self.width, self.height = tags[256][0], tags[257][0]
+        self.compression, self.predictor = tags.get(259, (1,))[0], tags.get(317, (1,))[0]
+        sample_format, bits = tags.get(339, (1,))[0], tags.get(258, (16,))[0]
+        if tags.get(277, (1,))[0] != 1 or (sample_format, bits) not in self.TIFF_DTYPES:
+            raise ValueError(f"{self.path}: DEM must have one band of int or float heights")
+        if self.compression not in (1, 8, 32946) or self.predictor not in (1, 2) or (self.predictor == 2 and sample_format == 3):
+            raise ValueError(f"{self.path}: only uncompressed or deflate (without float predictor) GeoTIFF is supported, convert: gdal_translate -co COMPRESS=DEFLATE")
+        self.dtype = byte_order + self.TIFF_DTYPES[(sample_format, bits)]
+        if 322 in tags: # tiles
+            self.block_width, self.block_height = tags[322][0], tags[323][0]
+            self.offsets, self.counts = tags[324], tags[325]
+        else: # strips
+            self.block_width, self.block_height = self.width, tags.get(278, (self.height,))[0]
+            self.offsets, self.counts = tags[273], tags[279]
+        self.blocks_across = -(-self.width // self.block_width)
+        geokeys = tags.get(34735, ())
+        geokeys = {geokeys[i]: geokeys[i+3] for i in range(4, len(geokeys) - 3, 4)}
+        if geokeys.get(1024, 2) != 2 or 33550 not in tags or 33922 not in tags: # GTModelTypeGeoKey 2 = geographic
+            raise ValueError(f"{self.path}: DEM must be in lon/lat degrees (EPSG:4326), convert: gdalwarp -t_srs EPSG:4326")
+        scale_x, scale_y = tags[33550][:2]
+        tie_i, tie_j, tie_k, tie_x, tie_y = tags[33922][:5]
+        pixel_is_point = geokeys.get(1025, 1) == 2
+        self.step_lon, self.step_lat = scale_x, scale_y
+        self.lon0 = tie_x - tie_i * scale_x + (0 if pixel_is_point else scale_x / 2)
+        self.lat0 = tie_y + tie_j * scale_y - (0 if pixel_is_point else scale_y / 2)
+        self.nodata = float(tags[42113].strip()) if 42113 in tags and tags[42113].strip() else None
+
+    def block(self, index):
+        # heights of strip / tile as 2d array of file dtype
+        import numpy
+        if self.compression == 1:
+            if self.path.lower().endswith('.hgt'): return self.data.view(self.dtype).reshape(self.height, self.width)
+            offset = self.offsets[index]
+            return self.data[offset:offset+self.counts[index]].view(self.dtype).reshape(-1, self.block_width)
+        block = self.blocks.pop(index, None)
+        if block is None:
+            import zlib
+            offset = self.offsets[index]
+            block = numpy.frombuffer(zlib.decompress(self.data[offset:offset+self.counts[index]]), dtype=self.dtype).reshape(-1, self.block_width)
+            if self.predictor == 2: block = numpy.cumsum(block, axis=1, dtype=block.dtype) # horizontal differencing
+            while len(self.blocks) >= DEM_CACHE_BLOCKS:
+                del self.blocks[next(iter(self.blocks))]
+        self.blocks[index] = block # most recently used is last
+        return block
+
+    def pixels(self, rows, cols):
+        # heights at pixel (integer) arrays inside raster, float with nan for nodata
+        import numpy
+        values = numpy.empty(rows.shape)
+        block_rows, block_cols = rows // self.block_height, cols // self.block_width
+        block_ids = block_rows * self.blocks_across + block_cols
+        first = block_ids.flat[0] if block_ids.size else 0
+        if (block_ids == first).all(): # usual case - one block (hgt, uncompressed strips ...)
+            values[...] = self.block(int(first))[rows - block_rows * self.block_height, cols - block_cols * self.block_width]
+        else:
+            for block_id in numpy.unique(block_ids):
+                mask = block_ids == block_id
+                values[mask] = self.block(int(block_id))[rows[mask] - block_rows[mask] * self.block_height, cols[mask] - block_cols[mask] * self.block_width]
+        if self.nodata is not None: values[values == self.nodata] = math.nan
+        return values
+
+    def heights(self, lon, lat):
+        # bilinear heights at lon, lat arrays, nan outside raster
+        import numpy
+        col = (lon - self.lon0) / self.step_lon
+        row = (self.lat0 - lat) / self.step_lat
+        inside = (col >= 0) & (row >= 0) & (col <= self.width - 1) & (row <= self.height - 1)
+        heights = numpy.full(numpy.shape(lon), math.nan)
+        if not inside.any(): return heights
+        col, row = col[inside], row[inside]
+        col0 = numpy.minimum(col.astype(int), self.width - 2)
+        row0 = numpy.minimum(row.astype(int), self.height - 2)
+        fx, fy = col - col0, row - row0
+        rows = numpy.concatenate((row0, row0, row0 + 1, row0 + 1))
+        cols = numpy.concatenate((col0, col0 + 1, col0, col0 + 1))
+        h00, h01, h10, h11 = numpy.split(self.pixels(rows, cols), 4)
+        heights[inside] = (h00 * (1 - fx) + h01 * fx) * (1 - fy) + (h10 * (1 - fx) + h11 * fx) * fy
+        return heights
+
+    def pixel_meters(self):
+        return self.step_lat * math.pi / 180 * 6371000
+
+def dem_rasters():
+    # rasters of DEM setting (file, or folder of .hgt / .tif files) - opened once per run
+    global DEM_RASTERS
+    if DEM_RASTERS is None or DEM_RASTERS[0] != DEM:
+        paths = [os.path.join(DEM, name) for name in sorted(os.listdir(DEM)) if name.lower().endswith(('.hgt', '.tif', '.tiff'))] if os.path.isdir(DEM) else [DEM]
+        if not paths: raise ValueError(f"no .hgt or .tif DEM files in {DEM}")
+        DEM_RASTERS = (DEM, [ElevationRaster(path) for path in paths])
+    return DEM_RASTERS[1]
+
+def dem_heights(lon, lat):
+    # terrain height (above sea level) at lon, lat arrays, from first raster that has it. nan where no DEM
+    import numpy
+    heights = numpy.full(numpy.shape(lon), math.nan)
+    for raster in dem_rasters():
+        missing = numpy.isnan(heights)
+        if not missing.any(): break
+        heights[missing] = raster.heights(lon[missing], lat[missing])
+    return heights
+
+def make_frameonground_dem(table, x, y, z):
+    # after flat plane frames: frame points where camera rays (x, y, z - east, north, up from camera, (n, 6) arrays) hit DEM terrain.
+    # rays are marched in steps of half DEM pixel (all images and rays at once), hit is refined by bisection.
+    # ray that does not hit terrain in DEM_MAX_METERS or goes out of DEM keeps its flat plane point.
+    # camera height above sea: drone's takeoff altitude (GPSAltitude - relative altitude, median per flight), 
+    # if not in exif - terrain under first image of flight
+    import numpy
+    lon, lat, alt = table.lon_lat_alt.T
+    takeoff = table.GPSAltitude - alt
+    for start, stop in flight_segments(table.legs()):
+        known = takeoff[start:stop][~numpy.isnan(takeoff[start:stop])]
+        takeoff[start:stop] = numpy.median(known) if len(known) else dem_heights(lon[start:start+1], lat[start:start+1])[0]
+    camera = takeoff + alt
+    camera[~(camera > dem_heights(lon, lat))] = math.nan # below terrain or no DEM under camera - flat frame
+
+    length = numpy.sqrt(x**2 + y**2 + z**2)
+    east, north, up = x / length, y / length, z / length
+    step = max(DEM_MIN_STEP_METERS, min(raster.pixel_meters() for raster in dem_rasters()) / 2)
+    distances = numpy.arange(1, int(DEM_MAX_METERS / step) + 1) * step
+    def ray_height_over_terrain(i, k, distance): # rays i, k (image, frame point) at distance
+        ray_lon, ray_lat = enu_to_lonlat(lon[i], lat[i], east[i, k] * distance, north[i, k] * distance)
+        curvature = (distance * numpy.hypot(east[i, k], north[i, k]))**2 / (2 * 6371000)
+        return camera[i] + up[i, k] * distance - curvature - dem_heights(ray_lon, ray_lat)
+
+    images = numpy.nonzero(~numpy.isnan(camera))[0]
+    chunk = max(1, DEM_MARCH_SAMPLES // (6 * len(distances)))
+    hit_i, hit_k, near, far = [], [], [], []
+    for chunk_start in range(0, len(images), chunk):
+        i = numpy.repeat(images[chunk_start:chunk_start+chunk], 6)[:, None]
+        k = numpy.tile(numpy.arange(6), len(i) // 6)[:, None]
+        with numpy.errstate(invalid='ignore'):
+            below = ray_height_over_terrain(i, k, distances[None, :]) <= 0
+        hit = below.any(axis=1)
+        first = below.argmax(axis=1)[hit]
+        hit_i.append(i[hit, 0]); hit_k.append(k[hit, 0])
+        near.append(numpy.where(first > 0, distances[first - 1], 0.0)); far.append(distances[first])
+    if not hit_i: return
+    i, k, near, far = (numpy.concatenate(values) for values in (hit_i, hit_k, near, far))
+    for _ in range(DEM_REFINE_STEPS):
+        middle = (near + far) / 2
+        with numpy.errstate(invalid='ignore'):
+            middle_below = ray_height_over_terrain(i, k, middle) <= 0
+        far = numpy.where(middle_below, middle, far)
+        near = numpy.where(middle_below, near, middle)
+    distance = (near + far) / 2
+    table.frameonground[i, k, 0], table.frameonground[i, k, 1] = enu_to_lonlat(lon[i], lat[i], east[i, k] * distance, north[i, k] * distance)
+    table.frameonground[i, k, 2] = GROUND_FRAME_HEIGHT # on terrain (kml altitude is relative to ground)
+
+
 # ===== process file into useful detail (useful exif,xmp + calculate frame) === 
-def get_usefuldetail(file_path, filename):
+def get_usefuldetail(file_path, filename, with_frame=True):
     def convert_to_degrees(key):
         d, m, s = exif_dict[key]
         return d + (m / 60.0) + (s / 3600.0)
@@ -223,7 +720,7 @@ def get_usefuldetail(file_path, filename):
     details['camera_alt_assumed'] = safer_float('RelativeAltitude', 1.0)
     
     if convert_to_degrees('GPSLongitude') == 0: 
-        raise "GPS coordinates are zeros"
+        raise NotSuitableImage('gps_zero')
     
     details['FlightPitchDegree'] = safer_float('FlightPitchDegree')
     details['FlightYawDegree'] = safer_float('FlightYawDegree')
@@ -246,15 +743,13 @@ def get_usefuldetail(file_path, filename):
     details['ExifImageHeight'] = safer_float('ExifImageHeight')
     details['Model'] = safer_value('Model')
     
-    if details['Model']== 'FC7303':
-        details['FocalLengthIn35mmFilm'] = 27.4 # corrected value using actual images (24 reported, 28.5 actual measured)
-
     if details['Model']== 'XL801': 
         # AUTEL 4T
         details['camera_pitch_assumed'] = safer_float('Pitch')
         details['camera_azimuth_assumed'] = safer_float('Yaw')
         details['camera_alt_assumed'] = safer_float('AboveGroundAltitude') - safer_float('LRFTargetAbsAlt')
-        details['DigitalZoomRatio'] = 0.0 # already included in 35mm focal
+
+    details.update(MODEL_CORRECTIONS.get(details['Model'], {}))
 
 
     details['lon_lat_alt'] = (
@@ -268,157 +763,510 @@ def get_usefuldetail(file_path, filename):
     if iconname.endswith('.JPG'): iconname = iconname[:-4]
     details['iconname'] = iconname
     details['filename'] = filename
-    make_frameonground(details)
+    if with_frame: make_frameonground(details) # else caller does it for whole folder, see make_frameonground_all
     return details
 
-# ===== process list of image details into KML file  ==========================
-def list_to_kml(image_list, folder_path):
-    def kml_point(lon_lat_alt):
-        return f"{lon_lat_alt[0]:.6f},{lon_lat_alt[1]:.6f},{lon_lat_alt[2]:.1f}"
-        #return ','.join([f"{str(x):.6f}" for x in lon_lat_alt])
-    def get_distance_meters(lon_lat1, lon_lat2):
-        R = 6371000
-        
-        lon1, lat1 = math.radians(lon_lat1[0]), math.radians(lon_lat1[1])
-        lon2, lat2 = math.radians(lon_lat2[0]), math.radians(lon_lat2[1])
-        
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        distance = R * c
-        
-        return distance
+# ===== image details of folder as columns - not dict per image (see ImageTable) ====
+class ImageTable:
+    # details of folder images (from get_usefuldetail dicts) as columns with the same names as dict keys:
+    # numbers are numpy float arrays, texts are lists of interned strings (date, model repeat a lot), lon_lat_alt is (n, 3) array,
+    # frameonground (n, 6, 3) array - centre and 5 frame corner points (camera point is lon_lat_alt), set by make_frameonground_all.
+    # ~320 bytes per image (tracemalloc, with file name and date strings), details dicts with frame tuples were ~1.8KB
+    NUMBER_COLUMNS = ('GPSAltitude', 'camera_alt_assumed', 'FlightPitchDegree', 'FlightYawDegree', 'GimbalPitchDegree', 'GimbalYawDegree', 
+                      'camera_pitch_assumed', 'camera_azimuth_assumed', 'FocalLengthIn35mmFilm', 'DigitalZoomRatio', 'ExifImageWidth', 'ExifImageHeight')
+    TEXT_COLUMNS = ('DateTimeOriginal', 'DateTime', 'Model', 'filename', 'thumbnail')
+    __slots__ = NUMBER_COLUMNS + TEXT_COLUMNS + ('lon_lat_alt', 'frameonground', 'pixel_size_mrad')
+
+    def __init__(self, details_list=()):
+        import numpy
+        def number(value):
+            try:
+                return float(value) # GPSAltitude is exif rational, or None
+            except (TypeError, ValueError, ZeroDivisionError):
+                return math.nan
+        def text(value):
+            return sys.intern(value) if isinstance(value, str) else value
+        self.GPSAltitude = numpy.array([number(d['GPSAltitude']) for d in details_list], dtype=float)
+        for column in self.NUMBER_COLUMNS[1:]: # floats already (see safer_float)
+            setattr(self, column, numpy.array([d[column] for d in details_list], dtype=float))
+        for column in self.TEXT_COLUMNS:
+            setattr(self, column, [text(d.get(column)) for d in details_list])
+        self.lon_lat_alt = numpy.array([d['lon_lat_alt'] for d in details_list], dtype=float).reshape(-1, 3)
+        self.frameonground = numpy.zeros((len(details_list), 6, 3))
+        self.pixel_size_mrad = numpy.zeros(len(details_list))
+
+    def __len__(self):
+        return len(self.filename)
+
+    def take(self, indexes):
+        # new table with rows in order of indexes
+        taken = ImageTable.__new__(ImageTable)
+        for column in self.__slots__:
+            values = getattr(self, column)
+            setattr(taken, column, [values[i] for i in indexes] if isinstance(values, list) else values[list(indexes)])
+        return taken
+
+    def sorted_by_datetime(self):
+        return self.take(sorted(range(len(self)), key=self.DateTime.__getitem__)) # stable, as list.sort of dicts was
+
+    def iconname(self, i):
+        iconname = self.filename[i]
+        if iconname.startswith('DJI_'): iconname = iconname[4:]
+        if iconname.endswith('.JPG'): iconname = iconname[:-4]
+        return iconname
+
+    def image_href(self, i):
+        return self.thumbnail[i] or self.filename[i]
+
+    def row(self, i):
+        # details dict of one image, as get_usefuldetail returns (with frame)
+        details = {column: getattr(self, column)[i].item() for column in self.NUMBER_COLUMNS}
+        details.update({column: getattr(self, column)[i] for column in self.TEXT_COLUMNS})
+        details['lon_lat_alt'] = tuple(self.lon_lat_alt[i].tolist())
+        details['frameonground'] = [details['lon_lat_alt']] + [tuple(p) for p in self.frameonground[i].tolist()]
+        details['pixel_size_mrad'] = self.pixel_size_mrad[i].item()
+        details['iconname'] = self.iconname(i)
+        return details
+
+    def seconds(self):
+        # DateTime ('2023:05:01 10:00:59') as float seconds array, nan where date is not readable
+        import numpy
+        iso = [dt[:10].replace(':', '-') + 'T' + dt[11:19] if dt and len(dt) >= 19 else 'NaT' for dt in self.DateTime]
+        try:
+            times = numpy.array(iso, dtype='datetime64[s]')
+        except ValueError: # some date is odd - one by one
+            def parse(text):
+                try:
+                    return numpy.datetime64(text, 's')
+                except ValueError:
+                    return numpy.datetime64('NaT')
+            times = numpy.array([parse(text) for text in iso], dtype='datetime64[s]')
+        return numpy.where(numpy.isnat(times), math.nan, times.astype('int64').astype(float))
+
+    def legs(self):
+        # from previous image to each image, for all images at once - dict of arrays (nan for first image): 
+        #   distance m, azimuth degrees (haversine, initial bearing), 
+        #   seconds, speed m/s, climb m (altitude change)
+        import numpy
+        lon, lat = numpy.radians(self.lon_lat_alt[:, 0]), numpy.radians(self.lon_lat_alt[:, 1])
+        dlon, dlat = numpy.diff(lon), numpy.diff(lat)
+        lat1, lat2 = lat[:-1], lat[1:]
+        a = numpy.sin(dlat/2)**2 + numpy.cos(lat1) * numpy.cos(lat2) * numpy.sin(dlon/2)**2
+        distance = 6371000 * 2 * numpy.arctan2(numpy.sqrt(a), numpy.sqrt(1-a))
+        y = numpy.sin(dlon) * numpy.cos(lat2)
+        x = numpy.cos(lat1) * numpy.sin(lat2) - numpy.sin(lat1) * numpy.cos(lat2) * numpy.cos(dlon)
+        azimuth = numpy.degrees(numpy.arctan2(y, x))
+        azimuth = numpy.where(azimuth < 0, azimuth + 360, azimuth)
+        first = numpy.full(min(1, len(lon)), math.nan)
+        seconds = numpy.diff(self.seconds())
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            speed = numpy.where(seconds > 0, distance / seconds, math.nan)
+        climb = numpy.diff(self.lon_lat_alt[:, 2])
+        return {name: numpy.concatenate((first, values)) for name, values in 
+                (('distance', distance), ('azimuth', azimuth), ('seconds', seconds), ('speed', speed), ('climb', climb))}
 
-    def get_azimuth_degrees(lon_lat1, lon_lat2):
-        lon1, lat1 = math.radians(lon_lat1[0]), math.radians(lon_lat1[1])
-        lon2, lat2 = math.radians(lon_lat2[0]), math.radians(lon_lat2[1])
-        
-        dlon = lon2 - lon1
-        
-        y = math.sin(dlon) * math.cos(lat2)
-        x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlon)
-        azimuth = math.degrees(math.atan2(y, x))
-        
-        if azimuth < 0:
-            azimuth += 360
-        
-        return azimuth
 
-    if not image_list: 
-        print("No suitable images in folder")
+# ===== process list of image details into KML file  ==========================
+def escape(text):
+    # same as xml.sax.saxutils.escape - that module imports urllib (http, email ...), 40ms of start time
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def kml_point(lon_lat_alt):
+    return f"{lon_lat_alt[0]:.{COORDINATE_PRECISION}f},{lon_lat_alt[1]:.{COORDINATE_PRECISION}f},{lon_lat_alt[2]:.1f}"
+    #return ','.join([f"{str(x):.6f}" for x in lon_lat_alt])
+
+def kml_image_folder(table, i, legs, image_href):
+    # pin and (hidden) ground frame of image i of ImageTable. legs - table.legs() (distance, azimuth ... from previous image)
+    lon_lat_alt = table.lon_lat_alt[i].tolist()
+    description1 = f"DateTime {table.DateTime[i]} azimuth {table.camera_azimuth_assumed[i]} altitude {lon_lat_alt[2]}"
+    description2 = f"GimbalPitchDegree {table.GimbalPitchDegree[i]} FlightPitchDegree {table.FlightPitchDegree[i]} "
+    description2 += f"pitch {table.camera_pitch_assumed[i]} focal35mm {table.FocalLengthIn35mmFilm[i]} "
+    description2 += f"zoom {table.DigitalZoomRatio[i]} pixel_size_mrad {table.pixel_size_mrad[i]:0.3f} "
+    if i:
+        description2 += f"dist_from_last {legs['distance'][i]:.1f} "
+        description2 += f"azimuth_from_last {legs['azimuth'][i]:.1f} "
+        if legs['speed'][i] == legs['speed'][i]: # not nan - time from last is known
+            description2 += f"speed_from_last {legs['speed'][i]:.1f} climb_from_last {legs['climb'][i]:.1f} "
+    
+    iconname = escape(table.iconname(i))
+    return f'''    <Folder><name>{iconname}</name>
+      <Placemark>
+        <name>{iconname}</name>
+        <description>{escape(f'<img style="max-width:500px;" src="{image_href}">')}
+        {escape(description1)}
+        </description>
+        <Point>
+          <extrude>1</extrude>
+          <altitudeMode>relativeToGround</altitudeMode>
+          <coordinates>{kml_point(lon_lat_alt)}</coordinates>
+        </Point>
+      </Placemark>
+      <Placemark>
+        <name>Frame</name>
+        <description>{escape(description2)}</description>
+        <visibility>0</visibility>
+        <styleUrl>#shootframe</styleUrl>
+        <LineString><altitudeMode>relativeToGround</altitudeMode><coordinates>{' '.join([kml_point(p) for p in [lon_lat_alt] + table.frameonground[i].tolist()])}</coordinates></LineString>
+      </Placemark>
+    </Folder>
+'''
+
+# --compact: pin balloon text is made by google earth from shared style template and per image data fields (ExtendedData),
+# not written out per image. fields are (short name in kml, type, balloon label) - names are repeated per image, so short
+COMPACT_FIELDS = (('h', 'string', None), ('t', 'string', 'DateTime'), ('az', 'float', 'azimuth'), ('alt', 'float', 'altitude'),
+                  ('p', 'float', 'pitch'), ('gp', 'float', 'GimbalPitchDegree'), ('fp', 'float', 'FlightPitchDegree'), 
+                  ('f', 'float', 'focal35mm'), ('z', 'float', 'zoom'), ('px', 'float', 'pixel_size_mrad'), ('l', 'string', 'from_last'))
+
+def kml_styles(flight=True):
+    # shared styles (and data schema for --compact) at start of document
+    styles = '  <Style id="shootframe"><LineStyle><color>#7fffff00</color></LineStyle></Style>\n'
+    if flight: styles += '  <Style id="flightline"><LineStyle><color>#7fff0000</color><width>3</width></LineStyle></Style>\n'
+    if COMPACT:
+        balloon = '<img style="max-width:500px;" src="$[i/h]">' + ''.join(f"{'<br>' if name in ('t', 'p') else ' '}{label} $[i/{name}]" for name, kind, label in COMPACT_FIELDS if label)
+        styles += ('<Schema name="i" id="i">' + ''.join(f'<SimpleField type="{kind}" name="{name}"><displayName>{escape(label or "image")}</displayName></SimpleField>' 
+                                                         for name, kind, label in COMPACT_FIELDS) + '</Schema>'
+                   f'<Style id="p"><BalloonStyle><text>{escape(balloon)}</text></BalloonStyle></Style>\n')
+    return styles
+
+def short_number(value, decimals=1):
+    # '-21' not '-21.0', '' for nan
+    return '' if value != value else f'{value:.{decimals}f}'.rstrip('0').rstrip('.') if decimals else f'{value:.0f}'
+
+def kml_image_compact(table, i, legs, image_href):
+    # pin of image i with data fields (see COMPACT_FIELDS). fields without information are left out: 0 from exif,
+    # gimbal pitch when it is the pitch, leg from last image for first image. leg is one field, as 4 would double the pin size
+    pitch = table.camera_pitch_assumed[i]
+    values = (image_href, table.DateTime[i], short_number(table.camera_azimuth_assumed[i]), short_number(table.lon_lat_alt[i, 2]), short_number(pitch), 
+              short_number(table.GimbalPitchDegree[i] if table.GimbalPitchDegree[i] not in (0.0, pitch) else math.nan), short_number(table.FlightPitchDegree[i] or math.nan), 
+              short_number(table.FocalLengthIn35mmFilm[i]), short_number(table.DigitalZoomRatio[i] or math.nan, 2), short_number(table.pixel_size_mrad[i], 3))
+    if i:
+        values += (f"{short_number(legs['distance'][i])} m azimuth {short_number(legs['azimuth'][i])}"
+                   + (f" speed {short_number(legs['speed'][i])} climb {short_number(legs['climb'][i])}" if legs['speed'][i] == legs['speed'][i] else ''),)
+    data = ''.join(f'<SimpleData name="{name}">{escape(value)}</SimpleData>' for (name, kind, label), value in zip(COMPACT_FIELDS, values) if value)
+    return (f'<Placemark><name>{escape(table.iconname(i))}</name><styleUrl>#p</styleUrl><ExtendedData><SchemaData schemaUrl="#i">{data}</SchemaData></ExtendedData>'
+            f'<Point><extrude>1</extrude><altitudeMode>relativeToGround</altitudeMode><coordinates>{kml_point(table.lon_lat_alt[i].tolist())}</coordinates></Point></Placemark>\n')
+
+def write_images(f, table, indexes, legs, href_prefix=''):
+    # pins and frames of images (table rows in indexes): folder with pin and hidden frame placemark per image,
+    # or with --compact pins with data fields and one hidden placemark of all frames (outline on ground, camera to centre is in shooting directions)
+    if not COMPACT:
+        for i in indexes:
+            f.write(kml_image_folder(table, i, legs, href_prefix + table.image_href(i)))
         return
-    last_datetime_str = image_list[-1]['DateTime']
+    for i in indexes:
+        f.write(kml_image_compact(table, i, legs, href_prefix + table.image_href(i)))
+    f.write('<Placemark><name>frames</name><visibility>0</visibility><styleUrl>#shootframe</styleUrl><MultiGeometry>')
+    for corners in table.frameonground[list(indexes), 1:, :2].tolist():
+        f.write(f"<LineString><coordinates>{' '.join([f'{lon:.{COORDINATE_PRECISION}f},{lat:.{COORDINATE_PRECISION}f}' for lon, lat in corners])}</coordinates></LineString>")
+    f.write('</MultiGeometry></Placemark>\n')
+
+def kml_region(region, min_lod_pixels, max_lod_pixels=-1):
+    # region = (west, south, east, north). feature with region is shown (loaded) only when region size on screen is in lod range
+    west, south, east, north = region
+    return (f'<Region><LatLonAltBox><north>{north:.6f}</north><south>{south:.6f}</south><east>{east:.6f}</east><west>{west:.6f}</west></LatLonAltBox>'
+            f'<Lod><minLodPixels>{min_lod_pixels}</minLodPixels><maxLodPixels>{max_lod_pixels}</maxLodPixels></Lod></Region>')
+
+def kml_networklink(name, href, region=None):
+    region_xml = kml_region(region, TILE_MIN_LOD_PIXELS) if region else ''
+    view_refresh = '<viewRefreshMode>onRegion</viewRefreshMode>' if region else ''
+    return f'  <NetworkLink><name>{escape(name)}</name>{region_xml}<Link><href>{escape(href)}</href>{view_refresh}</Link></NetworkLink>\n'
+
+def simplify_path(lon_lat_alt, tolerance_meters):
+    # douglas-peucker on path in local meters (altitude included), returns numpy array of kept point indexes.
+    # distances of all points of a segment are calculated at once with numpy
+    import numpy
+    points = numpy.array(lon_lat_alt, dtype=float)
+    lat0 = math.radians(numpy.mean(points[:, 1]))
+    meters_per_degree = math.pi / 180 * 6371000
+    points[:, 0] *= meters_per_degree * math.cos(lat0)
+    points[:, 1] *= meters_per_degree
+
+    keep = numpy.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2: continue
+        a, ab = points[start], points[end] - points[start]
+        between = points[start+1:end] - a
+        ab_len2 = ab.dot(ab)
+        t = numpy.clip(between.dot(ab) / ab_len2, 0, 1) if ab_len2 else numpy.zeros(len(between))
+        distances = numpy.linalg.norm(between - t[:, None] * ab, axis=1)
+        i = int(numpy.argmax(distances))
+        if distances[i] > tolerance_meters:
+            keep[start + 1 + i] = True
+            stack.append((start, start + 1 + i))
+            stack.append((start + 1 + i, end))
+    return numpy.nonzero(keep)[0]
+
+def write_flight(f, lon_lat_alt, name='flight'):
+    # flight path placemark(s). long path is written in several simplified versions,
+    # each shown at its zoom level (region lod), so google earth does not draw all points when zoomed out
+    versions = [(0, None)] # (min lod pixels, point indexes or None for all)
+    if FLIGHT_TOLERANCE and len(lon_lat_alt) > FLIGHT_SIMPLIFY_MIN_POINTS:
+        tolerances = [(0, None)] # (tolerance meters, point indexes), full path
+        finer_count = len(lon_lat_alt)
+        for multiplier in reversed(FLIGHT_SIMPLIFY_LEVELS):
+            indexes = simplify_path(lon_lat_alt, FLIGHT_TOLERANCE * multiplier)
+            if len(indexes) > finer_count / 2: 
+                continue # not much simpler than finer version - finer version is shown longer instead
+            tolerances.insert(0, (FLIGHT_TOLERANCE * multiplier, indexes))
+            finer_count = len(indexes)
+
+        lons = [p[0] for p in lon_lat_alt]
+        lats = [p[1] for p in lon_lat_alt]
+        west, south, east, north = min(lons), min(lats), max(lons), max(lats)
+        # region must have some size on screen (straight north-south flight has zero width) - padded as tiles are (quadtree_tiles)
+        pad_lon = max(0, TILE_MIN_SIZE_DEGREES - (east - west)) / 2
+        pad_lat = max(0, TILE_MIN_SIZE_DEGREES - (north - south)) / 2
+        region = (west - pad_lon, south - pad_lat, east + pad_lon, north + pad_lat)
+        # lod pixels are region size on screen (square root of its area), region is extent meters on ground - 
+        # path simplified with tolerance T meters is off by up to T * pixels / extent on screen. finer version is shown
+        # from where coarser one would be off by FLIGHT_LOD_ERROR_PIXELS, coarsest version however far zoomed out
+        meters_per_degree = math.pi / 180 * 6371000
+        extent = meters_per_degree * math.sqrt((region[2] - region[0]) * math.cos(math.radians((south + north) / 2)) * (region[3] - region[1]))
+        versions = [(math.ceil(extent / tolerances[k-1][0] * FLIGHT_LOD_ERROR_PIXELS) if k else 0, indexes) for k, (tolerance, indexes) in enumerate(tolerances)]
+
+    for version, (min_lod_pixels, indexes) in enumerate(versions):
+        region_xml = ''
+        if len(versions) > 1:
+            max_lod_pixels = versions[version+1][0] if version+1 < len(versions) else -1
+            region_xml = f'\n    {kml_region(region, min_lod_pixels, max_lod_pixels)}'
+        f.write(f'''  <Placemark>
+    <name>{escape(name)}</name>{region_xml}
+    <styleUrl>#flightline</styleUrl>
+    <MultiGeometry>
+      <LineString>
+        <altitudeMode>relativeToGround</altitudeMode>
+        <coordinates>''')
+        points = lon_lat_alt if indexes is None else [lon_lat_alt[i] for i in indexes]
+        for i in range(0, len(points), KML_WRITE_CHUNK):
+            if i: f.write(' ')
+            f.write(' '.join([kml_point(p) for p in points[i:i+KML_WRITE_CHUNK]]))
+        f.write('''</coordinates>
+      </LineString>
+    </MultiGeometry>
+  </Placemark>
+''')
+
+def flight_segments(legs):
+    # [(start, stop)] index ranges of separate flights (batteries, days) in time ordered images:
+    # new flight starts where time or distance from previous image is over FLIGHT_SPLIT_SECONDS / FLIGHT_SPLIT_METERS
+    import numpy
+    count = len(legs['distance'])
+    gap = numpy.zeros(count, dtype=bool)
+    with numpy.errstate(invalid='ignore'):
+        if FLIGHT_SPLIT_SECONDS: gap |= legs['seconds'] > FLIGHT_SPLIT_SECONDS
+        if FLIGHT_SPLIT_METERS: gap |= legs['distance'] > FLIGHT_SPLIT_METERS
+    starts = [0] + numpy.nonzero(gap)[0].tolist() if count else []
+    return list(zip(starts, starts[1:] + [count]))
+
+def convex_hull_area(lon_lat):
+    # m2 of convex hull of (n, 2) lon, lat points (monotone chain, on local flat projection)
+    import numpy
+    if len(lon_lat) < 3: return 0.0
+    meters_per_degree = math.pi / 180 * 6371000
+    x = lon_lat[:, 0] * meters_per_degree * math.cos(math.radians(float(numpy.mean(lon_lat[:, 1]))))
+    y = lon_lat[:, 1] * meters_per_degree
+    order = numpy.lexsort((y, x))
+    points = list(zip((x[order] - x.min()).tolist(), (y[order] - y.min()).tolist()))
+    def half_hull(points):
+        hull = []
+        for p in points:
+            while len(hull) >= 2 and (hull[-1][0]-hull[-2][0]) * (p[1]-hull[-2][1]) - (hull[-1][1]-hull[-2][1]) * (p[0]-hull[-2][0]) <= 0:
+                hull.pop()
+            hull.append(p)
+        return hull[:-1]
+    hull = numpy.array(half_hull(points) + half_hull(points[::-1]))
+    if len(hull) < 3: return 0.0
+    return float(abs(numpy.dot(hull[:, 0], numpy.roll(hull[:, 1], -1)) - numpy.dot(hull[:, 1], numpy.roll(hull[:, 0], -1))) / 2)
+
+def flight_summary(table, legs, start, stop):
+    # one line of flight stats: time, duration, path length, area covered by ground frames (convex hull), altitude
+    import numpy
+    seconds = legs['seconds'][start+1:stop]
+    duration = numpy.nansum(seconds) if len(seconds) else 0.0
+    length = numpy.nansum(legs['distance'][start+1:stop]) if stop - start > 1 else 0.0
+    area = convex_hull_area(numpy.concatenate((table.frameonground[start:stop, 1:, :2].reshape(-1, 2), table.lon_lat_alt[start:stop, :2])))
+    return (f"{table.DateTime[start]} - {table.DateTime[stop-1][11:]}, {stop - start} images, {duration / 60:.1f} min, "
+            f"{length / 1000:.2f} km, frames area {area / 10000:.1f} ha, altitude {table.lon_lat_alt[start:stop, 2].max():.0f} m")
+
+def write_shooting_directions(f, table, start=0):
+    f.write('''  <Placemark>
+    <name>shooting directions</name>
+    <styleUrl>#shootframe</styleUrl>
+    <MultiGeometry>
+''')
+    indent, line_end = ('', '') if COMPACT else ('      ', '\n')
+    for lon_lat_alt, centre in zip(table.lon_lat_alt[start:].tolist(), table.frameonground[start:, 0].tolist()): # camera to frame centre
+        f.write(f'''{indent}<LineString><altitudeMode>relativeToGround</altitudeMode><coordinates>{kml_point(lon_lat_alt)} {kml_point(centre)}</coordinates></LineString>{line_end}''')
+    f.write('''    </MultiGeometry>
+  </Placemark>
+''')
+
+def quadtree_tiles(table, max_per_tile):
+    # split images into quadtree cells by location, so no cell has more than max_per_tile images
+    # returns [(quadkey, (west, south, east, north), [indexes in table])], indexes stay in time order
+    lons = table.lon_lat_alt[:, 0].tolist()
+    lats = table.lon_lat_alt[:, 1].tolist()
+    west, east, south, north = min(lons), max(lons), min(lats), max(lats)
+    # cell must have some size on screen, else region is never active
+    pad_lon = max(0, TILE_MIN_SIZE_DEGREES - (east - west)) / 2
+    pad_lat = max(0, TILE_MIN_SIZE_DEGREES - (north - south)) / 2
+    
+    tiles = []
+    stack = [('0', (west - pad_lon, south - pad_lat, east + pad_lon, north + pad_lat), list(range(len(table))))]
+    while stack:
+        quadkey, (west, south, east, north), indexes = stack.pop()
+        if len(indexes) <= max_per_tile or len(quadkey) >= TILE_MAX_DEPTH:
+            tiles.append((quadkey, (west, south, east, north), indexes))
+            continue
+        mid_lon, mid_lat = (west + east) / 2, (south + north) / 2
+        quadrants = [[], [], [], []] # nw, ne, sw, se
+        for i in indexes:
+            quadrants[(lons[i] >= mid_lon) + 2 * (lats[i] < mid_lat)].append(i)
+        bboxes = [(west, mid_lat, mid_lon, north), (mid_lon, mid_lat, east, north), 
+                  (west, south, mid_lon, mid_lat), (mid_lon, south, east, mid_lat)]
+        for q in (3, 2, 1, 0): # reversed, so tiles come out in quadkey order
+            if quadrants[q]: stack.append((quadkey + str(q), bboxes[q], quadrants[q]))
+    return tiles
+
+def write_tiles(table, legs, folder_path, tiles_dirname):
+    # tiled output - images are written to tile kml files in subfolder, returns networklinks to them.
+    # images are in folder above tiles - in kmz one more up (see kmz_external_prefix)
+    tiles_path = os.path.join(folder_path, tiles_dirname)
+    os.makedirs(tiles_path, exist_ok=True)
+    for old_file in os.listdir(tiles_path): # tiles from previous run can have different split
+        if old_file.startswith('tile_') and old_file.endswith('.kml'): os.remove(os.path.join(tiles_path, old_file))
+
+    networklinks = []
+    for quadkey, region, indexes in quadtree_tiles(table, TILE_MAX):
+        tile_filename = f'tile_{quadkey}.kml'
+        with open(os.path.join(tiles_path, tile_filename), "w", encoding='UTF-8', buffering=KML_WRITE_BUFFER) as f:
+            f.write(f'''<?xml version='1.0' encoding='UTF-8'?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+<Document>
+  <name>{quadkey} ({len(indexes)})</name>
+{kml_styles(flight=False)}''')
+            write_images(f, table, indexes, legs, kmz_external_prefix() + '../')
+            f.write('''</Document>
+</kml>
+''')
+        networklinks.append(kml_networklink(f'{quadkey} ({len(indexes)})', f'{tiles_dirname}/{tile_filename}', region))
+    return networklinks
+
+def output_name(table):
+    # file name (without extension) of folder output files: drone_ + date time of last image
+    last_datetime_str = table.DateTime[-1]
     last_datetime_str = last_datetime_str.replace(':','-')
     last_datetime_str = last_datetime_str.replace('_','T')
-    kml_filename = 'drone_' + last_datetime_str + '.kml'
-    
-    kml = ET.Element('kml', {'xmlns': 'http://www.opengis.net/kml/2.2'})
-    document = ET.SubElement(kml, 'Document')
-    document.append(ET.XML(f'<description>from {folder_path} {len(image_list)} images</description>'))
-
-    document.append(ET.XML('<Style id="shootframe"><LineStyle><color>#7fffff00</color></LineStyle></Style>'))
-    document.append(ET.XML('<Style id="flightline"><LineStyle><color>#7fff0000</color><width>3</width></LineStyle></Style>'))
-
-    flightpath_plain = ' '.join([kml_point(d['lon_lat_alt']) for d in image_list])
-
-    document.append(ET.XML(f'''
-        <Placemark>
-            <name>flight</name>
-            <styleUrl>#flightline</styleUrl>
-            <MultiGeometry>
-                <LineString>
-                    <altitudeMode>relativeToGround</altitudeMode>
-                    <coordinates>{flightpath_plain}</coordinates>
-                </LineString>
-            </MultiGeometry>
-        </Placemark>''', parser=parser))
-
-    shoot_directions_xml = ''
-    
-    prev_lon_lat = None
-    
-    for d in image_list:
-        frameonground = d['frameonground'][:2] # first two points are direction
-        shoot_directions_xml += f'''
-            <LineString>
-                <altitudeMode>relativeToGround</altitudeMode>
-                <coordinates>{ ' '.join([kml_point(p) for p in frameonground]) }</coordinates>
-            </LineString>'''
-    document.append(ET.XML(f'''
-        <Placemark>
-            <name>shooting directions</name>
-            <styleUrl>#shootframe</styleUrl>
-            <MultiGeometry>{shoot_directions_xml}</MultiGeometry>
-        </Placemark>''', parser=parser))
-
-    folder = ET.SubElement(document, 'Folder')
-    ET.SubElement(folder, 'name').text=f"Drone images ({len(image_list)})"
-    for d in image_list:
-        description1 = f"DateTime {d['DateTime']} azimuth {d['camera_azimuth_assumed']} altitude {d['lon_lat_alt'][2]}"
-        description2 = f"GimbalPitchDegree {d['GimbalPitchDegree']} FlightPitchDegree {d['FlightPitchDegree']} "
-        description2 += f"pitch {d['camera_pitch_assumed']} focal35mm {d['FocalLengthIn35mmFilm']} "
-        description2 += f"zoom {d['DigitalZoomRatio']} pixel_size_mrad {d['pixel_size_mrad']:0.3f} "
-        if (prev_lon_lat):
-            description2 += f"dist_from_last {get_distance_meters(prev_lon_lat, d['lon_lat_alt']):.1f} "
-            description2 += f"azimuth_from_last {get_azimuth_degrees(prev_lon_lat, d['lon_lat_alt']):.1f} "
-        prev_lon_lat = d['lon_lat_alt']
-        
-        folder.append(ET.XML(f'''
-            <Folder><name>{d['iconname']}</name>
-            <Placemark>
-                <name>{d['iconname']}</name>
-                <description><![CDATA[<img style="max-width:500px;" src="{d['filename']}">]]>
-                {description1}
-                </description>
-                <Point>
-                    <extrude>1</extrude>
-                    <altitudeMode>relativeToGround</altitudeMode>
-                    <coordinates>{kml_point(d['lon_lat_alt'])}</coordinates>
-                </Point>
-            </Placemark>
-            <Placemark>
-                <name>Frame</name>
-                <description>{description2}</description>
-                <visibility>0</visibility>
-                <styleUrl>#shootframe</styleUrl>
-                <LineString><altitudeMode>relativeToGround</altitudeMode><coordinates>{' '.join([kml_point(p) for p in d['frameonground']])}</coordinates></LineString>
-            </Placemark>
-            </Folder>''', parser=parser))
+    return 'drone_' + last_datetime_str
 
+def list_to_kml(table, folder_path):
+    # table - ImageTable in time order
+    if not len(table): 
+        print("No suitable images in folder")
+        return
+    kml_filename = output_name(table) + '.kml'
+    tiles_dirname = kml_filename[:-4] + '_tiles'
+    tiled = TILE_MAX and len(table) > TILE_MAX
+    
+    # document is written to file as it is generated (streaming), nothing is kept in memory per image.
+    # text is escaped here, so file names with & or < do not break kml
     kml_file_path = os.path.join(folder_path, kml_filename)
-    with open(kml_file_path, "wb") as f:
-        tree  = ET.ElementTree(kml)
-        #tree.write(f, pretty_print=True)
-        tree.write(f, pretty_print=True, encoding='UTF-8', xml_declaration=True, method='xml')
+    legs = table.legs()
+    segments = flight_segments(legs)
+    description = f"from {folder_path} {len(table)} images" 
+    description += ''.join(f"\nflight {k + 1}: {flight_summary(table, legs, start, stop)}" for k, (start, stop) in enumerate(segments))
+    with open(kml_file_path, "w", encoding='UTF-8', buffering=KML_WRITE_BUFFER) as f:
+        f.write(f'''<?xml version='1.0' encoding='UTF-8'?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+<Document>
+  <description>{escape(description)}</description>
+{kml_styles()}''')
+        for k, (start, stop) in enumerate(segments): # no line between separate flights
+            write_flight(f, table.lon_lat_alt[start:stop].tolist(), f'flight {k + 1}' if len(segments) > 1 else 'flight')
+        write_shooting_directions(f, table)
+        f.write(f'''  <Folder>
+    <name>Drone images ({len(table)})</name>
+''')
+
+        if tiled:
+            # too many pins for google earth - pins and frames are loaded per area on screen
+            for networklink in write_tiles(table, legs, folder_path, tiles_dirname):
+                f.write(networklink)
+        else:
+            write_images(f, table, range(len(table)), legs, kmz_external_prefix())
+        f.write('''  </Folder>
+</Document>
+</kml>
+''')
     
+    if KMZ: kml_file_path = pack_kmz(kml_file_path, tiles_dirname if tiled else None)
+    remove_stale_output(kml_file_path, None if tiled else tiles_dirname)
     global_kml_list.append(kml_file_path)
+    return kml_file_path
 
-def open_google_earth_end():
-    if not global_kml_list: return
-
+def write_kml_index():
+    # returns kml to open: the only kml, or set_of_N_files.kml linking all of them
     if len(global_kml_list) > 1: 
         kml_filename = f'set_of_{len(global_kml_list)}_files.kml'
-        
-        kml = ET.Element('kml', {'xmlns': 'http://www.opengis.net/kml/2.2'})
-        document = ET.SubElement(kml, 'Document')
-
-        for pathfile in global_kml_list:
-            path, file = os.path.split(pathfile)
-            if path.startswith(folder_path): 
-                path = path[len(folder_path):]
-                if path.startswith('/'): path = path[1:]
-     
-            document.append(ET.XML(f'<NetworkLink><name>{file}</name><Link><href>{os.path.join(path, file)}</href></Link></NetworkLink>'))
-
         kml_file_path = os.path.join(folder_path, kml_filename)
-        with open(kml_file_path, "wb") as f:
-            tree  = ET.ElementTree(kml)
-            tree.write(f, pretty_print=True, encoding='UTF-8', xml_declaration=True, method='xml')
+        with open(kml_file_path, "w", encoding='UTF-8') as f:
+            f.write('''<?xml version='1.0' encoding='UTF-8'?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+<Document>
+''')
+            for pathfile in global_kml_list:
+                path, file = os.path.split(pathfile)
+                if path.startswith(folder_path): 
+                    path = path[len(folder_path):]
+                    if path.startswith('/'): path = path[1:]
+         
+                f.write(kml_networklink(file, kmz_external_prefix() + os.path.join(path, file)))
+            f.write('''</Document>
+</kml>
+''')
+        if KMZ: kml_file_path = pack_kmz(kml_file_path)
+        remove_stale_output(kml_file_path)
     else: 
         kml_file_path = global_kml_list[0]
-
+    return kml_file_path
+
+def kmz_external_prefix():
+    # --kmz: relative links in kmz resolve from archive root, '../' is folder of kmz file. links to files outside kmz 
+    # (images, thumbnails, other kmz of set_of_N_files) are written with it, links to tiles packed into kmz are not
+    return '../' if KMZ else ''
+
+def pack_kmz(kml_file_path, tiles_dirname=None):
+    # --kmz: kml is zipped as doc.kml of .kmz with the same name, tile kml files (if any) go into kmz too under the same relative path,
+    # so networklinks to them work inside kmz. links to images (and other kmz) were written for kmz (kmz_external_prefix). returns kmz path
+    import zipfile, shutil
+    kmz_file_path = kml_file_path[:-4] + '.kmz'
+    tiles_path = os.path.join(os.path.dirname(kml_file_path), tiles_dirname) if tiles_dirname else None
+    with zipfile.ZipFile(kmz_file_path + '.tmp', 'w', zipfile.ZIP_DEFLATED) as kmz:
+        kmz.write(kml_file_path, 'doc.kml') # first file in kmz is the document google earth opens
+        if tiles_path and os.path.isdir(tiles_path):
+            for tile_file in sorted(os.listdir(tiles_path)):
+                kmz.write(os.path.join(tiles_path, tile_file), f'{tiles_dirname}/{tile_file}')
+    os.replace(kmz_file_path + '.tmp', kmz_file_path)
+    os.remove(kml_file_path)
+    if tiles_path and os.path.isdir(tiles_path): shutil.rmtree(tiles_path)
+    return kmz_file_path
+
+def remove_stale_output(file_path, tiles_dirname=None):
+    # output of earlier run with the same name: .kml of .kmz (or .kmz of .kml) - google earth would open both, 
+    # and tiles folder when this run has no tiles (pack_kmz would pack it). folder is left with files of this run only
+    import shutil
+    stale_path = file_path[:-4] + ('.kml' if file_path.endswith('.kmz') else '.kmz')
+    if os.path.exists(stale_path): os.remove(stale_path)
+    tiles_path = os.path.join(os.path.dirname(file_path), tiles_dirname) if tiles_dirname else None
+    if tiles_path and os.path.isdir(tiles_path): shutil.rmtree(tiles_path)
+
+def open_google_earth_end(kml_file_path=None):
+    import platform, subprocess
+    if not global_kml_list and not kml_file_path: return
+    if not kml_file_path: kml_file_path = write_kml_index()
     
     if platform.system() == 'Darwin':       
         # we are in macOS
@@ -432,79 +1280,1314 @@ def open_google_earth_end():
 
 
 def open_in_linux(kml_file_path):
-        
+    import subprocess, psutil
     # let me explain - there is no way to open kml in google earth if google earth is already running
     # (apart from hijacking mouse)
     # so for linux we create single joined kml and place it folder
     google_earth_is_running = False
     for process in psutil.process_iter(['name', 'cmdline']):
-        process_name = process.info['name']
-        process_cmdline = ' '.join(process.info['cmdline'])
+        process_name = process.info['name'] or ''
+        process_cmdline = ' '.join(process.info['cmdline'] or []) # None if process is not ours
         if 'google-earth' in process_name or 'google-earth' in process_cmdline:
             google_earth_is_running = True
 
-    if not is_google_earth_running:
+    if not google_earth_is_running:
         subprocess.call(('xdg-open', kml_file_path))
     else: 
         subprocess.call(('xdg-open', folder_path))
         
 global_kml_list = []
 
+# ===== per folder cache of image details, rerun parses only new or changed files ====
+def cache_signature():
+    # cached details are valid only if calculated with the same settings (list - as it is read back from json)
+    return [CACHE_VERSION, PITCH_IF_NOT_REDABLE, GROUND_FRAME_HEIGHT, repr(MODEL_CORRECTIONS), GEO_ENGINE]
+
+def cacheable(details):
+    # details and not suitable image categories (no_gps ...) are the same next time, read errors and crashes may not be
+    # (share timeout, file still copied) - they are parsed again on next run
+    return isinstance(details, dict) or not (details == 'read_error' or details.startswith('error_'))
+
+def load_folder_cache(folder_path):
+    # returns {filename: (size, mtime_ns, details or error category if file was not suitable)}.
+    # cache is json, not pickle - image folders are sd cards, shares, other people's data, loading cache must not run code from there
+    if not USE_CACHE or REBUILD_CACHE: return {}
+    import json
+    try:
+        with open(os.path.join(folder_path, CACHE_FILENAME), encoding='UTF-8') as f:
+            cache = json.load(f)
+        if cache.get('signature') != cache_signature(): return {}
+        files = {}
+        for filename, (size, mtime_ns, details) in cache['files'].items():
+            if not (isinstance(size, int) and isinstance(mtime_ns, int) and isinstance(details, (dict, str))): raise ValueError(f'bad entry {filename}')
+            if isinstance(details, dict): details['lon_lat_alt'] = tuple(details['lon_lat_alt'])
+            files[filename] = (size, mtime_ns, details)
+        return files
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"   cache in {folder_path} not readable ({e}), rebuilding")
+        return {}
+
+def save_folder_cache(folder_path, files):
+    # files as load_folder_cache returns, only cacheable details are saved. exif rationals (GPSAltitude) are saved as float
+    if not USE_CACHE: return
+    import json
+    cache_path = os.path.join(folder_path, CACHE_FILENAME)
+    files = {filename: cached for filename, cached in files.items() if cacheable(cached[2])}
+    try:
+        with open(cache_path + '.tmp', 'w', encoding='UTF-8') as f:
+            json.dump({'signature': cache_signature(), 'files': files}, f, default=float, separators=(',', ':'))
+        os.replace(cache_path + '.tmp', cache_path)
+    except OSError as e:
+        print(f"   cache not saved in {folder_path} ({e})")
+
+# ===== run statistics - time per stage, per folder, bytes read, errors (see --report) ====
+def add_stage_time(stage, wall, cpu, count=1, folder_stats=None):
+    with STATS_LOCK: # kml writer thread adds too
+        add_stage_time_unlocked(stage, wall, cpu, count, folder_stats)
+
+def add_stage_time_unlocked(stage, wall, cpu, count, folder_stats):
+    for stages in [RUN_STATS['stages']] + ([folder_stats['stages']] if folder_stats else []):
+        totals = stages.setdefault(stage, [0.0, 0.0, 0])
+        totals[0] += wall
+        totals[1] += cpu
+        totals[2] += count
+
+@contextlib.contextmanager
+def timed(stage, folder_stats=None):
+    # cumulative wall and cpu time of stage, for whole run and for folder
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        add_stage_time(stage, time.perf_counter() - start_wall, time.process_time() - start_cpu, folder_stats=folder_stats)
+
+@contextlib.contextmanager
+def timed_file(stage):
+    # time of stage for file being processed, collected into FILE_STATS (worker process returns it with result)
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        totals = FILE_STATS.setdefault(stage, [0.0, 0.0])
+        totals[0] += time.perf_counter() - start_wall
+        totals[1] += time.process_time() - start_cpu
+
+def add_file_stats(full_path, file_stats, folder_stats):
+    # file stages are summed over workers - with --workers they add up to more than elapsed time
+    for stage, value in file_stats.items():
+        if stage == 'bytes_read':
+            RUN_STATS['bytes_read'] += value
+            folder_stats['bytes_read'] += value
+        else:
+            add_stage_time('file_' + stage, value[0], value[1], folder_stats=folder_stats)
+    if 'get_usefuldetail' in file_stats:
+        slowest = RUN_STATS['slowest_files']
+        item = (file_stats['get_usefuldetail'][0], full_path)
+        if len(slowest) < SLOWEST_FILES_COUNT: heapq.heappush(slowest, item)
+        else: heapq.heappushpop(slowest, item)
+
+def add_error(category, folder_stats):
+    COUNTERS['jpg_err'] += 1
+    RUN_STATS['errors'][category] = RUN_STATS['errors'].get(category, 0) + 1
+    folder_stats['errors'][category] = folder_stats['errors'].get(category, 0) + 1
+
+def run_settings():
+    # settings of run in progress, for report (module settings are restored after run, see run_options)
+    return {'workers': WORKERS, 'prefetch': PREFETCH, 'geo_engine': GEO_ENGINE, 'cache': USE_CACHE, 'rebuild_cache': REBUILD_CACHE, 
+            'thumbnails': THUMBNAILS, 'tile_max': TILE_MAX, 'flight_tolerance': FLIGHT_TOLERANCE}
+
+def write_run_report(report_path, results, profile_top=None):
+    # results - of process_tree
+    def stages_dict(stages):
+        return {stage: {'wall_s': round(wall, 4), 'cpu_s': round(cpu, 4), 'count': count} for stage, (wall, cpu, count) in stages.items()}
+    run_stats = results['run_stats']
+    report = {
+        'folder': run_stats['folder'],
+        'elapsed_s': round(results['elapsed_s'], 3),
+        'settings': run_stats['settings'],
+        'counters': results['counters'],
+        'bytes_read': run_stats['bytes_read'],
+        'errors': run_stats['errors'],
+        'stages': stages_dict(run_stats['stages']),
+        'slowest_files': [{'file': path, 'wall_s': round(wall, 4)} for wall, path in sorted(run_stats['slowest_files'], reverse=True)],
+        'folders': [dict(folder_stats, stages=stages_dict(folder_stats['stages'])) for folder_stats in run_stats['folders']],
+    }
+    if profile_top is not None: report['profile'] = profile_top
+    import json
+    with open(report_path, 'w', encoding='UTF-8') as f:
+        json.dump(report, f, indent=1)
+
+def profile_top_functions(profilers, count):
+    # hot functions of cProfile runs of all threads together (this process only, not worker processes), by own time
+    import pstats
+    stats = pstats.Stats(*profilers)
+    stats.sort_stats('tottime').print_stats(count)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:count]
+    return [{'function': f'{file}:{line}({function})', 'calls': calls, 'own_s': round(own, 4), 'cumulative_s': round(cumulative, 4)}
+            for (file, line, function), (primitive_calls, calls, own, cumulative, callers) in rows]
+
+
+# ===== small preview images for pin balloons (not full 10MB+ image over network) ====
+def make_thumbnail_with_stats(full_path_thumb_path):
+    # runs in worker process too. returns (True if thumbnail is there or None if it could not be made, file stats)
+    from PIL import Image
+    full_path, thumb_path = full_path_thumb_path
+    FILE_STATS.clear()
+    with timed_file('thumbnail'):
+        try:
+            source_mtime_ns = os.stat(full_path).st_mtime_ns
+            if os.path.exists(thumb_path) and os.stat(thumb_path).st_mtime_ns == source_mtime_ns: 
+                return True, dict(FILE_STATS) # made from the same source file already
+            with Image.open(full_path) as image:
+                # draft mode - jpeg decoder scales down by 1/2..1/8 while decoding (DCT scaling), full frame is never decompressed
+                image.draft('RGB', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+                image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+                image.save(thumb_path + '.tmp', 'JPEG', quality=THUMBNAIL_QUALITY)
+            os.replace(thumb_path + '.tmp', thumb_path)
+            os.utime(thumb_path, ns=(source_mtime_ns, source_mtime_ns)) # thumbnail mtime marks which source version it is from
+            ok = True
+        except:
+            if DEBUG_PRINT: raise
+            ok = None
+    return ok, dict(FILE_STATS)
+
 # ===== MAIN PROCESSOR FOR PROVIDED FOLER ==== 
-def process_folder_to_data(folder_path):
-    # create list, with images, will be ordered list
+def get_usefuldetail_with_stats(full_path_filename):
+    # runs in worker process too (see --workers). returns (details or error category, file stats). 
+    # error is printed and counted by caller
+    full_path, filename = full_path_filename
+    FILE_STATS.clear()
+    with timed_file('get_usefuldetail'):
+        try: 
+            details = get_usefuldetail(full_path, filename, with_frame=False)
+        except NotSuitableImage as e:
+            if DEBUG_PRINT: raise
+            details = str(e)
+        except OSError:
+            if DEBUG_PRINT: raise
+            details = 'read_error'
+        except Exception as e:
+            if DEBUG_PRINT: raise
+            details = 'error_' + type(e).__name__
+    return details, dict(FILE_STATS)
+
+def get_usefuldetail_list_with_stats(full_path_filename_list):
+    # get_usefuldetail_with_stats for list of files, headers of next files are read ahead (see --prefetch)
+    with prefetching([full_path for full_path, filename in full_path_filename_list]):
+        return [get_usefuldetail_with_stats(full_path_filename) for full_path_filename in full_path_filename_list]
+
+def pool_map(function, items):
+    # map over items in worker processes (see --workers), or here if there is no pool
+    if WORKER_POOL and len(items) > 1:
+        # chunks keep inter-process overhead low, but still give all workers something to do
+        chunksize = max(1, min(WORKER_CHUNKSIZE, len(items) // (WORKERS * 4)))
+        return WORKER_POOL.map(function, items, chunksize=chunksize)
+    return map(function, items)
+
+def pool_map_lists(function, items):
+    # as pool_map, but function takes list of items and returns list of results (each worker gets a chunk as list)
+    if WORKER_POOL and len(items) > 1:
+        chunksize = max(1, min(WORKER_CHUNKSIZE, len(items) // (WORKERS * 4)))
+        chunks = [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+        return [result for results in WORKER_POOL.map(function, chunks) for result in results]
+    return function(items)
+
+def init_worker(config):
+    # worker processes may be started fresh (spawn on windows/mac) - copy main process settings
+    globals().update(config)
+
+def start_worker_pool():
+    global WORKER_POOL
+    if WORKERS > 1:
+        import concurrent.futures
+        config = {setting: globals()[setting] for setting in OPTION_SETTINGS.values()}
+        if 'open' in globals(): config['open'] = globals()['open'] # file open replaced (benchmark / tests slow media stand-in) - workers too
+        WORKER_POOL = concurrent.futures.ProcessPoolExecutor(WORKERS, initializer=init_worker, initargs=(config,))
+
+def stop_worker_pool():
+    global WORKER_POOL
+    if WORKER_POOL: WORKER_POOL.shutdown()
+    WORKER_POOL = None
+
+def is_output_folder(dirname):
+    # folders made by this script, nothing to process there
+    return dirname in (THUMBNAIL_DIRNAME, WATCH_DIRNAME) or (dirname.startswith('drone_') and dirname.endswith('_tiles'))
+
+def walk_folders(root):
+    # yields (folder_path, [(full_path, filename, size, mtime_ns)] of jpg files) for folder tree. 
+    # iterative (no recursion), with scandir (file type from directory listing, no isdir stat per entry).
+    # subfolders come before their parent folder, in listing order - same order of kml files as recursive processing had
+    def scan(folder_path):
+        subfolders, jpg_entries = [], []
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if not is_output_folder(entry.name): subfolders.append(entry.path)
+                elif entry.name.lower().endswith(".jpg"):
+                    stat = entry.stat()
+                    jpg_entries.append((entry.path, entry.name, stat.st_size, stat.st_mtime_ns))
+        return iter(subfolders), jpg_entries
+
+    stack = [(root,) + scan(root)]
+    while stack:
+        folder_path, subfolders, jpg_entries = stack[-1]
+        subfolder = next(subfolders, None)
+        if subfolder:
+            stack.append((subfolder,) + scan(subfolder))
+        else:
+            stack.pop()
+            yield folder_path, jpg_entries
+
+def process_folder_data(folder_path, jpg_entries):
+    # returns (ImageTable ordered by time, folder stats) for jpg files of one folder
     COUNTERS['folders'] += 1
+    COUNTERS['jpg_files'] += len(jpg_entries)
     print(f"   === processing folder {folder_path}===")
+    folder_stats = {'folder': folder_path, 'jpg_files': len(jpg_entries), 'images': 0, 'parsed': 0, 'bytes_read': 0, 'errors': {}, 'stages': {}}
+    jpg_list = [(full_path, filename) for full_path, filename, size, mtime_ns in jpg_entries]
+    jpg_stats = {filename: (size, mtime_ns) for full_path, filename, size, mtime_ns in jpg_entries}
+
+    with timed('cache', folder_stats):
+        cached_files = load_folder_cache(folder_path)
+    # only files not in cache (or changed since) are parsed
+    to_parse = [(full_path, filename) for full_path, filename in jpg_list 
+                if filename not in cached_files or cached_files[filename][:2] != jpg_stats[filename]]
+    folder_stats['parsed'] = len(to_parse)
+    # thumbnails are made together with parsing (in pool, if any) - for all files except known unsuitable
+    with timed('extract', folder_stats):
+        if THUMBNAILS:
+            thumbs_path = os.path.join(folder_path, THUMBNAIL_DIRNAME)
+            os.makedirs(thumbs_path, exist_ok=True)
+            to_thumbnail = [(full_path, os.path.join(thumbs_path, filename)) for full_path, filename in jpg_list 
+                            if filename not in cached_files or isinstance(cached_files[filename][2], dict)]
+            thumbnail_list = pool_map(make_thumbnail_with_stats, to_thumbnail)
+        parsed = {}
+        for (full_path, filename), (details, file_stats) in zip(to_parse, pool_map_lists(get_usefuldetail_list_with_stats, to_parse)):
+            parsed[filename] = details
+            add_file_stats(full_path, file_stats, folder_stats)
+        thumbnailed = set()
+        if THUMBNAILS:
+            for (full_path, thumb_path), (ok, file_stats) in zip(to_thumbnail, thumbnail_list):
+                if ok: thumbnailed.add(os.path.basename(thumb_path))
+                add_file_stats(full_path, file_stats, folder_stats)
+    folder_cache = {}
+    for full_path, filename in jpg_list:
+        details = parsed[filename] if filename in parsed else cached_files[filename][2]
+        folder_cache[filename] = jpg_stats[filename] + (details,)
+    if any(cacheable(details) for details in parsed.values()) or sum(cacheable(cached[2]) for cached in folder_cache.values()) != len(cached_files):
+        with timed('cache', folder_stats):
+            save_folder_cache(folder_path, folder_cache)
+
     image_list = []
-    for filename in os.listdir(folder_path):
-        
-        full_path = os.path.join(folder_path, filename)
-        if os.path.isdir(full_path): 
-            process_folder_to_data(full_path)
-            
-        if not filename.lower().endswith(".jpg"): 
+    for filename, (size, mtime_ns, details) in folder_cache.items():
+        if not isinstance(details, dict): # error category
+            print(f"{filename}: ignored, no GPS information (or yaw or altitude), possibly not DJI file ({details})")
+            add_error(details, folder_stats)
             continue
-        
-        COUNTERS['jpg_files'] += 1
-        
-        if DEBUG_PRINT:
-            details = get_usefuldetail(full_path, filename)
-            image_list.append(details)
-            print(f"{filename}: {details['lon_lat_alt']}")
-        else:
-            try: 
-                details = get_usefuldetail(full_path, filename)
-                image_list.append(details)
-                #pprint(details)
-                print(f"{filename}: {details['lon_lat_alt']}")
-            except:
-                print(f"{filename}: ignored, no GPS information (or yaw or altitude), possibly not DJI file")
-                COUNTERS['jpg_err']+=1
+        details['thumbnail'] = f'{THUMBNAIL_DIRNAME}/{filename}' if filename in thumbnailed else None
+        image_list.append(details)
+        #pprint(details)
+        print(f"{filename}: {details['lon_lat_alt']}")
+    folder_stats['images'] = len(image_list)
     
-    image_list.sort(key=lambda x: x['DateTime'])
-    list_to_kml(image_list, folder_path)
+    table = ImageTable(image_list).sorted_by_datetime()
+    del image_list, folder_cache, cached_files, parsed # dicts are not needed any more, table is passed on to kml writer
+    with timed('geometry', folder_stats):
+        make_frameonground_all(table)
+    return table, folder_stats
+
+def start_thread(target, *args):
+    # daemon thread, exception is kept in returned list (to be raised in main thread).
+    # with --profile thread has its own profiler (cProfile profiles only thread that enabled it), added to PROFILERS
+    errors = []
+    profilers = PROFILERS
+    def run():
+        profiler = None
+        if profilers is not None:
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                profilers.append(profiler)
+            except ValueError: # python 3.12+: profiler of main thread is already active for all threads
+                profiler = None
+        try:
+            target(*args)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            if profiler: profiler.disable()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, errors
+
+def process_folder_to_data(folder_path):
+    # folder tree is processed as pipeline, stages run at the same time:
+    #   walker thread (scandir) -> folders_queue -> image details here (in pool, if any) -> kml_queue -> kml writer thread 
+    # queues are bounded - fast stage waits for slow one, so memory does not grow with tree size
+    folders_queue = queue.Queue(PIPELINE_DEPTH)
+    kml_queue = queue.Queue(PIPELINE_DEPTH)
+    stop = threading.Event()
+    catalog = open_catalog(CATALOG) if CATALOG else None
+
+    def walker():
+        try:
+            folders = walk_folders(folder_path)
+            while not stop.is_set():
+                with timed('walk'):
+                    item = next(folders, None)
+                if item is None: break
+                folders_queue.put(item)
+        finally:
+            folders_queue.put(None)
+
+    def kml_writer():
+        error = None
+        while True:
+            item = kml_queue.get()
+            if item is None: break
+            if error: continue # keep taking items, so producer does not wait forever
+            table, folder_stats = item
+            try:
+                with timed('kml', folder_stats):
+                    list_to_kml(table, folder_stats['folder'])
+                if FGB:
+                    with timed('fgb', folder_stats):
+                        list_to_fgb(table, folder_stats['folder'])
+                if catalog:
+                    with timed('catalog', folder_stats):
+                        catalog_add(catalog, folder_stats['folder'], table)
+                RUN_STATS['folders'].append(folder_stats)
+            except BaseException as e:
+                error = e
+        if error: raise error
+
+    walker_thread, walker_errors = start_thread(walker)
+    writer_thread, writer_errors = start_thread(kml_writer)
+    try:
+        while True:
+            with timed('walk_wait'):
+                item = folders_queue.get()
+            if item is None: break
+            kml_queue.put(process_folder_data(*item))
+    finally:
+        stop.set()
+        while walker_thread.is_alive(): # let walker finish, if it waits on full queue
+            try: folders_queue.get(timeout=0.1)
+            except queue.Empty: pass
+        kml_queue.put(None)
+        writer_thread.join()
+        if catalog: catalog.close()
+    for errors in (walker_errors, writer_errors):
+        if errors: raise errors[0]
+
+# ===== WATCH MODE - images copied to folder tree are added to google earth while copying goes on (see --watch) ====
+class InotifyWatcher:
+    # linux: kernel reports files written (closed) or moved into watched folders - no tree listing while waiting.
+    # inotify through ctypes, no extra package. new subfolders are watched too
+    IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_Q_OVERFLOW, IN_IGNORED, IN_ISDIR = 0x8, 0x80, 0x100, 0x4000, 0x8000, 0x40000000
+
+    def __init__(self, root):
+        import ctypes, ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0: raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.root = root
+        self.folders = {} # watch descriptor: folder path
+        try:
+            self.add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def add_tree(self, folder_path):
+        # watches folder and its subfolders, returns jpg files already there
+        import ctypes
+        jpg_paths = []
+        for path, jpg_entries in walk_folders(folder_path):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE)
+            if wd < 0: raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {path} (see fs.inotify.max_user_watches)')
+            self.folders[wd] = path
+            jpg_paths += [full_path for full_path, filename, size, mtime_ns in jpg_entries]
+        return jpg_paths
+
+    def changed_paths(self, timeout):
+        import select, struct
+        if not select.select([self.fd], [], [], timeout)[0]: return []
+        data = b''
+        while True:
+            try:
+                data += os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+        jpg_paths = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, name_len = struct.unpack_from('iIII', data, pos)
+            name = os.fsdecode(data[pos+16:pos+16+name_len].rstrip(b'\0'))
+            pos += 16 + name_len
+            if mask & self.IN_Q_OVERFLOW: # events lost - look at all files
+                return [full_path for path, jpg_entries in walk_folders(self.root) for full_path, filename, size, mtime_ns in jpg_entries]
+            if mask & self.IN_IGNORED: # folder removed
+                self.folders.pop(wd, None)
+                continue
+            if wd not in self.folders: continue
+            path = os.path.join(self.folders[wd], name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO) and not is_output_folder(name):
+                    try:
+                        jpg_paths += self.add_tree(path) # files can be copied there before watch is added
+                    except OSError as e:
+                        print(f"   {e}")
+            elif mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO) and name.lower().endswith('.jpg'):
+                jpg_paths.append(path)
+        return jpg_paths
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    # other systems, and network shares (inotify does not see files written by other computers): 
+    # folder tree is listed every WATCH_POLL_SECONDS, files with new size or modification time are reported
+    def __init__(self, root):
+        self.root = root
+        self.seen = self.list_tree()
+        self.next_poll = time.time() + WATCH_POLL_SECONDS
+
+    def list_tree(self):
+        return {full_path: (size, mtime_ns) for path, jpg_entries in walk_folders(self.root) for full_path, filename, size, mtime_ns in jpg_entries}
+
+    def changed_paths(self, timeout):
+        wait = self.next_poll - time.time()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0, wait))
+        self.next_poll = time.time() + WATCH_POLL_SECONDS
+        listed = self.list_tree()
+        changed = [full_path for full_path, stat in listed.items() if self.seen.get(full_path) != stat]
+        self.seen = listed
+        return changed
+
+    def close(self):
+        pass
+
+def make_watcher(root):
+    if sys.platform.startswith('linux') and filesystem_type(root) not in NETWORK_FILESYSTEMS:
+        try:
+            return InotifyWatcher(root)
+        except OSError as e:
+            print(f"   inotify not available ({e}), folders are listed every {WATCH_POLL_SECONDS}s")
+    return PollingWatcher(root)
+
+def settled_files(pending, known):
+    # debounce: file is ready when its size and modification time did not change for WATCH_SETTLE_SECONDS
+    # (file being copied grows). pending is {full_path: ((size, mtime_ns), time first seen so) or None}
+    now = time.time()
+    ready = []
+    for full_path, seen in list(pending.items()):
+        try:
+            stat = os.stat(full_path)
+        except OSError: # removed or renamed (temporary file of copy program)
+            del pending[full_path]
+            continue
+        stat_key = (stat.st_size, stat.st_mtime_ns)
+        if known.get(full_path) == stat_key: # already processed, not changed
+            del pending[full_path]
+        elif not seen or seen[0] != stat_key:
+            pending[full_path] = (stat_key, now)
+        elif now - seen[1] >= WATCH_SETTLE_SECONDS:
+            ready.append((full_path, os.path.basename(full_path)) + stat_key)
+            known[full_path] = stat_key
+            del pending[full_path]
+    return ready
+
+def process_watch_batch(jpg_entries, batch_number, last_images, catalog=None):
+    # new files of batch are parsed (only them), added to folder cache (and catalog) and written to batch kml file in each folder.
+    # last_images {folder_path: last image details} - flight line and distance continue from there. returns batch kml files
+    by_folder = {}
+    for entry in sorted(jpg_entries):
+        by_folder.setdefault(os.path.dirname(entry[0]), []).append(entry)
+    fragments = []
+    for folder_path, entries in by_folder.items():
+        print(f"   === new images in folder {folder_path}===")
+        COUNTERS['jpg_files'] += len(entries)
+        folder_stats = {'folder': folder_path, 'jpg_files': len(entries), 'images': 0, 'parsed': len(entries), 'bytes_read': 0, 'errors': {}, 'stages': {}}
+        jpg_list = [(full_path, filename) for full_path, filename, size, mtime_ns in entries]
+        with timed('extract', folder_stats):
+            parsed = []
+            for (full_path, filename), (details, file_stats) in zip(jpg_list, get_usefuldetail_list_with_stats(jpg_list)):
+                parsed.append(details)
+                add_file_stats(full_path, file_stats, folder_stats)
+            image_list = [details for details in parsed if isinstance(details, dict)]
+            if THUMBNAILS and image_list:
+                thumbs_path = os.path.join(folder_path, THUMBNAIL_DIRNAME)
+                os.makedirs(thumbs_path, exist_ok=True)
+                for details in image_list:
+                    ok, file_stats = make_thumbnail_with_stats((os.path.join(folder_path, details['filename']), os.path.join(thumbs_path, details['filename'])))
+                    details['thumbnail'] = f"{THUMBNAIL_DIRNAME}/{details['filename']}" if ok else None
+        with timed('cache', folder_stats):
+            cached_files = load_folder_cache(folder_path)
+            if folder_path not in last_images:
+                cached_images = [cached[2] for cached in cached_files.values() if isinstance(cached[2], dict)]
+                last_images[folder_path] = max(cached_images, key=lambda x: x['DateTime']) if cached_images else None
+            for (full_path, filename, size, mtime_ns), details in zip(entries, parsed):
+                cached_files[filename] = (size, mtime_ns, details)
+            save_folder_cache(folder_path, cached_files)
+
+        for (full_path, filename, size, mtime_ns), details in zip(entries, parsed):
+            if not isinstance(details, dict):
+                print(f"{filename}: ignored, no GPS information (or yaw or altitude), possibly not DJI file ({details})")
+                add_error(details, folder_stats)
+            else:
+                print(f"{filename}: {details['lon_lat_alt']}")
+        if not image_list: continue
+        image_list.sort(key=lambda x: x['DateTime'])
+        prev_d = last_images[folder_path]
+        table = ImageTable(([prev_d] if prev_d else []) + image_list) # previous image is first row, not written
+        with timed('geometry', folder_stats):
+            make_frameonground_all(table)
+        with timed('kml', folder_stats):
+            fragments.append(write_watch_fragment(folder_path, table, 1 if prev_d else 0, batch_number))
+        if catalog:
+            with timed('catalog', folder_stats):
+                catalog_add(catalog, folder_path, table, 1 if prev_d else 0, replace_folder=False)
+        last_images[folder_path] = image_list[-1]
+    return fragments
+
+def write_watch_fragment(folder_path, table, start, batch_number):
+    # kml of batch images (table rows from start, row before is previous image - flight line continues from it), 
+    # in WATCH_DIRNAME subfolder (as tiles - image links go one folder up). written once, not changed later
+    watch_path = os.path.join(folder_path, WATCH_DIRNAME)
+    os.makedirs(watch_path, exist_ok=True)
+    fragment_path = os.path.join(watch_path, f'batch_{batch_number:04d}.kml')
+    name = f'batch {batch_number} {os.path.basename(folder_path)} ({len(table) - start})'
+    with open(fragment_path, "w", encoding='UTF-8', buffering=KML_WRITE_BUFFER) as f:
+        f.write(f'''<?xml version='1.0' encoding='UTF-8'?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+<Document>
+  <name>{escape(name)}</name>
+{kml_styles()}''')
+        legs = table.legs()
+        for segment_start, segment_stop in flight_segments(legs):
+            if segment_stop - segment_start > 1 or segment_start >= start: # previous image alone - new flight starts with batch
+                write_flight(f, table.lon_lat_alt[segment_start:segment_stop].tolist())
+        write_shooting_directions(f, table, start)
+        f.write(f'''  <Folder>
+    <name>Drone images ({len(table) - start})</name>
+''')
+        write_images(f, table, range(start, len(table)), legs, '../')
+        f.write('''  </Folder>
+</Document>
+</kml>
+''')
+    return fragment_path
+
+def write_watch_kml(root, index_kml, fragments):
+    # WATCH_KML_FILENAME (opened in google earth) links kml of first run and batch list, batch list is reloaded every WATCH_REFRESH_SECONDS.
+    # only batch list is rewritten when batch is added (small file, one link per batch) - not kml of whole folder
+    watch_path = os.path.join(root, WATCH_DIRNAME)
+    os.makedirs(watch_path, exist_ok=True)
+    batches_path = os.path.join(watch_path, 'batches.kml')
+    with open(batches_path + '.tmp', "w", encoding='UTF-8') as f: # google earth can read it any time - replaced when complete
+        f.write(f'''<?xml version='1.0' encoding='UTF-8'?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+<Document>
+  <name>new images ({len(fragments)} batches)</name>
+''')
+        for fragment_path in fragments:
+            folder_name = os.path.relpath(os.path.dirname(os.path.dirname(fragment_path)), root).replace(os.sep, '/')
+            f.write(kml_networklink(f'{os.path.basename(fragment_path)[:-4]} {folder_name}', os.path.relpath(fragment_path, watch_path).replace(os.sep, '/')))
+        f.write('''</Document>
+</kml>
+''')
+    os.replace(batches_path + '.tmp', batches_path)
+
+    watch_kml = os.path.join(root, WATCH_KML_FILENAME)
+    if fragments: return watch_kml # written once, at start
+    with open(watch_kml, "w", encoding='UTF-8') as f:
+        f.write(f'''<?xml version='1.0' encoding='UTF-8'?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+<Document>
+  <name>{escape(os.path.basename(os.path.abspath(root)))} (watch)</name>
+''')
+        if index_kml: f.write(kml_networklink(os.path.basename(index_kml), os.path.relpath(index_kml, root).replace(os.sep, '/')))
+        f.write(f'''  <NetworkLink><name>new images</name><Link><href>{WATCH_DIRNAME}/batches.kml</href><refreshMode>onInterval</refreshMode><refreshInterval>{WATCH_REFRESH_SECONDS}</refreshInterval></Link></NetworkLink>
+</Document>
+</kml>
+''')
+    return watch_kml
+
+def watch_tree(path, options=None, index_kml=None, on_start=None, stop=None):
+    # after process_tree: waits for new jpg files in tree, adds them in batches (see write_watch_kml). 
+    # on_start(watch_kml) is called when watching begins (script opens google earth there). runs until ctrl+c or stop (threading.Event) is set
+    global REBUILD_CACHE
+    with run_options(path, options or Options()):
+        REBUILD_CACHE = False # process_tree rebuilt caches already - batches add to them, not replace them with batch files only
+        known = {full_path: (size, mtime_ns) for folder, jpg_entries in walk_folders(path) for full_path, filename, size, mtime_ns in jpg_entries}
+        fragments = []
+        watch_kml = write_watch_kml(path, index_kml, fragments)
+        watcher = make_watcher(path)
+        print(f"Watching {path} for new images ({type(watcher).__name__}), ctrl+c to stop. open {watch_kml}")
+        if on_start: on_start(watch_kml)
+        pending = {}
+        last_images = {}
+        catalog = open_catalog(CATALOG) if CATALOG else None
+        try:
+            while not (stop and stop.is_set()):
+                for full_path in watcher.changed_paths(WATCH_SETTLE_SECONDS / 2 if pending else 1.0):
+                    pending.setdefault(full_path, None)
+                ready = settled_files(pending, known)
+                if ready:
+                    new_fragments = process_watch_batch(ready, len(fragments) + 1, last_images, catalog)
+                    if new_fragments:
+                        fragments += new_fragments
+                        write_watch_kml(path, index_kml, fragments)
+                    print(f"   batch of {len(ready)} files done, {len(pending)} still being copied")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+            if catalog: catalog.close()
+    return {'watch_kml': watch_kml, 'batch_kml_files': fragments, 'counters': dict(COUNTERS), 'errors': dict(RUN_STATS['errors'])}
+
+# ===== CATALOG - images of all processed folders in one sqlite file, searched by ground frame area and time (see --catalog) ====
+def open_catalog(catalog_path, read_only=False):
+    # images table - ImageTable columns + full path, capture time (seconds, see ImageTable.seconds), frame corners (for point search)
+    # and frame (centre and corners with heights, as made - with --dem on terrain),
+    # footprints - sqlite R*Tree of ground frame (and camera point) bounding box per image, so area search does not read all rows.
+    # made if not there, unless read_only (queries) - then missing file is FileNotFoundError, not empty catalog (typo in path is not "no images")
+    import sqlite3, pathlib
+    if read_only:
+        if not os.path.isfile(catalog_path): raise FileNotFoundError(f"catalog {catalog_path} not found")
+        connection = sqlite3.connect(pathlib.Path(catalog_path).absolute().as_uri() + '?mode=ro', uri=True, check_same_thread=False)
+    else:
+        connection = sqlite3.connect(catalog_path, check_same_thread=False) # written from kml writer thread
+    connection.row_factory = sqlite3.Row
+    version = connection.execute('PRAGMA user_version').fetchone()[0]
+    if version == 1 and not read_only: # catalog before frame column - its images get frames from corners (see catalog_query)
+        with connection:
+            connection.execute('ALTER TABLE images ADD COLUMN frame BLOB')
+            connection.execute(f'PRAGMA user_version = {CATALOG_VERSION}')
+        version = CATALOG_VERSION
+    if version not in (0, 1, CATALOG_VERSION) or (read_only and not version):
+        connection.close()
+        if not version: raise ValueError(f"{catalog_path} is not a catalog")
+        raise ValueError(f"catalog {catalog_path} is made by other version of script ({version}), remove it to make new")
+    if version: return connection
+    columns = [f'{column} REAL' for column in ImageTable.NUMBER_COLUMNS] + [f'{column} TEXT' for column in ImageTable.TEXT_COLUMNS]
+    connection.executescript(f'''
+        CREATE TABLE IF NOT EXISTS images (id INTEGER PRIMARY KEY, folder TEXT NOT NULL, path TEXT NOT NULL UNIQUE, 
+            seconds REAL, lon REAL, lat REAL, alt REAL, corners BLOB, {', '.join(columns)}, frame BLOB);
+        CREATE INDEX IF NOT EXISTS images_folder ON images (folder);
+        CREATE INDEX IF NOT EXISTS images_seconds ON images (seconds);
+        CREATE VIRTUAL TABLE IF NOT EXISTS footprints USING rtree(id, min_lon, max_lon, min_lat, max_lat);
+        PRAGMA user_version = {CATALOG_VERSION};
+    ''')
+    return connection
+
+def catalog_add(connection, folder_path, table, start=0, replace_folder=True):
+    # images of ImageTable (with frames) from row start on are written to catalog, in one transaction.
+    # replace_folder - all earlier images of folder are removed (files deleted since), else only the same files (watch batches)
+    import numpy
+    folder = os.path.abspath(folder_path)
+    paths = [os.path.join(folder, filename) for filename in table.filename[start:]]
+    with connection:
+        if replace_folder:
+            connection.execute('DELETE FROM footprints WHERE id IN (SELECT id FROM images WHERE folder = ?)', (folder,))
+            connection.execute('DELETE FROM images WHERE folder = ?', (folder,))
+        else:
+            connection.executemany('DELETE FROM footprints WHERE id IN (SELECT id FROM images WHERE path = ?)', [(path,) for path in paths])
+            connection.executemany('DELETE FROM images WHERE path = ?', [(path,) for path in paths])
+        if not paths: return
+        corners = table.frameonground[start:, 1:5, :2]
+        points = numpy.concatenate((corners, table.lon_lat_alt[start:, None, :2]), axis=1)
+        low, high = points.min(axis=1).tolist(), points.max(axis=1).tolist()
+        first_id = connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM images').fetchone()[0]
+        ids = range(first_id, first_id + len(paths))
+        columns = ImageTable.NUMBER_COLUMNS + ImageTable.TEXT_COLUMNS
+        values = [getattr(table, column)[start:] for column in ImageTable.NUMBER_COLUMNS]
+        values = [column.tolist() for column in values] + [getattr(table, column)[start:] for column in ImageTable.TEXT_COLUMNS]
+        frames = [frame.tobytes() for frame in table.frameonground[start:].astype('<f8')]
+        rows = zip(ids, paths, table.seconds()[start:].tolist(), table.lon_lat_alt[start:].tolist(), [c.tobytes() for c in corners], frames, *values)
+        connection.executemany(f"INSERT INTO images (id, folder, path, seconds, lon, lat, alt, corners, frame, {', '.join(columns)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?{', ?' * len(columns)})", 
+                               ((id, folder, path, seconds, *lon_lat_alt, corners, frame, *row_values) for id, path, seconds, lon_lat_alt, corners, frame, *row_values in rows)) # nan is stored as NULL
+        connection.executemany('INSERT INTO footprints VALUES (?, ?, ?, ?, ?)', 
+                               ((id, west, east, south, north) for id, (west, south), (east, north) in zip(ids, low, high)))
+
+def catalog_seconds(text, end=False):
+    # '2023-05-01', '2023-05-01 10:00:00' (or exif '2023:05:01 10:00:00') to seconds as in catalog. end - date only means end of that day
+    import numpy
+    text = text.strip()
+    seconds = float(numpy.datetime64(text[:10].replace(':', '-') + ('T' + text[11:] if len(text) > 10 else ''), 's').astype('int64'))
+    return seconds + 86399 if end and len(text) <= 10 else seconds
+
+def point_in_polygon(point, polygon):
+    # ray casting, polygon - list of (lon, lat) corners
+    x, y = point
+    inside = False
+    for (x1, y1), (x2, y2) in zip(polygon, polygon[1:] + polygon[:1]):
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+def catalog_query(catalog_path, point=None, bbox=None, time_range=None):
+    # images of catalog as list of details dicts (ImageTable columns, lon_lat_alt, frameonground as stored - see make_frameonground, folder, path):
+    #   point (lon, lat) - ground frame covers it; bbox (west, south, east, north) - frame bounding box overlaps it;
+    #   time_range (from, to) - taken in it, seconds (see catalog_seconds). conditions given are all applied
+    import numpy
+    connection = open_catalog(catalog_path, read_only=True)
+    try:
+        conditions, parameters = [], []
+        if point or bbox:
+            west, south, east, north = bbox or (point[0], point[1], point[0], point[1])
+            tables = 'footprints JOIN images ON images.id = footprints.id' # R*Tree is searched first
+            conditions += ['footprints.min_lon <= ?', 'footprints.max_lon >= ?', 'footprints.min_lat <= ?', 'footprints.max_lat >= ?']
+            parameters += [east, west, north, south]
+        else:
+            tables = 'images'
+        if time_range:
+            conditions.append('images.seconds BETWEEN ? AND ?')
+            parameters += list(time_range)
+        rows = connection.execute(f"SELECT images.* FROM {tables} {'WHERE ' + ' AND '.join(conditions) if conditions else ''}", parameters).fetchall()
+    finally:
+        connection.close()
+    images = []
+    for row in rows:
+        if point and not point_in_polygon(point, numpy.frombuffer(row['corners']).reshape(4, 2).tolist()):
+            continue
+        details = dict(row)
+        corners, frame = details.pop('corners'), details.pop('frame', None)
+        del details['id']
+        details['lon_lat_alt'] = (details.pop('lon'), details.pop('lat'), details.pop('alt'))
+        if frame:
+            frame = numpy.frombuffer(frame).reshape(6, 3)
+        else: # catalog before frame column: corners on ground, centre between them
+            frame = numpy.full((6, 3), float(GROUND_FRAME_HEIGHT))
+            frame[1:5, :2] = numpy.frombuffer(corners).reshape(4, 2)
+            frame[5], frame[0, :2] = frame[1], frame[1:5, :2].mean(axis=0)
+        details['frameonground'] = [details['lon_lat_alt']] + [tuple(point) for point in frame.tolist()]
+        images.append(details)
+    return images
+
+def catalog_to_kml(images, kml_folder):
+    # catalog_query images to kml file in kml_folder (see list_to_kml), pins link images (thumbnails) in their folders. returns kml file path.
+    # frames are as stored in catalog (with --dem on terrain), not made again. images dicts are not changed (copies are)
+    import numpy
+    images = sorted((dict(details) for details in images), key=lambda details: details['DateTime']) # stable, as sorted_by_datetime
+    for details in images:
+        details['thumbnail'] = os.path.relpath(os.path.join(details['folder'], details['thumbnail'] or details['filename']), kml_folder).replace(os.sep, '/')
+    table = ImageTable(images)
+    make_frameonground_all(table) # pixel size of images, frames are replaced by stored ones
+    table.frameonground = numpy.array([details['frameonground'][1:] for details in images], dtype=float).reshape(-1, 6, 3)
+    if FGB: list_to_fgb(table, kml_folder)
+    return list_to_kml(table, kml_folder)
+
+# ===== FLATGEOBUF - images, frames and flights as spatially indexed binary GIS layers (see --fgb) ====
+# flatgeobuf.org format: magic, header, packed Hilbert R-tree of feature bboxes, features (header and features are flatbuffers).
+# GIS tools (GDAL / QGIS, geopandas, web clients over http) read only index and features in requested bbox, not whole file.
+# written here with struct and numpy - no flatbuffers or GDAL modules needed
+FGB_MAGIC = b'fgb\x03fgb\x01'
+FGB_POINT, FGB_LINESTRING, FGB_POLYGON = 1, 2, 3
+FGB_COLUMN_TYPES = {'int': (5, '<i'), 'double': (10, '<d'), 'string': (11, None), 'datetime': (13, None)} # type code, value format
+FGB_IMAGE_COLUMNS = ([('filename', 'string'), ('thumbnail', 'string'), ('DateTime', 'string'), ('time', 'datetime'), ('DateTimeOriginal', 'string'), ('Model', 'string')] 
+                     + [(column, 'double') for column in ImageTable.NUMBER_COLUMNS] + [('pixel_size_mrad', 'double'), ('flight', 'int')]
+                     + [(name, 'double') for name in ('dist_from_last', 'azimuth_from_last', 'speed_from_last', 'climb_from_last')])
+FGB_FLIGHT_COLUMNS = [('flight', 'int'), ('start', 'datetime'), ('end', 'datetime'), ('images', 'int'), ('seconds', 'double'), 
+                      ('length_m', 'double'), ('frames_area_m2', 'double'), ('altitude_max', 'double')]
+
+def flatbuffer(fields):
+    # minimal flatbuffers encoder of root table. fields - list of (slot, kind, value), value None = not written. kind is
+    # struct format of scalar ('B', 'H', 'i', 'Q', '?'), 'string', vector of scalars ('[B', '[I', '[d' - value is bytes),
+    # 'table' (value is fields) or '[table' (list of fields). written forward - table, then strings, vectors, tables it refers to
+    # (flatbuffers offsets point forward). vtable is just before its table, values aligned to their size from buffer start
+    import struct
+    buffer = bytearray(4) # root table offset
+    def pad(alignment, offset=0):
+        buffer.extend(bytes(-(len(buffer) + offset) % alignment))
+    def inline_size(kind):
+        return struct.calcsize('<' + kind) if len(kind) == 1 else 4
+    def table(fields):
+        fields = sorted((field for field in fields if field[2] is not None), key=lambda field: -inline_size(field[1]))
+        slots = max((slot for slot, kind, value in fields), default=-1) + 1
+        offsets, size = [0] * slots, 4
+        for slot, kind, value in fields:
+            offsets[slot] = size
+            size += inline_size(kind)
+        pad(2)
+        vtable_position = len(buffer)
+        buffer.extend(struct.pack(f'<{2 + slots}H', 4 + 2 * slots, size, *offsets))
+        pad(8, 4) # table start is 4 mod 8, so 8 byte values (largest first) after 4 byte vtable offset are aligned
+        position = len(buffer)
+        buffer.extend(struct.pack('<i', position - vtable_position))
+        references = []
+        for slot, kind, value in fields:
+            if len(kind) == 1:
+                buffer.extend(struct.pack('<' + kind, value))
+            else:
+                references.append((position + offsets[slot], kind, value))
+                buffer.extend(bytes(4))
+        for field_position, kind, value in references:
+            struct.pack_into('<I', buffer, field_position, reference(kind, value) - field_position)
+        return position
+    def reference(kind, value):
+        if kind == 'table': return table(value)
+        if kind == 'string':
+            data = value.encode('utf-8')
+            pad(4)
+            position = len(buffer)
+            buffer.extend(struct.pack('<I', len(data)) + data + b'\0')
+        elif kind == '[table':
+            pad(4)
+            position = len(buffer)
+            buffer.extend(struct.pack('<I', len(value)) + bytes(4 * len(value)))
+            for k, fields in enumerate(value):
+                item_position = position + 4 + 4 * k
+                struct.pack_into('<I', buffer, item_position, table(fields) - item_position)
+        else:
+            item_size = struct.calcsize('<' + kind[1])
+            if item_size == 8: pad(8, 4) # length, then aligned items
+            else: pad(4)
+            position = len(buffer)
+            buffer.extend(struct.pack('<I', len(value) // item_size) + value)
+        return position
+    struct.pack_into('<I', buffer, 0, table(fields))
+    return bytes(buffer)
+
+def fgb_properties(columns, values):
+    # feature properties: (uint16 column index, value) for each column with value - None and nan are null (left out).
+    # columns - fgb_packers of columns
+    properties = []
+    for (index, packer, text), value in zip(columns, values):
+        if value is None or value != value: continue
+        if text:
+            data = value.encode('utf-8')
+            properties.append(packer.pack(index, len(data)) + data) # text is uint32 length and utf-8 bytes
+        else:
+            properties.append(packer.pack(index, value))
+    return b''.join(properties)
+
+def fgb_packers(columns):
+    # (column index, struct of index and value - or text length, is text) of (name, kind) columns, for fgb_properties
+    import struct
+    return [(index, struct.Struct('<H' + (FGB_COLUMN_TYPES[kind][1] or '<I')[1]), not FGB_COLUMN_TYPES[kind][1]) for index, (name, kind) in enumerate(columns)]
+
+def fgb_feature(xy, properties, z=None):
+    # flatbuffer of Feature {geometry: Geometry {xy, z}, properties} as flatbuffer() writes it, but packed at once (it is per image):
+    # root offset, feature vtable and table, geometry vtable and table, then xy, z (8 byte aligned) and properties vectors
+    import struct
+    count = len(xy) // 8 # doubles
+    if z is None:
+        properties_position = 48 + 8 * count
+        head = struct.pack('<I4HiII4H4xiII', 12, 8, 12, 4, 8, 8, 20, properties_position - 20, 8, 8, 0, 4, 12, 4, count)
+        return b''.join((head, xy, struct.pack('<I', len(properties)), properties))
+    properties_position = 64 + 12 * count
+    head = struct.pack('<I4HiII5H2xiII4xI', 12, 8, 12, 4, 8, 8, 20, properties_position - 20, 10, 12, 0, 4, 8, 12, 12, 16 + 8 * count, count)
+    return b''.join((head, xy, struct.pack('<4xI', count // 2), z, struct.pack('<I', len(properties)), properties))
+
+def fgb_hilbert_order(boxes, extent):
+    # feature order along Hilbert curve of bbox centres (as flatgeobuf reference writer), so features near in space are near in file
+    import numpy
+    hilbert_max = (1 << 16) - 1
+    size = numpy.array(extent[2:]) - numpy.array(extent[:2])
+    centre = (boxes[:, :2] + boxes[:, 2:]) / 2
+    cells = numpy.where(size > 0, numpy.floor(hilbert_max * (centre - extent[:2]) / numpy.where(size > 0, size, 1)), 0).astype(numpy.uint32)
+    x, y = cells[:, 0], cells[:, 1]
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+    a, b, c, d = a | (b >> 1), (a >> 1) ^ a, ((c >> 1) ^ (b & (d >> 1))) ^ c, ((a & (c >> 1)) ^ (d >> 1)) ^ d
+    for shift in (2, 4):
+        a, b, c, d = ((a & (a >> shift)) ^ (b & (b >> shift)), (a & (b >> shift)) ^ (b & ((a ^ b) >> shift)),
+                      c ^ ((a & (c >> shift)) ^ (b & (d >> shift))), d ^ ((b & (c >> shift)) ^ ((a ^ b) & (d >> shift))))
+    c, d = c ^ ((a & (c >> 8)) ^ (b & (d >> 8))), d ^ ((b & (c >> 8)) ^ ((a ^ b) & (d >> 8)))
+    a, b = c ^ (c >> 1), d ^ (d >> 1)
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+    def spread(bits): # 16 bits to even bit positions
+        for shift, mask in ((8, 0x00FF00FF), (4, 0x0F0F0F0F), (2, 0x33333333), (1, 0x55555555)):
+            bits = (bits | (bits << shift)) & mask
+        return bits
+    return numpy.argsort((spread(i1) << 1) | spread(i0), kind='stable')
+
+def fgb_index(boxes, offsets, node_size):
+    # packed Hilbert R-tree as bytes: nodes (min x, min y, max x, max y, uint64 offset) level by level, root first.
+    # leaves are feature bboxes in file order with feature byte offset, upper nodes cover node_size nodes below, offset is index of first of them
+    import numpy
+    level_sizes = [len(boxes)]
+    while len(level_sizes) == 1 or level_sizes[-1] != 1:
+        level_sizes.append(-(-level_sizes[-1] // node_size))
+    nodes = numpy.zeros(sum(level_sizes), dtype=[('box', '<f8', 4), ('offset', '<u8')])
+    level_end = len(nodes)
+    nodes[level_end - len(boxes):] = list(zip(boxes, offsets))
+    for size, parents in zip(level_sizes, level_sizes[1:]):
+        level_start = level_end - size
+        children = nodes['box'][level_start:level_end]
+        starts = numpy.arange(0, size, node_size)
+        parent_nodes = nodes[level_start - parents:level_start]
+        parent_nodes['box'][:, :2] = numpy.minimum.reduceat(children[:, :2], starts)
+        parent_nodes['box'][:, 2:] = numpy.maximum.reduceat(children[:, 2:], starts)
+        parent_nodes['offset'] = level_start + starts
+        level_end = level_start
+    return nodes.tobytes()
+
+class FlatGeobufWriter:
+    # one layer file, features are added one at a time (streaming): encoded and written to spool file, only bbox and size kept.
+    # close sorts features by Hilbert curve, writes magic, header, index and features copied from spool
+    def __init__(self, path, name, geometry_type, columns, has_z=False):
+        self.path, self.name, self.geometry_type, self.columns, self.has_z = path, name, geometry_type, columns, has_z
+        self.spool = open(path + '.tmp', 'w+b')
+        self.boxes, self.sizes = [], []
+
+    def add(self, xy, bbox, properties, z=None):
+        # xy, z - coordinates as little endian float64 bytes (lon, lat pairs), bbox (west, south, east, north), properties - see fgb_properties
+        import struct
+        feature = fgb_feature(xy, properties, z)
+        self.spool.write(struct.pack('<I', len(feature)) + feature)
+        self.boxes.append(bbox)
+        self.sizes.append(4 + len(feature))
+
+    def close(self):
+        import numpy, struct
+        boxes = numpy.array(self.boxes, dtype=float).reshape(-1, 4)
+        sizes = numpy.array(self.sizes, dtype=numpy.int64)
+        extent = [*boxes[:, :2].min(axis=0).tolist(), *boxes[:, 2:].max(axis=0).tolist()] if len(boxes) else None
+        order = fgb_hilbert_order(boxes, extent) if len(boxes) else []
+        spool_offsets = numpy.cumsum(sizes) - sizes
+        columns = [[(0, 'string', name), (1, 'B', FGB_COLUMN_TYPES[kind][0])] for name, kind in self.columns]
+        header = flatbuffer([(0, 'string', self.name), (1, '[d', struct.pack('<4d', *extent) if extent else None), (2, 'B', self.geometry_type), 
+                             (3, '?', True if self.has_z else None), (7, '[table', columns), (8, 'Q', len(boxes)), (9, 'H', FGB_NODE_SIZE if len(boxes) else 0),
+                             (10, 'table', [(0, 'string', 'EPSG'), (1, 'i', 4326)])])
+        try:
+            with open(self.path, 'wb', buffering=KML_WRITE_BUFFER) as f:
+                f.write(FGB_MAGIC + struct.pack('<I', len(header)) + header)
+                if len(boxes):
+                    f.write(fgb_index(boxes[order], numpy.cumsum(sizes[order]) - sizes[order], FGB_NODE_SIZE))
+                for offset, size in zip(spool_offsets[order].tolist(), sizes[order].tolist()):
+                    self.spool.seek(offset)
+                    f.write(self.spool.read(size))
+        finally:
+            self.spool.close()
+            os.remove(self.path + '.tmp')
+
+def list_to_fgb(table, folder_path):
+    # ImageTable (time order, with frames - as list_to_kml gets) to FlatGeobuf layers next to kml of folder, returns file paths:
+    #   drone_..._images.fgb camera points (z - altitude over takeoff) and drone_..._frames.fgb ground frame polygons, both with
+    #   image details (FGB_IMAGE_COLUMNS), drone_..._flights.fgb flight lines (see flight_segments) with flight stats
+    import numpy
+    if not len(table): return []
+    base = os.path.join(folder_path, output_name(table))
+    legs = table.legs()
+    segments = flight_segments(legs)
+    flight = numpy.zeros(len(table), dtype=int)
+    for k, (start, stop) in enumerate(segments): flight[start:stop] = k + 1
+    def iso(datetime): # exif '2023:05:01 10:00:59' to '2023-05-01T10:00:59'
+        return datetime[:10].replace(':', '-') + 'T' + datetime[11:19] if datetime and len(datetime) >= 19 else None
+    values = [table.filename, table.thumbnail, table.DateTime, [iso(datetime) for datetime in table.DateTime], table.DateTimeOriginal, table.Model]
+    values += [getattr(table, column).tolist() for column in ImageTable.NUMBER_COLUMNS] + [table.pixel_size_mrad.tolist(), flight.tolist()]
+    values += [legs[leg].tolist() for leg in ('distance', 'azimuth', 'speed', 'climb')]
+    corners = numpy.ascontiguousarray(table.frameonground[:, 1:, :2], dtype='<f8') # 4 corners and first again - closed ring
+    lows, highs = corners.min(axis=1).tolist(), corners.max(axis=1).tolist()
+    lon_lat = numpy.ascontiguousarray(table.lon_lat_alt[:, :2], dtype='<f8')
+    altitudes = table.lon_lat_alt[:, 2].astype('<f8')
+    images = FlatGeobufWriter(base + '_images.fgb', 'images', FGB_POINT, FGB_IMAGE_COLUMNS, has_z=True)
+    frames = FlatGeobufWriter(base + '_frames.fgb', 'frames', FGB_POLYGON, FGB_IMAGE_COLUMNS)
+    with contextlib.ExitStack() as writers:
+        for writer in (images, frames): writers.callback(writer.close)
+        packers = fgb_packers(FGB_IMAGE_COLUMNS)
+        for i, row in enumerate(zip(*values)):
+            properties = fgb_properties(packers, row)
+            lon, lat = lon_lat[i].tolist()
+            images.add(lon_lat[i].tobytes(), (lon, lat, lon, lat), properties, altitudes[i:i+1].tobytes())
+            frames.add(corners[i].tobytes(), (*lows[i], *highs[i]), properties)
+    flights = FlatGeobufWriter(base + '_flights.fgb', 'flights', FGB_LINESTRING, FGB_FLIGHT_COLUMNS, has_z=True)
+    with contextlib.closing(flights):
+        for k, (start, stop) in enumerate(segments):
+            points = table.lon_lat_alt[start:stop].astype('<f8')
+            if stop - start == 1: points = points[[0, 0]] # line needs 2 points
+            stats = (k + 1, iso(table.DateTime[start]), iso(table.DateTime[stop-1]), stop - start, float(numpy.nansum(legs['seconds'][start+1:stop])),
+                     float(numpy.nansum(legs['distance'][start+1:stop])), 
+                     convex_hull_area(numpy.concatenate((table.frameonground[start:stop, 1:, :2].reshape(-1, 2), table.lon_lat_alt[start:stop, :2]))),
+                     float(points[:, 2].max()))
+            flights.add(numpy.ascontiguousarray(points[:, :2]).tobytes(), (*points[:, :2].min(axis=0).tolist(), *points[:, :2].max(axis=0).tolist()), 
+                        fgb_properties(fgb_packers(FGB_FLIGHT_COLUMNS), stats), points[:, 2].tobytes())
+    return [images.path, frames.path, flights.path]
 
 # note this needs to be global 
-if sys.argv[-1] and os.path.isdir(sys.argv[-1]): 
-    folder_path = sys.argv[-1]
-else: 
-    folder_path = os.getcwd()
+folder_path = os.getcwd()
 
 
 # can change while debugging. 
 DEBUG_PRINT = 0 # True or False (1 or 0)
 PITCH_IF_NOT_REDABLE = -45.0 # -45 normal
-GROUND_FRAME_HEIGHT = 1 # set higher for uneven terrain. 
+GROUND_FRAME_HEIGHT = 1 # set higher for uneven terrain (or use --dem). 
 COUNTERS = {'folders': 0, 'jpg_files': 0, 'jpg_err': 0, 'kml_files': 0}
+RUN_STATS = {'stages': {}, 'folders': [], 'bytes_read': 0, 'errors': {}, 'slowest_files': []} # see write_run_report
+FILE_STATS = {} # stage times and bytes read of file being processed
+STATS_LOCK = threading.Lock()
+RUN_LOCK = threading.RLock() # process_tree / watch_tree run at a time, see run_options
+SLOWEST_FILES_COUNT = 10
+PROFILE_TOP = 30 # --profile, functions printed and reported
+PROFILERS = None # --profile, cProfile profilers of main thread and pipeline threads (see start_thread), None if not profiling
+KML_WRITE_CHUNK = 1000 # flight path coordinates joined and written to file at once
+KML_WRITE_BUFFER = 1024 * 1024 # kml file write buffer, bytes
+COMPACT = False # --compact, pin data as ExtendedData with shared balloon style, frames of folder in one placemark, no indentation
+COORDINATE_PRECISION = 6 # --precision, decimals of lon, lat in kml (6 = ~0.1m, 5 = ~1m)
+KMZ = False # --kmz, kml files are zipped (see pack_kmz)
+FLIGHT_TOLERANCE = 1.0 # --flight-tolerance, meters. base tolerance of simplified flight path versions (0 = no simplification)
+FLIGHT_SIMPLIFY_MIN_POINTS = 1000 # shorter flight path is always written with all points
+FLIGHT_SIMPLIFY_LEVELS = (100, 10, 1) # tolerance multipliers of simplified flight path versions, coarse first
+FLIGHT_LOD_ERROR_PIXELS = 1 # simplified flight path version is shown while its tolerance is under this many pixels on screen
+FLIGHT_SPLIT_SECONDS = 600 # --flight-split-minutes. time without images after which next image starts new flight (0 = no split by time)
+FLIGHT_SPLIT_METERS = 1000 # --flight-split-meters. distance from previous image that starts new flight (0 = no split by distance)
+TILE_MAX = 0 # --tile-max N. if folder has more images, pins and frames are split to tiles loaded by area (0 = no tiles)
+TILE_MIN_LOD_PIXELS = 256 # tile is loaded when its area is this many pixels on screen
+TILE_MIN_SIZE_DEGREES = 0.001 # ~100m, smallest tile area (for images taken at one spot)
+TILE_MAX_DEPTH = 16 # quadtree depth limit, tile can have more than TILE_MAX images at this depth
+THUMBNAILS = False # --thumbnails, pin balloon shows small preview from THUMBNAIL_DIRNAME folder instead of full image
+THUMBNAIL_DIRNAME = '.jpgfolder2kml_thumbs'
+THUMBNAIL_SIZE = 500 # pixels, longer side
+THUMBNAIL_QUALITY = 85
+GEO_ENGINE = 'batch' # --geo-engine. 'batch' = numpy for whole folder, 'geopy' = per image geodesic (reference, slow)
+WORKERS = 1 # --workers N. 1 = process images one by one in this process
+WORKER_CHUNKSIZE = 32 # max images sent to worker process at once
+WORKER_POOL = None
+PREFETCH = 0 # --prefetch N, jpg headers read ahead (in threads) while parsing. default depends on filesystem, see default_prefetch
+PREFETCH_NETWORK = 16 # default for network shares (nfs, smb ...)
+PREFETCH_REMOVABLE = 4 # default for usb / sd card filesystems (vfat, exfat ...)
+PREFETCHER = None
+PIPELINE_DEPTH = 4 # folders waiting between pipeline stages (walk -> image details -> kml)
+USE_CACHE = True # --no-cache. details of images are cached in each folder, in CACHE_FILENAME
+REBUILD_CACHE = False # --rebuild-cache, parse all images again
+CACHE_FILENAME = '.jpgfolder2kml.cache'
+WATCH_DIRNAME = '.jpgfolder2kml_watch' # --watch, batch kml files
+WATCH_KML_FILENAME = 'drone_watch.kml'
+WATCH_SETTLE_SECONDS = 2.0 # new file is processed when its size did not change this long (still being copied)
+WATCH_POLL_SECONDS = 5.0 # folder tree listing interval, where inotify is not available
+WATCH_REFRESH_SECONDS = 5 # google earth reloads batch list
+DEM = None # --dem FILE or FOLDER, terrain heights (SRTM .hgt or GeoTIFF) for ground frames, see make_frameonground_dem
+DEM_RASTERS = None # (DEM, opened rasters)
+DEM_MAX_METERS = 5000 # longest camera ray followed over terrain (same as ENU_APPROXIMATION_MAX_METERS)
+DEM_MIN_STEP_METERS = 2.0 # ray march step is half DEM pixel, but not shorter
+DEM_REFINE_STEPS = 8 # bisection steps of hit point between march samples
+DEM_MARCH_SAMPLES = 50_000 # ray samples evaluated at once (~10MB of arrays)
+DEM_CACHE_BLOCKS = 64 # decoded (deflate) DEM strips / tiles kept
+FGB = False # --fgb, FlatGeobuf layers (images, frames, flights) are written next to kml of folder (see list_to_fgb)
+FGB_NODE_SIZE = 16 # R-tree node size (flatgeobuf default)
+CATALOG = None # --catalog FILE, sqlite catalog where processed images are added (see open_catalog)
+CATALOG_VERSION = 2 # increase when catalog tables change
+CACHE_VERSION = 4 # increase when get_usefuldetail or make_frameonground calculate details differently (or cached details change)
+
+# per camera model corrections, applied to details in get_usefuldetail
+MODEL_CORRECTIONS = {
+    'FC7303': {'FocalLengthIn35mmFilm': 27.4}, # dji mini2, corrected value using actual images (24 reported, 28.5 actual measured)
+    'XL801': {'DigitalZoomRatio': 0.0}, # autel 4T, zoom already included in 35mm focal
+}
+
+
+# ================ LIBRARY API ===================
+# use from other python code:
+#     import jpgfolder2kml
+#     results = jpgfolder2kml.process_tree('/data/flights', jpgfolder2kml.Options(workers=4, thumbnails=True))
+#     results['index_kml'], results['kml_files'], results['counters'], results['errors']
+# search images of all folders added to catalog (Options(catalog=...)) and make kml of them:
+#     images = jpgfolder2kml.catalog_query('flights.sqlite', point=(24.1, 57.05), time_range=(jpgfolder2kml.catalog_seconds('2023-05-01'), jpgfolder2kml.catalog_seconds('2023-05-31', end=True)))
+#     jpgfolder2kml.catalog_to_kml(images, '/tmp/field')
+# FlatGeobuf layers of folders (Options(fgb=True), see list_to_fgb) are read by GIS libraries, only features in bbox:
+#     geopandas.read_file('/data/flights/a/drone_2023-05-01 10-00-59_frames.fgb', bbox=(24.0, 57.0, 24.2, 57.1))
+
+# option name: module setting that it sets for the run
+OPTION_SETTINGS = {
+    'workers': 'WORKERS',
+    'prefetch': 'PREFETCH',
+    'thumbnails': 'THUMBNAILS',
+    'geo_engine': 'GEO_ENGINE',
+    'flight_tolerance': 'FLIGHT_TOLERANCE',
+    'flight_split_seconds': 'FLIGHT_SPLIT_SECONDS',
+    'flight_split_meters': 'FLIGHT_SPLIT_METERS',
+    'tile_max': 'TILE_MAX',
+    'compact': 'COMPACT',
+    'precision': 'COORDINATE_PRECISION',
+    'kmz': 'KMZ',
+    'fgb': 'FGB',
+    'dem': 'DEM',
+    'catalog': 'CATALOG',
+    'use_cache': 'USE_CACHE',
+    'rebuild_cache': 'REBUILD_CACHE',
+    'pitch_if_not_readable': 'PITCH_IF_NOT_REDABLE',
+    'ground_frame_height': 'GROUND_FRAME_HEIGHT',
+    'debug_print': 'DEBUG_PRINT',
+}
+
+class Options:
+    # settings of process_tree run, Options(workers=4, tile_max=500). not given options have script defaults
+    workers = WORKERS # 0 = one per cpu core
+    prefetch = None # None = by filesystem of folder (see default_prefetch)
+    thumbnails = THUMBNAILS
+    geo_engine = GEO_ENGINE
+    flight_tolerance = FLIGHT_TOLERANCE
+    flight_split_seconds = FLIGHT_SPLIT_SECONDS
+    flight_split_meters = FLIGHT_SPLIT_METERS
+    tile_max = TILE_MAX
+    compact = COMPACT
+    precision = COORDINATE_PRECISION
+    kmz = KMZ
+    fgb = FGB
+    dem = DEM
+    catalog = CATALOG
+    use_cache = USE_CACHE
+    rebuild_cache = REBUILD_CACHE
+    pitch_if_not_readable = PITCH_IF_NOT_REDABLE
+    ground_frame_height = GROUND_FRAME_HEIGHT
+    debug_print = DEBUG_PRINT
+
+    def __init__(self, **options):
+        for name, value in options.items():
+            if name not in OPTION_SETTINGS: raise TypeError(f"unknown option '{name}', options are: {', '.join(OPTION_SETTINGS)}")
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return 'Options(' + ', '.join(f'{name}={getattr(self, name)!r}' for name in OPTION_SETTINGS) + ')'
+
+def apply_options(path, options):
+    # image parsing, kml writing and worker processes read settings from module, options are set there for the run
+    global folder_path, WORKERS, PREFETCH
+    folder_path = path
+    for name, setting in OPTION_SETTINGS.items():
+        globals()[setting] = getattr(options, name)
+    if WORKERS <= 0: WORKERS = os.cpu_count()
+    if PREFETCH is None: PREFETCH = default_prefetch(path)
+
+@contextlib.contextmanager
+def run_options(path, options):
+    # options are set in module for the run (apply_options), module settings before it are restored after - later library
+    # calls (catalog_to_kml ...) get script defaults again. runs from other threads wait (settings are module wide)
+    with RUN_LOCK:
+        saved = {setting: globals()[setting] for setting in OPTION_SETTINGS.values()}
+        saved['folder_path'] = folder_path
+        apply_options(path, options)
+        try:
+            yield
+        finally:
+            globals().update(saved)
+
+def reset_run_state():
+    for counter in COUNTERS: COUNTERS[counter] = 0
+    RUN_STATS.update({'stages': {}, 'folders': [], 'bytes_read': 0, 'errors': {}, 'slowest_files': []})
+    global_kml_list.clear()
+
+def process_tree(path, options=None):
+    # processes folder tree into kml files (one per folder with images), google earth is not opened. returns dict:
+    #   index_kml - kml to open (the only kml, or set_of_N_files.kml linking all), None if no images found
+    #   kml_files - all kml files made, counters, errors - count of not suitable files by category,
+    #   elapsed_s, run_stats - time per stage and folder, slowest files, folder and settings (see write_run_report)
+    if not os.path.isdir(path): raise NotADirectoryError(path)
+    with run_options(path, options or Options()):
+        if DEM: dem_rasters() # missing or unsupported DEM file is reported before processing starts
+        reset_run_state()
+        start_time = time.time()
+        start_worker_pool()
+        try:
+            process_folder_to_data(path)
+        finally:
+            stop_worker_pool()
+        index_kml = None
+        with timed('index'):
+            if global_kml_list: index_kml = write_kml_index()
+        COUNTERS['kml_files'] = len(global_kml_list)
+        # copies - next run resets module counters and stats, results of this one stay as they are
+        run_stats = dict(copy.deepcopy(RUN_STATS), folder=folder_path, settings=run_settings())
+        return {'index_kml': index_kml, 'kml_files': list(global_kml_list), 'counters': dict(COUNTERS), 'errors': dict(RUN_STATS['errors']), 
+                'elapsed_s': time.time() - start_time, 'run_stats': run_stats}
+
+
+# ================ COMMAND LINE ===================
+def numbers_list(text):
+    return tuple(float(number) for number in text.split(','))
+
+def parse_arguments(argv=None):
+    import argparse
+    arg_parser = argparse.ArgumentParser(description='Process folder (tree) of drone images into Google Earth KML file(s)')
+    arg_parser.add_argument('folder', nargs='?', help='folder with images, current directory if not given')
+    arg_parser.add_argument('--workers', type=int, default=WORKERS, help='number of processes reading images, 0 = one per cpu core')
+    arg_parser.add_argument('--prefetch', type=int, default=None, help=f'number of jpg headers read ahead in threads (faster on network shares, card readers), 0 = off. default: {PREFETCH_NETWORK} for network, {PREFETCH_REMOVABLE} for usb/sd card filesystem, off for local disk')
+    arg_parser.add_argument('--thumbnails', action='store_true', help=f'pin balloon shows small preview image made into {THUMBNAIL_DIRNAME} folder')
+    arg_parser.add_argument('--geo-engine', choices=['batch', 'geopy'], default=GEO_ENGINE, help='ground frame calculation, geopy is slow reference')
+    arg_parser.add_argument('--flight-tolerance', type=float, default=FLIGHT_TOLERANCE, help=f'meters, simplified flight path versions for zoomed out view (flights with more than {FLIGHT_SIMPLIFY_MIN_POINTS} images), 0 = off')
+    arg_parser.add_argument('--flight-split-minutes', type=float, default=FLIGHT_SPLIT_SECONDS / 60, help='images of folder are split to separate flights (no line between) where time between images is longer, 0 = off')
+    arg_parser.add_argument('--flight-split-meters', type=float, default=FLIGHT_SPLIT_METERS, help='... or where distance between images is longer, 0 = off')
+    arg_parser.add_argument('--tile-max', type=int, default=TILE_MAX, help='split pins to area tiles with at most N images each, if folder has more than N images (0 = no tiles)')
+    arg_parser.add_argument('--compact', action='store_true', help='smaller kml, faster to load: image details as data fields with shared balloon style, frames of folder in one placemark')
+    arg_parser.add_argument('--precision', type=int, choices=range(0, 10), metavar='0-9', default=COORDINATE_PRECISION, help='decimals of coordinates in kml (6 = ~0.1m, 5 = ~1m)')
+    arg_parser.add_argument('--kmz', action='store_true', help='write zipped kmz files instead of kml (folder files, their tiles and set_of_N_files index)')
+    arg_parser.add_argument('--fgb', action='store_true', help='also write FlatGeobuf files (spatially indexed, for GIS tools) of folder: camera points, ground frames, flight lines with image details')
+    arg_parser.add_argument('--dem', help='terrain for ground frames: SRTM .hgt or GeoTIFF (lon/lat degrees) file, or folder of them. frames outside DEM stay on flat plane')
+    arg_parser.add_argument('--catalog', help='sqlite file where processed images are added (made if not there). with --query-* options: search catalog, write found images to kml in folder, do not process folder')
+    arg_parser.add_argument('--query-point', type=numbers_list, metavar='LON,LAT', help='images whose ground frame covers point')
+    arg_parser.add_argument('--query-bbox', type=numbers_list, metavar='WEST,SOUTH,EAST,NORTH', help='images whose ground frame is (partly) in area')
+    arg_parser.add_argument('--query-time', nargs=2, metavar=('FROM', 'TO'), help='images taken in time range, 2023-05-01 or "2023-05-01 10:00:00"')
+    arg_parser.add_argument('--watch', action='store_true', help=f'after processing, keep watching folder tree and add new images (while they are copied) through {WATCH_KML_FILENAME}, ctrl+c to stop')
+    arg_parser.add_argument('--report', help='write run statistics (time per stage and folder, bytes read, errors, slowest files) to this json file')
+    arg_parser.add_argument('--profile', action='store_true', help='profile run with cProfile, print hot functions (and add to report)')
+    arg_parser.add_argument('--no-cache', action='store_true', help=f'do not read or write {CACHE_FILENAME} files')
+    arg_parser.add_argument('--rebuild-cache', action='store_true', help='parse all images again, ignoring cached details')
+    # unknown arguments are ignored - file managers can add their own when folder is dropped on script
+    args, _ = arg_parser.parse_known_args(argv)
+    return args
+
+def main(argv=None):
+    global PROFILERS
+    args = parse_arguments(argv)
+    path = args.folder if args.folder and os.path.isdir(args.folder) else os.getcwd()
+    options = Options(workers=args.workers, prefetch=args.prefetch, thumbnails=args.thumbnails, geo_engine=args.geo_engine, 
+                      flight_tolerance=args.flight_tolerance, flight_split_seconds=args.flight_split_minutes * 60, flight_split_meters=args.flight_split_meters, tile_max=args.tile_max, 
+                      compact=args.compact, precision=args.precision, kmz=args.kmz, fgb=args.fgb, dem=args.dem, catalog=args.catalog, use_cache=not args.no_cache, rebuild_cache=args.rebuild_cache)
+    if args.catalog and (args.query_point or args.query_bbox or args.query_time):
+        if args.folder: os.makedirs(args.folder, exist_ok=True)
+        query_catalog_to_kml(args, args.folder or os.getcwd(), options)
+        return
 
-# ACTION STARTS HERE
-start_time = time.time()
-
-process_folder_to_data(folder_path)
-open_google_earth_end()
-
-COUNTERS['kml_files'] = len(global_kml_list)
-
-end_time = time.time()
-print(f"Elapsed {end_time-start_time:.1f}s. (folders {COUNTERS['folders']} jpg_files {COUNTERS['jpg_files']} kml_files {COUNTERS['kml_files']})")
-if COUNTERS['jpg_err']: print(f" {COUNTERS['jpg_err']} jpg files coud not be processed")
+    if args.profile:
+        import cProfile
+        PROFILERS = [cProfile.Profile()] # walker and kml writer threads add theirs
+        PROFILERS[0].enable()
+
+    results = process_tree(path, options)
+
+    profile_top = None
+    if PROFILERS:
+        PROFILERS[0].disable()
+        profile_top = profile_top_functions(PROFILERS, PROFILE_TOP)
+        PROFILERS = None
+    if args.report: write_run_report(args.report, results, profile_top)
+    counters = results['counters']
+    print(f"Elapsed {results['elapsed_s']:.1f}s. (folders {counters['folders']} jpg_files {counters['jpg_files']} kml_files {counters['kml_files']})")
+    if counters['jpg_err']: print(f" {counters['jpg_err']} jpg files coud not be processed ({', '.join(f'{category} {count}' for category, count in results['errors'].items())})")
+    if args.watch:
+        watch_tree(path, options, results['index_kml'], on_start=open_google_earth_end)
+    else:
+        open_google_earth_end(results['index_kml'])
+
+def query_catalog_to_kml(args, path, options):
+    # --query-*: found images are listed and written to kml in folder, opened in google earth
+    if args.query_point and len(args.query_point) != 2: sys.exit('--query-point needs LON,LAT')
+    if args.query_bbox and len(args.query_bbox) != 4: sys.exit('--query-bbox needs WEST,SOUTH,EAST,NORTH')
+    time_range = (catalog_seconds(args.query_time[0]), catalog_seconds(args.query_time[1], end=True)) if args.query_time else None
+    with run_options(path, options):
+        start_time = time.time()
+        try:
+            images = catalog_query(args.catalog, args.query_point, args.query_bbox, time_range)
+        except (FileNotFoundError, ValueError) as e:
+            sys.exit(str(e))
+        print(f"{len(images)} images found in {(time.time() - start_time) * 1000:.0f}ms")
+        for details in sorted(images, key=lambda x: x['DateTime']):
+            print(f"{details['path']}: {details['DateTime']} {details['lon_lat_alt']}")
+        if images:
+            open_google_earth_end(catalog_to_kml(images, path))
+
+# ACTION STARTS HERE (guarded - worker processes import this file too)
+if __name__ == '__main__':
+    main()
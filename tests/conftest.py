@@ -0,0 +1,19 @@
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # jpgfolder2kml.py and benchmark.py
+
+
+@pytest.fixture(scope='session')
+def synthetic_tree(tmp_path_factory):
+    # benchmark.generate_tree images: FC7303 (mini2, gimbal pitch 0), FC3582, XL801 (autel), FC7303 without gimbal tags,
+    # every 50th without gps. 2 folders, small image body
+    import benchmark
+    root = str(tmp_path_factory.mktemp('tree'))
+    benchmark.generate_tree(root, 120, 2, 64, 48, 0)
+    return root
+
+
+def jpg_files(folder):
+    return [(os.path.join(folder, name), name) for name in sorted(os.listdir(folder)) if name.endswith('.JPG')]
@@ -0,0 +1,46 @@
+import json, os, pickle
+
+import benchmark
+import jpgfolder2kml
+
+
+class MakesFolder:
+    # pickle payload - loading it runs os.mkdir
+    def __init__(self, path): self.path = path
+    def __reduce__(self): return (os.mkdir, (self.path,))
+
+
+def run(root):
+    return jpgfolder2kml.process_tree(root, jpgfolder2kml.Options(prefetch=0))
+
+
+def test_read_errors_are_parsed_again(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    benchmark.generate_tree(root, 12, 1, 64, 48, 0)
+    get_usefuldetail = jpgfolder2kml.get_usefuldetail
+    def share_timeout(full_path, filename, **kwargs):
+        if filename == 'DJI_0003.JPG': raise TimeoutError('share timeout') # OSError
+        return get_usefuldetail(full_path, filename, **kwargs)
+    monkeypatch.setattr(jpgfolder2kml, 'get_usefuldetail', share_timeout)
+    assert run(root)['run_stats']['errors'].get('read_error') == 1
+    with open(os.path.join(root, jpgfolder2kml.CACHE_FILENAME), encoding='UTF-8') as f:
+        files = json.load(f)['files']
+    assert 'DJI_0003.JPG' not in files and len(files) == 11 # no gps image stays cached as not suitable
+    assert isinstance(files['DJI_0000.JPG'][2]['GPSAltitude'], float)
+
+    monkeypatch.setattr(jpgfolder2kml, 'get_usefuldetail', get_usefuldetail) # share is back
+    results = run(root)
+    assert 'read_error' not in results['run_stats']['errors']
+    assert results['run_stats']['folders'][0]['parsed'] == 1
+
+
+def test_pickle_cache_is_not_loaded(tmp_path):
+    root = str(tmp_path)
+    benchmark.generate_tree(root, 12, 1, 64, 48, 0)
+    marker = str(tmp_path / 'pwned')
+    with open(os.path.join(root, jpgfolder2kml.CACHE_FILENAME), 'wb') as f:
+        pickle.dump({'signature': None, 'files': MakesFolder(marker)}, f)
+    results = run(root)
+    assert not os.path.exists(marker)
+    assert results['run_stats']['folders'][0]['parsed'] == 12
+    assert run(root)['run_stats']['folders'][0]['parsed'] == 0 # json cache written over it is used
@@ -0,0 +1,84 @@
+import copy, os, re, sqlite3
+
+import numpy
+import pytest
+
+import jpgfolder2kml
+from conftest import jpg_files
+
+
+def folder_table(folder):
+    details = [d for d, stats in jpgfolder2kml.get_usefuldetail_list_with_stats(jpg_files(folder)) if isinstance(d, dict)]
+    table = jpgfolder2kml.ImageTable(details).sorted_by_datetime()
+    jpgfolder2kml.make_frameonground_batch(table)
+    return table
+
+
+def test_query_finds_added_images_without_changing_catalog(synthetic_tree, tmp_path):
+    catalog_path = str(tmp_path / 'flights.sqlite')
+    table = folder_table(synthetic_tree)
+    connection = jpgfolder2kml.open_catalog(catalog_path)
+    jpgfolder2kml.catalog_add(connection, synthetic_tree, table)
+    connection.close()
+    modified = os.stat(catalog_path).st_mtime_ns
+    point = tuple(table.frameonground[3, 0, :2].tolist()) # frame centre of image 3
+    found = jpgfolder2kml.catalog_query(catalog_path, point=point)
+    assert os.path.join(synthetic_tree, table.filename[3]) in [image['path'] for image in found]
+    assert len(jpgfolder2kml.catalog_query(catalog_path)) == len(table)
+    assert os.stat(catalog_path).st_mtime_ns == modified
+
+
+def test_query_of_missing_catalog_fails_and_makes_no_file(tmp_path):
+    catalog_path = str(tmp_path / 'typo.sqlite')
+    with pytest.raises(FileNotFoundError):
+        jpgfolder2kml.catalog_query(catalog_path, point=(24.1, 56.95))
+    assert not os.path.exists(catalog_path)
+
+
+@pytest.fixture
+def terrain_catalog(synthetic_tree, tmp_path):
+    # catalog of folder with frames moved away from flat ground frames (as --dem frames are)
+    table = folder_table(synthetic_tree)
+    table.frameonground[:, :, :2] += (0.0002, 0.0001)
+    catalog_path = str(tmp_path / 'flights.sqlite')
+    connection = jpgfolder2kml.open_catalog(catalog_path)
+    jpgfolder2kml.catalog_add(connection, synthetic_tree, table)
+    connection.close()
+    return table, catalog_path
+
+
+def kml_frames(kml_file):
+    with open(kml_file, encoding='UTF-8') as f: kml = f.read()
+    frames = re.findall(r'<name>Frame</name>.*?<coordinates>(.*?)</coordinates>', kml, re.S)
+    return [[tuple(float(value) for value in point.split(',')[:2]) for point in frame.split()[1:]] for frame in frames] # without camera point
+
+
+def test_export_uses_stored_frames_and_keeps_query_results(terrain_catalog, synthetic_tree, tmp_path):
+    table, catalog_path = terrain_catalog
+    images = jpgfolder2kml.catalog_query(catalog_path)
+    before = copy.deepcopy(images)
+    for kml_folder in (tmp_path / 'first', tmp_path / 'second' / 'export'): # same results exported twice
+        os.makedirs(kml_folder)
+        kml_file = jpgfolder2kml.catalog_to_kml(images, str(kml_folder))
+        assert images == before
+        with open(kml_file, encoding='UTF-8') as f:
+            links = re.findall(r'src="(.*?)"', f.read())
+        assert len(links) == len(table) and all(os.path.isfile(os.path.join(kml_folder, link)) for link in links)
+        expected = numpy.round(table.frameonground[:, :, :2], jpgfolder2kml.COORDINATE_PRECISION).tolist()
+        assert numpy.allclose(kml_frames(kml_file), expected, atol=1e-6)
+
+
+def test_catalog_before_frame_column(terrain_catalog):
+    # version 1 catalog (no frame column): frames from corners, writing adds the column
+    table, catalog_path = terrain_catalog
+    connection = sqlite3.connect(catalog_path)
+    connection.executescript('ALTER TABLE images DROP COLUMN frame; PRAGMA user_version = 1;')
+    connection.close()
+    images = sorted(jpgfolder2kml.catalog_query(catalog_path), key=lambda details: details['DateTime'])
+    frames = numpy.array([details['frameonground'][1:] for details in images])
+    assert numpy.allclose(frames[:, 1:, :2], table.frameonground[:, 1:, :2])
+    connection = jpgfolder2kml.open_catalog(catalog_path)
+    assert connection.execute('PRAGMA user_version').fetchone()[0] == jpgfolder2kml.CATALOG_VERSION
+    jpgfolder2kml.catalog_add(connection, os.path.dirname(catalog_path), table.take([0]), replace_folder=False)
+    connection.close()
+    assert len(jpgfolder2kml.catalog_query(catalog_path)) == len(table) + 1
@@ -0,0 +1,149 @@
+import struct, zlib
+
+import numpy
+import pytest
+
+import jpgfolder2kml
+
+WEST, NORTH, STEP = 24.0, 57.0, 1 / 1200 # centre of pixel 0, 0 and pixel size, degrees
+ROWS, COLS = 130, 150 # not multiple of tile size - edge tiles are partial
+
+
+def write_geotiff(path, heights, tile=None, deflate=False, predictor=1):
+    # minimal little endian GeoTIFF: lon/lat pixel scale and tie point (pixel is area), strips of 8 rows or square tiles
+    dtype = heights.dtype
+    if tile:
+        padded = numpy.zeros((-(-ROWS // tile) * tile, -(-COLS // tile) * tile), dtype)
+        padded[:ROWS, :COLS] = heights
+        blocks = [padded[r:r + tile, c:c + tile] for r in range(0, padded.shape[0], tile) for c in range(0, padded.shape[1], tile)]
+    else:
+        blocks = [heights[r:r + 8] for r in range(0, ROWS, 8)]
+    raws = []
+    for block in blocks:
+        if predictor == 2: block = numpy.diff(block, axis=1, prepend=numpy.zeros((block.shape[0], 1), dtype)).astype(dtype)
+        raws.append(zlib.compress(block.tobytes()) if deflate else block.tobytes())
+    offsets = (8 + numpy.cumsum([0] + [len(raw) for raw in raws[:-1]])).tolist()
+    sample_format = {'i': 2, 'u': 1, 'f': 3}[dtype.kind]
+    tags = {256: (4, [COLS]), 257: (4, [ROWS]), 258: (3, [dtype.itemsize * 8]), 259: (3, [8 if deflate else 1]), 277: (3, [1]),
+            317: (3, [predictor]), 339: (3, [sample_format]), 33550: (12, [STEP, STEP, 0.0]),
+            33922: (12, [0.0, 0.0, 0.0, WEST - STEP / 2, NORTH + STEP / 2, 0.0]), 34735: (3, [1, 1, 0, 2, 1024, 0, 1, 2, 1025, 0, 1, 1])}
+    if tile: tags.update({322: (3, [tile]), 323: (3, [tile]), 324: (4, offsets), 325: (4, [len(raw) for raw in raws])})
+    else: tags.update({273: (4, offsets), 278: (3, [8]), 279: (4, [len(raw) for raw in raws])})
+    data = b''.join(raws)
+    extra, entries = b'', []
+    extra_position = 8 + len(data)
+    for tag in sorted(tags):
+        kind, values = tags[tag]
+        raw = struct.pack(f"<{len(values)}{ {3: 'H', 4: 'I', 12: 'd'}[kind] }", *values)
+        if len(raw) <= 4:
+            entries.append(struct.pack('<HHI', tag, kind, len(values)) + raw.ljust(4, b'\0'))
+        else:
+            entries.append(struct.pack('<HHII', tag, kind, len(values), extra_position + len(extra)))
+            extra += raw
+    with open(path, 'wb') as f:
+        f.write(b'II' + struct.pack('<HI', 42, extra_position + len(extra)) + data + extra)
+        f.write(struct.pack('<H', len(entries)) + b''.join(entries) + b'\0\0\0\0')
+
+
+@pytest.mark.parametrize('dtype, options', [('<i2', {}), ('<i2', {'tile': 64, 'deflate': True, 'predictor': 2}), ('<f4', {'deflate': True})])
+def test_geotiff_heights_are_bilinear(tmp_path, dtype, options):
+    # plane (height grows 1m per pixel east, 2m per pixel south) - bilinear interpolation gives it exactly
+    rows, cols = numpy.mgrid[0:ROWS, 0:COLS]
+    path = str(tmp_path / 'dem.tif')
+    write_geotiff(path, (100 + cols + 2 * rows).astype(dtype), **options)
+    raster = jpgfolder2kml.ElevationRaster(path)
+    random = numpy.random.default_rng(1)
+    col, row = random.uniform(0, COLS - 1, 500), random.uniform(0, ROWS - 1, 500)
+    heights = raster.heights(WEST + col * STEP, NORTH - row * STEP)
+    assert numpy.allclose(heights, 100 + col + 2 * row, atol=1e-6)
+    assert numpy.isnan(raster.heights(numpy.array([WEST - 0.1]), numpy.array([NORTH]))).all() # outside raster
+
+
+TAKEOFF = 200.0 # m above sea, drone altitudes are over it
+
+
+def camera_table(pitches=(-90, -60, -45), azimuths=(0, 70, 160, 250)):
+    # images over middle of test DEM area, 100 m over takeoff, camera in all pitch and azimuth combinations
+    details_list = []
+    for k, (pitch, azimuth) in enumerate((pitch, azimuth) for pitch in pitches for azimuth in azimuths):
+        alt = 100.0 + k
+        details_list.append({'GPSAltitude': TAKEOFF + alt, 'camera_alt_assumed': alt, 'FlightPitchDegree': 0.0, 'FlightYawDegree': float(azimuth),
+                             'GimbalPitchDegree': float(pitch), 'GimbalYawDegree': float(azimuth), 'camera_pitch_assumed': float(pitch), 
+                             'camera_azimuth_assumed': float(azimuth), 'FocalLengthIn35mmFilm': 24.0, 'DigitalZoomRatio': 1.0, 
+                             'ExifImageWidth': 4000.0, 'ExifImageHeight': 3000.0, 'DateTimeOriginal': f'2023:05:01 10:00:{k:02d}', 
+                             'DateTime': f'2023:05:01 10:00:{k:02d}', 'Model': 'FC7303', 'filename': f'DJI_{k:04d}.JPG', 'thumbnail': None,
+                             'lon_lat_alt': (WEST + COLS * STEP / 2 + k * 0.00002, NORTH - ROWS * STEP / 2, alt)})
+    return jpgfolder2kml.ImageTable(details_list)
+
+
+def sloped_dem(tmp_path, per_col=5.0, per_row=-3.0):
+    # plane rising per_col m per pixel east and per_row m per pixel south, TAKEOFF under cameras
+    rows, cols = numpy.mgrid[0:ROWS, 0:COLS]
+    path = str(tmp_path / 'slope.tif')
+    write_geotiff(path, (TAKEOFF + per_col * (cols - COLS / 2) + per_row * (rows - ROWS / 2)).astype('<f4'), deflate=True)
+    return path
+
+
+def test_geopy_engine_uses_dem(tmp_path, monkeypatch):
+    monkeypatch.setattr(jpgfolder2kml, 'DEM', sloped_dem(tmp_path))
+    monkeypatch.setattr(jpgfolder2kml, 'DEM_RASTERS', None)
+    frames = {}
+    for engine in ('batch', 'geopy'):
+        monkeypatch.setattr(jpgfolder2kml, 'GEO_ENGINE', engine)
+        table = camera_table()
+        jpgfolder2kml.make_frameonground_all(table)
+        frames[engine] = table.frameonground
+    flat = camera_table()
+    monkeypatch.setattr(jpgfolder2kml, 'DEM', None)
+    jpgfolder2kml.make_frameonground_all(flat)
+    assert numpy.allclose(frames['geopy'], frames['batch'], atol=1e-6) # terrain hits of the same rays
+    assert numpy.abs(frames['geopy'][:, :, :2] - flat.frameonground[:, :, :2]).max() > 1e-4 # not flat frames (~10 m and more)
+
+
+def meters_apart(lon_lat, other_lon_lat):
+    difference = numpy.asarray(lon_lat)[..., :2] - numpy.asarray(other_lon_lat)[..., :2]
+    return numpy.hypot(difference[..., 0] * 111320 * numpy.cos(numpy.radians(NORTH)), difference[..., 1] * 111320)
+
+
+def dem_frames(monkeypatch, dem_path):
+    monkeypatch.setattr(jpgfolder2kml, 'DEM', dem_path)
+    monkeypatch.setattr(jpgfolder2kml, 'DEM_RASTERS', None)
+    table = camera_table()
+    jpgfolder2kml.make_frameonground_batch(table)
+    return table
+
+
+def test_flat_dem_hits_flat_frames(tmp_path, monkeypatch):
+    # terrain at flat frame plane (GROUND_FRAME_HEIGHT over takeoff) - ray march ends where flat frames are
+    path = str(tmp_path / 'flat.tif')
+    write_geotiff(path, numpy.full((ROWS, COLS), TAKEOFF + jpgfolder2kml.GROUND_FRAME_HEIGHT, '<f4'))
+    table = dem_frames(monkeypatch, path)
+    flat = camera_table()
+    monkeypatch.setattr(jpgfolder2kml, 'DEM', None)
+    jpgfolder2kml.make_frameonground_batch(flat)
+    assert meters_apart(table.frameonground, flat.frameonground).max() < 0.25 # bisection ends ~0.1 m along ray
+    assert numpy.allclose(table.frameonground[:, :, 2], jpgfolder2kml.GROUND_FRAME_HEIGHT)
+
+
+def test_sloped_dem_hits_plane(tmp_path, monkeypatch):
+    # plane rising east and north: ray from camera (height TAKEOFF + alt) hits it at analytic distance t, where
+    # camera height + up * t = plane height at ray point (earth curvature, mm at these distances, left out)
+    per_col, per_row = 5.0, -3.0
+    table = dem_frames(monkeypatch, sloped_dem(tmp_path, per_col, per_row))
+    x, y, z, focal_length_pixels = jpgfolder2kml.camera_rays(table)
+    length = numpy.sqrt(x**2 + y**2 + z**2)
+    east, north, up = x / length, y / length, z / length
+    lon, lat, alt = (values[:, None] for values in table.lon_lat_alt.T)
+    def plane(lon, lat):
+        return TAKEOFF + per_col * ((lon - WEST) / STEP - COLS / 2) + per_row * ((NORTH - lat) / STEP - ROWS / 2)
+    lon_per_meter, _ = jpgfolder2kml.enu_to_lonlat(lon, lat, 1.0, 0.0)
+    _, lat_per_meter = jpgfolder2kml.enu_to_lonlat(lon, lat, 0.0, 1.0)
+    rise = per_col / STEP * (lon_per_meter - lon) * east - per_row / STEP * (lat_per_meter - lat) * north # plane m per m along ray
+    t = (TAKEOFF + alt - plane(lon, lat)) / (rise - up)
+    expected = numpy.stack(jpgfolder2kml.enu_to_lonlat(lon, lat, east * t, north * t), axis=2)
+    assert (t > 50).all() and (t < 1000).all() # all rays hit terrain in DEM
+    assert meters_apart(table.frameonground, expected).max() < 0.4 # bisection ends ~0.1 m along ray
+    flat = camera_table()
+    monkeypatch.setattr(jpgfolder2kml, 'DEM', None)
+    jpgfolder2kml.make_frameonground_batch(flat)
+    assert meters_apart(table.frameonground, flat.frameonground).max() > 10 # slope moved frames
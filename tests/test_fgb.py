@@ -0,0 +1,146 @@
+import struct
+
+import numpy
+import pytest
+
+import jpgfolder2kml
+from test_catalog import folder_table
+
+COLUMN_KINDS = {code: kind for kind, (code, value_format) in jpgfolder2kml.FGB_COLUMN_TYPES.items()}
+
+
+# minimal flatbuffer reading - table fields by vtable slot, vectors and strings by offset
+def field(data, table, slot):
+    vtable = table - struct.unpack_from('<i', data, table)[0]
+    vtable_size = struct.unpack_from('<H', data, vtable)[0]
+    if 4 + 2 * slot >= vtable_size: return None
+    offset = struct.unpack_from('<H', data, vtable + 4 + 2 * slot)[0]
+    return table + offset if offset else None
+
+def target(data, position):
+    return position + struct.unpack_from('<I', data, position)[0]
+
+def vector(data, table, slot, item_format):
+    position = field(data, table, slot)
+    if position is None: return None
+    start = target(data, position)
+    count = struct.unpack_from('<I', data, start)[0]
+    return struct.unpack_from(f'<{count}{item_format}', data, start + 4)
+
+def string(data, table, slot):
+    start = target(data, field(data, table, slot))
+    size = struct.unpack_from('<I', data, start)[0]
+    return data[start + 4:start + 4 + size].decode('utf-8')
+
+def scalar(data, table, slot, value_format, default=0):
+    position = field(data, table, slot)
+    return struct.unpack_from('<' + value_format, data, position)[0] if position is not None else default
+
+def read_fgb(path):
+    # header fields, index nodes (min x, min y, max x, max y, offset) and features (xy, z, properties) in file order
+    with open(path, 'rb') as f: data = f.read()
+    assert data[:8] == jpgfolder2kml.FGB_MAGIC
+    header_size = struct.unpack_from('<I', data, 8)[0]
+    header = target(data, 12)
+    columns = []
+    column_vector = target(data, field(data, header, 7))
+    for k in range(struct.unpack_from('<I', data, column_vector)[0]):
+        column = target(data, column_vector + 4 + 4 * k)
+        columns.append((string(data, column, 0), COLUMN_KINDS[scalar(data, column, 1, 'B')]))
+    crs = target(data, field(data, header, 10))
+    fgb = {'name': string(data, header, 0), 'envelope': vector(data, header, 1, 'd'), 'geometry_type': scalar(data, header, 2, 'B'),
+           'has_z': scalar(data, header, 3, '?', False), 'columns': columns, 'features_count': scalar(data, header, 8, 'Q'),
+           'index_node_size': scalar(data, header, 9, 'H', 16), 'crs': (string(data, crs, 0), scalar(data, crs, 1, 'i'))}
+    node_count, level = fgb['features_count'], fgb['features_count']
+    while True: # levels up to root, one feature has root above it too
+        level = -(-level // fgb['index_node_size'])
+        node_count += level
+        if level == 1: break
+    index_start = 12 + header_size
+    fgb['nodes'] = [struct.unpack_from('<4dQ', data, index_start + 40 * k) for k in range(node_count)]
+    features_start = index_start + 40 * node_count
+    fgb['features'] = {}
+    position = features_start
+    while position < len(data):
+        size = struct.unpack_from('<I', data, position)[0]
+        feature = target(data, position + 4)
+        geometry = target(data, field(data, feature, 0))
+        fgb['features'][position - features_start] = (vector(data, geometry, 1, 'd'), vector(data, geometry, 2, 'd'),
+                                                      read_properties(data, feature, columns))
+        position += 4 + size
+    return fgb
+
+def read_properties(data, feature, columns):
+    properties = {}
+    start = target(data, field(data, feature, 1))
+    position, end = start + 4, start + 4 + struct.unpack_from('<I', data, start)[0]
+    while position < end:
+        index = struct.unpack_from('<H', data, position)[0]
+        name, kind = columns[index]
+        value_format = jpgfolder2kml.FGB_COLUMN_TYPES[kind][1]
+        if value_format:
+            properties[name] = struct.unpack_from(value_format, data, position + 2)[0]
+            position += 2 + struct.calcsize(value_format)
+        else:
+            size = struct.unpack_from('<I', data, position + 2)[0]
+            properties[name] = data[position + 6:position + 6 + size].decode('utf-8')
+            position += 6 + size
+    return properties
+
+
+@pytest.fixture(scope='module')
+def fgb_files(synthetic_tree, tmp_path_factory):
+    table = folder_table(synthetic_tree)
+    return table, jpgfolder2kml.list_to_fgb(table, str(tmp_path_factory.mktemp('fgb')))
+
+
+def test_images_layer_round_trip(fgb_files):
+    table, (images_path, frames_path, flights_path) = fgb_files
+    fgb = read_fgb(images_path)
+    assert (fgb['name'], fgb['geometry_type'], fgb['has_z'], fgb['crs']) == ('images', jpgfolder2kml.FGB_POINT, True, ('EPSG', 4326))
+    assert fgb['columns'] == jpgfolder2kml.FGB_IMAGE_COLUMNS
+    assert fgb['features_count'] == len(table) == len(fgb['features'])
+    lon_lat = table.lon_lat_alt[:, :2]
+    assert fgb['envelope'] == (*lon_lat.min(axis=0).tolist(), *lon_lat.max(axis=0).tolist())
+    assert fgb['nodes'][0][:4] == fgb['envelope'] # root covers all
+
+    leaves = fgb['nodes'][-len(table):]
+    rows = {name: i for i, name in enumerate(table.filename)}
+    for west, south, east, north, offset in leaves: # leaf offsets point to features, in same order
+        xy, z, properties = fgb['features'][offset]
+        i = rows[properties['filename']]
+        assert xy == (west, south) == tuple(lon_lat[i].tolist()) and (east, north) == (west, south)
+        assert z == (table.lon_lat_alt[i, 2],)
+        assert properties['DateTime'] == table.DateTime[i] and properties['Model'] == table.Model[i]
+        assert properties['time'] == table.DateTime[i][:10].replace(':', '-') + 'T' + table.DateTime[i][11:19]
+    assert sorted(offset for *box, offset in leaves) == sorted(fgb['features'])
+
+
+def test_frames_and_flights_layers_round_trip(fgb_files):
+    table, (images_path, frames_path, flights_path) = fgb_files
+    frames = read_fgb(frames_path)
+    assert (frames['geometry_type'], frames['has_z'], frames['features_count']) == (jpgfolder2kml.FGB_POLYGON, False, len(table))
+    rows = {name: i for i, name in enumerate(table.filename)}
+    for west, south, east, north, offset in frames['nodes'][-len(table):]:
+        xy, z, properties = frames['features'][offset]
+        ring = numpy.array(xy).reshape(-1, 2)
+        assert numpy.array_equal(ring, table.frameonground[rows[properties['filename']], 1:, :2]) and z is None
+        assert (west, south, east, north) == (*ring.min(axis=0).tolist(), *ring.max(axis=0).tolist())
+
+    flights = read_fgb(flights_path)
+    segments = jpgfolder2kml.flight_segments(table.legs())
+    assert (flights['geometry_type'], flights['columns']) == (jpgfolder2kml.FGB_LINESTRING, jpgfolder2kml.FGB_FLIGHT_COLUMNS)
+    assert flights['features_count'] == len(segments)
+    assert sum(properties['images'] for xy, z, properties in flights['features'].values()) == len(table)
+
+
+def test_gdal_reads_bbox(fgb_files):
+    # same file through GDAL, when installed - spatial filter uses the index
+    pyogrio = pytest.importorskip('pyogrio')
+    table, (images_path, frames_path, flights_path) = fgb_files
+    lon_lat = table.lon_lat_alt[:, :2]
+    west, south = numpy.percentile(lon_lat, 25, axis=0).tolist()
+    east, north = numpy.percentile(lon_lat, 75, axis=0).tolist()
+    inside = (lon_lat[:, 0] >= west) & (lon_lat[:, 0] <= east) & (lon_lat[:, 1] >= south) & (lon_lat[:, 1] <= north)
+    meta, fids, geometry, fields = pyogrio.raw.read(images_path, bbox=(west, south, east, north), read_geometry=False, columns=['filename'])
+    assert sorted(fields[0].tolist()) == sorted(numpy.array(table.filename)[inside].tolist())
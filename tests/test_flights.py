@@ -0,0 +1,74 @@
+import math, re
+
+import numpy
+import pytest
+
+import jpgfolder2kml
+
+METERS_PER_DEGREE = math.pi / 180 * 6371000 # legs are on 6371 km sphere
+
+
+def flights_table():
+    # 3 flights: 5 images going north 10 s apart climbing 2 m, 20 min break, 4 images going east,
+    # then 10 s later 6 km away (other site) 2 images
+    points = [('10:00:%02d' % (10 * k), 24.1, 56.95 + k * 0.0001, 50.0 + 2 * k) for k in range(5)]
+    points += [('10:20:%02d' % (10 * k), 24.1 + k * 0.0002, 56.9504, 60.0) for k in range(4)]
+    points += [('10:20:%02d' % (40 + 10 * k), 24.2, 56.95, 60.0) for k in range(2)]
+    details_list = []
+    for k, (time, lon, lat, alt) in enumerate(points):
+        details_list.append({'GPSAltitude': alt, 'camera_alt_assumed': alt, 'FlightPitchDegree': 0.0, 'FlightYawDegree': 0.0,
+                             'GimbalPitchDegree': -90.0, 'GimbalYawDegree': 0.0, 'camera_pitch_assumed': -90.0, 'camera_azimuth_assumed': 0.0,
+                             'FocalLengthIn35mmFilm': 24.0, 'DigitalZoomRatio': 1.0, 'ExifImageWidth': 4000.0, 'ExifImageHeight': 3000.0,
+                             'DateTimeOriginal': '2023:05:01 ' + time, 'DateTime': '2023:05:01 ' + time, 'Model': 'FC7303',
+                             'filename': f'DJI_{k:04d}.JPG', 'thumbnail': None, 'lon_lat_alt': (lon, lat, alt)})
+    table = jpgfolder2kml.ImageTable(details_list)
+    jpgfolder2kml.make_frameonground_batch(table)
+    return table
+
+
+def test_legs_from_previous_image():
+    legs = flights_table().legs()
+    assert all(math.isnan(values[0]) for values in legs.values())
+    north, east = slice(1, 5), slice(6, 9)
+    numpy.testing.assert_allclose(legs['distance'][north], METERS_PER_DEGREE * 0.0001)
+    numpy.testing.assert_allclose(legs['distance'][east], METERS_PER_DEGREE * 0.0002 * math.cos(math.radians(56.9504)), rtol=1e-6)
+    numpy.testing.assert_allclose(legs['azimuth'][north], 0, atol=1e-9)
+    numpy.testing.assert_allclose(legs['azimuth'][east], 90, atol=0.01) # initial bearing, a bit north of east
+    numpy.testing.assert_array_equal(legs['seconds'][1:], [10, 10, 10, 10, 1160, 10, 10, 10, 10, 10])
+    numpy.testing.assert_allclose(legs['speed'][north], METERS_PER_DEGREE * 0.0001 / 10)
+    numpy.testing.assert_array_equal(legs['climb'][north], 2)
+
+
+def test_same_time_images_have_no_speed():
+    table = flights_table()
+    table.DateTime = [table.DateTime[0]] * len(table)
+    legs = table.legs()
+    assert (legs['seconds'][1:] == 0).all() and numpy.isnan(legs['speed']).all()
+
+
+@pytest.mark.parametrize('split_seconds, split_meters, segments', [
+    (600, 1000, [(0, 5), (5, 9), (9, 11)]), # time gap, distance gap
+    (600, 0, [(0, 5), (5, 11)]),
+    (0, 1000, [(0, 9), (9, 11)]),
+    (0, 0, [(0, 11)]),
+])
+def test_flights_split_at_time_and_distance_gaps(monkeypatch, split_seconds, split_meters, segments):
+    monkeypatch.setattr(jpgfolder2kml, 'FLIGHT_SPLIT_SECONDS', split_seconds)
+    monkeypatch.setattr(jpgfolder2kml, 'FLIGHT_SPLIT_METERS', split_meters)
+    assert jpgfolder2kml.flight_segments(flights_table().legs()) == segments
+
+
+def test_flight_summary_and_lines(tmp_path):
+    table = flights_table()
+    legs = table.legs()
+    assert jpgfolder2kml.flight_summary(table, legs, 0, 5).startswith(
+        f"2023:05:01 10:00:00 - 10:00:40, 5 images, 0.7 min, {4 * METERS_PER_DEGREE * 0.0001 / 1000:.2f} km, frames area ")
+    assert ', 1 images, 0.0 min, 0.00 km, ' in jpgfolder2kml.flight_summary(table, legs, 10, 11)
+    assert jpgfolder2kml.convex_hull_area(table.lon_lat_alt[:5, :2]) == 0 # points on a line
+    square = numpy.array([(24.1, 56.95), (24.1 + 0.001, 56.95), (24.1 + 0.001, 56.951), (24.1, 56.951), (24.1 + 0.0005, 56.9505)])
+    assert jpgfolder2kml.convex_hull_area(square) == pytest.approx(METERS_PER_DEGREE ** 2 * 1e-6 * math.cos(math.radians(56.9505)), rel=1e-3)
+
+    jpgfolder2kml.list_to_kml(table, str(tmp_path))
+    with open(next(tmp_path.glob('drone_*.kml')), encoding='UTF-8') as f: kml = f.read()
+    assert re.findall(r'<name>(flight \d+)</name>', kml) == ['flight 1', 'flight 2', 'flight 3'] # no line between flights
+    assert kml.count('\nflight ') == 3 # stats of each in document description
@@ -0,0 +1,35 @@
+import math
+
+import numpy
+
+import jpgfolder2kml
+from conftest import jpg_files
+
+MAX_METERS = 0.05 # batch (numpy) frames must be this close to geopy reference
+
+
+def meters_apart(a, b):
+    # (..., 3) lon, lat, alt points - local flat distance, fine at frame sizes
+    east = (a[..., 0] - b[..., 0]) * 111320 * numpy.cos(numpy.radians(b[..., 1]))
+    north = (a[..., 1] - b[..., 1]) * 110540
+    return numpy.sqrt(east ** 2 + north ** 2 + (a[..., 2] - b[..., 2]) ** 2)
+
+
+def test_batch_frames_match_geopy_reference(synthetic_tree):
+    details_list = []
+    for full_path, filename in jpg_files(synthetic_tree):
+        try:
+            details_list.append(jpgfolder2kml.get_usefuldetail(full_path, filename, with_frame=False))
+        except jpgfolder2kml.NotSuitableImage:
+            pass # no gps
+    assert {d['Model'] for d in details_list} >= {'FC7303', 'FC3582', 'XL801'}
+    assert any(d['GimbalPitchDegree'] == 0 for d in details_list) # mini2 and no gimbal tags - assumed pitch
+    table = jpgfolder2kml.ImageTable(details_list)
+    jpgfolder2kml.make_frameonground_batch(table)
+    for i, details in enumerate(details_list):
+        reference = dict(details)
+        jpgfolder2kml.make_frameonground(reference)
+        assert reference['frameonground'][0] == reference['lon_lat_alt']
+        distance = meters_apart(table.frameonground[i], numpy.array(reference['frameonground'][1:]))
+        assert distance.max() < MAX_METERS, (details['filename'], distance.max())
+        assert math.isclose(table.pixel_size_mrad[i], reference['pixel_size_mrad'], rel_tol=1e-9)
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import benchmark
+import jpgfolder2kml
+
+
+@pytest.fixture(scope='module')
+def drone_jpeg(tmp_path_factory):
+    # (path, segments before start of scan, image data from start of scan) of generated dji jpg: APP1 exif, APP1 xmp, jpeg tables
+    path = str(tmp_path_factory.mktemp('header') / 'DJI_0000.JPG')
+    benchmark.make_synthetic_jpeg(path, 0, benchmark.jpeg_body(640, 480))
+    with open(path, 'rb') as f: data = f.read()
+    segments, pos = [], 2
+    while data[pos+1] != 0xDA:
+        end = pos + 2 + int.from_bytes(data[pos+2:pos+4], 'big')
+        segments.append(data[pos:end])
+        pos = end
+    return path, segments, data[pos:]
+
+
+def parse(tmp_path, name, data):
+    path = str(tmp_path / name)
+    with open(path, 'wb') as f: f.write(data)
+    return jpgfolder2kml.get_usefuldetail_with_stats((path, name))
+
+
+def test_header_read_gives_full_file_details(drone_jpeg, monkeypatch):
+    path, segments, scan = drone_jpeg
+    details, stats = jpgfolder2kml.get_usefuldetail_with_stats((path, 'DJI_0000.JPG'))
+    assert 'read_full_file' not in stats and stats['bytes_read'] < os.path.getsize(path) # header only
+    monkeypatch.setattr(jpgfolder2kml, 'read_jpeg_header', lambda file_path: None) # odd file - PIL and mmap of whole file
+    full_details, full_stats = jpgfolder2kml.get_usefuldetail_with_stats((path, 'DJI_0000.JPG'))
+    assert 'read_full_file' in full_stats
+    assert details == full_details
+
+
+def test_xmp_outside_header_is_found_in_file(drone_jpeg, tmp_path):
+    path, (exif, xmp, *tables), scan = drone_jpeg
+    details, stats = parse(tmp_path, 'DJI_0001.JPG', b'\xff\xd8' + exif + b''.join(tables) + scan + xmp[4:]) # xmp packet after image data
+    assert 'read_full_file' in stats
+    assert details == jpgfolder2kml.get_usefuldetail_with_stats((path, 'DJI_0000.JPG'))[0] | {'filename': 'DJI_0001.JPG', 'iconname': '0001'}
+
+
+@pytest.mark.parametrize('name, corrupt', [
+    ('lost_sync', lambda exif, rest: exif + b'garbage' + rest), # bytes between segments
+    ('oversize', lambda exif, rest: exif + b''.join(benchmark.app_segment(0xE4, bytes(60000)) for k in range(18)) + rest), # over JPEG_HEADER_MAX_SIZE
+])
+def test_corrupt_header_falls_back_to_full_file(drone_jpeg, tmp_path, name, corrupt):
+    path, (exif, *rest), scan = drone_jpeg
+    details, stats = parse(tmp_path, f'DJI_{name}.JPG', b'\xff\xd8' + corrupt(exif, b''.join(rest)) + scan)
+    assert 'read_full_file' in stats
+    assert details['lon_lat_alt'] == jpgfolder2kml.get_usefuldetail_with_stats((path, 'DJI_0000.JPG'))[0]['lon_lat_alt']
+
+
+@pytest.mark.parametrize('cut', [100, 1000]) # in exif, in xmp
+def test_truncated_header_is_not_suitable(drone_jpeg, tmp_path, cut):
+    path, segments, scan = drone_jpeg
+    with open(path, 'rb') as f: data = f.read(cut)
+    details, stats = parse(tmp_path, 'DJI_cut.JPG', data)
+    assert details == 'no_xmp' and 'read_full_file' in stats
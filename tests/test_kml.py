@@ -0,0 +1,96 @@
+import html, io, math, os, posixpath, re, zipfile
+
+import pytest
+
+import benchmark
+import jpgfolder2kml
+
+
+def outputs(root):
+    return sorted(name for name in os.listdir(root) if name.startswith('drone_'))
+
+
+def test_kml_and_kmz_runs_leave_only_own_output(tmp_path):
+    root = str(tmp_path)
+    benchmark.generate_tree(root, 12, 1, 64, 48, 0)
+    jpgfolder2kml.process_tree(root, jpgfolder2kml.Options(tile_max=5, use_cache=False))
+    kml_name, tiles_name = outputs(root)
+    assert kml_name.endswith('.kml') and tiles_name.endswith('_tiles')
+
+    kmz_path = jpgfolder2kml.process_tree(root, jpgfolder2kml.Options(kmz=True, use_cache=False))['kml_files'][0]
+    assert outputs(root) == [kml_name[:-4] + '.kmz'] # no kml, no tiles of kml run
+    assert zipfile.ZipFile(kmz_path).namelist() == ['doc.kml'] # earlier tiles not packed
+
+    jpgfolder2kml.process_tree(root, jpgfolder2kml.Options(use_cache=False))
+    assert outputs(root) == [kml_name]
+
+
+def test_precision_out_of_range_is_argument_error():
+    assert jpgfolder2kml.parse_arguments(['--precision', '9']).precision == 9
+    for precision in ('-1', '10'):
+        with pytest.raises(SystemExit):
+            jpgfolder2kml.parse_arguments(['--precision', precision])
+
+
+def flight_lods(lon_lat_alt):
+    f = io.StringIO()
+    jpgfolder2kml.write_flight(f, lon_lat_alt)
+    kml = f.getvalue()
+    regions = [tuple(float(value) for value in region) for region in re.findall(r'<north>(.*?)</north><south>(.*?)</south><east>(.*?)</east><west>(.*?)</west>', kml)]
+    lods = [(int(low), int(high)) for low, high in re.findall(r'<minLodPixels>(-?\d+)</minLodPixels><maxLodPixels>(-?\d+)</maxLodPixels>', kml)]
+    points = [len(coordinates.split()) for coordinates in re.findall(r'<coordinates>(.*?)</coordinates>', kml)]
+    return regions, lods, points
+
+
+def test_flight_lods_follow_flight_size():
+    # 200 x 200 m mapping flight (lawnmower rows 10 m apart, 0.3 m wiggle, 1 m up and down): version with tolerance T meters is shown
+    # until it is ~1 pixel off on screen - from ~200 / T pixels flight size on, finer version takes over
+    lon_scale = 111320 * math.cos(math.radians(56.95))
+    path = []
+    for k in range(3000):
+        row, step = divmod(k, 150)
+        x = step / 149 * 200 if row % 2 == 0 else 200 - step / 149 * 200
+        path.append((24.1 + x / lon_scale, 56.95 + (row * 10 + 0.3 * math.sin(k)) / 111320, 50 + math.sin(k / 7)))
+    regions, lods, points = flight_lods(path)
+    assert points[-1] == len(path) and points == sorted(points)
+    assert [low for low, high in lods] == [0, 2, 20, 196] # tolerances 100, 10, 1 m, full path
+    assert [high for low, high in lods] == [2, 20, 196, -1]
+
+
+def test_straight_flight_region_has_size():
+    regions, lods, points = flight_lods([(24.1, 56.95 + k * 1e-6, 50.0) for k in range(2000)])
+    north, south, east, west = regions[0]
+    assert east - west == pytest.approx(jpgfolder2kml.TILE_MIN_SIZE_DEGREES)
+    assert len(set(regions)) == 1 and lods[0][0] == 0 and lods[-1] == (lods[-2][1], -1)
+
+
+def kmz_links(kmz_path):
+    # links of kml files in kmz resolved as google earth does: from kml file inside archive, '../' above archive root 
+    # is folder of kmz. returns [(link, True if it is in archive, else file path on disk)]
+    links = []
+    with zipfile.ZipFile(kmz_path) as kmz:
+        names = kmz.namelist()
+        for name in names:
+            kml = html.unescape(kmz.read(name).decode('utf-8'))
+            for href in re.findall(r'<href>(.*?)</href>', kml) + re.findall(r'src="(.*?)"', kml) + re.findall(r'<SimpleData name="h">(.*?)</SimpleData>', kml):
+                if href.startswith('$['): continue # --compact balloon template, image link is in SimpleData h
+                resolved = posixpath.normpath(posixpath.join(posixpath.dirname(name), href))
+                links.append((href, resolved in names) if not resolved.startswith('../') else 
+                             (href, os.path.join(os.path.dirname(kmz_path), resolved[3:])))
+    return links
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_kmz_links_resolve(tmp_path, compact):
+    # two folders (set_of_2_files index linking their kmz), tiles packed into kmz, thumbnails next to kmz
+    root = str(tmp_path)
+    benchmark.generate_tree(root, 24, 2, 64, 48, 0)
+    results = jpgfolder2kml.process_tree(root, jpgfolder2kml.Options(kmz=True, tile_max=5, thumbnails=True, compact=compact, use_cache=False))
+    assert results['index_kml'].endswith('set_of_2_files.kmz')
+    for kmz_path in results['kml_files'] + [results['index_kml']]:
+        links = kmz_links(kmz_path)
+        assert links
+        for href, target in links:
+            assert target is True or os.path.isfile(target), (kmz_path, href)
+    assert any('tile_' in href for href, target in kmz_links(results['kml_files'][0])) # tiles are in kmz
+    assert any('.jpgfolder2kml_thumbs/' in href for href, target in kmz_links(results['kml_files'][0]))
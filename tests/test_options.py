@@ -0,0 +1,49 @@
+import glob, json, os, threading
+
+import benchmark
+import jpgfolder2kml
+
+
+def module_settings():
+    return {setting: getattr(jpgfolder2kml, setting) for setting in jpgfolder2kml.OPTION_SETTINGS.values()}
+
+
+def test_process_tree_restores_module_settings(tmp_path):
+    benchmark.generate_tree(str(tmp_path), 12, 1, 64, 48, 0)
+    before, before_path = module_settings(), jpgfolder2kml.folder_path
+    results = jpgfolder2kml.process_tree(str(tmp_path), jpgfolder2kml.Options(fgb=True, kmz=True, tile_max=5, use_cache=False))
+    assert results['kml_files'][0].endswith('.kmz') and glob.glob(str(tmp_path / '*_frames.fgb')) # options were used in run
+    assert module_settings() == before
+    assert jpgfolder2kml.folder_path == before_path
+
+
+def test_runs_in_threads_keep_own_options(tmp_path):
+    roots = [str(tmp_path / name) for name in ('kmz', 'kml')]
+    for root in roots: benchmark.generate_tree(root, 12, 1, 64, 48, 0)
+    runs = [threading.Thread(target=jpgfolder2kml.process_tree, args=(root, jpgfolder2kml.Options(kmz=kmz, use_cache=False)))
+            for root, kmz in zip(roots, (True, False))]
+    for run in runs: run.start()
+    for run in runs: run.join()
+    assert [sorted(os.path.splitext(name)[1] for name in os.listdir(root) if name.startswith('drone_')) for root in roots] == [['.kmz'], ['.kml']]
+
+
+def test_results_of_runs_are_separate(tmp_path):
+    roots = [str(tmp_path / name) for name in ('small', 'big')]
+    for root, count in zip(roots, (6, 12)): benchmark.generate_tree(root, count, 1, 64, 48, 0)
+    first = jpgfolder2kml.process_tree(roots[0], jpgfolder2kml.Options(tile_max=5, use_cache=False))
+    first_stats = repr(first['run_stats'])
+    second = jpgfolder2kml.process_tree(roots[1], jpgfolder2kml.Options(use_cache=False))
+    assert repr(first['run_stats']) == first_stats # second run did not change results of first
+    assert second['run_stats'] is not first['run_stats']
+    assert [folder['jpg_files'] for folder in first['run_stats']['folders']] == [6]
+    assert (first['run_stats']['folder'], first['run_stats']['settings']['tile_max']) == (roots[0], 5) # settings of run, not restored ones
+
+
+def test_report_has_settings_of_run(tmp_path):
+    root = str(tmp_path / 'images')
+    benchmark.generate_tree(root, 6, 1, 64, 48, 0)
+    report_path = str(tmp_path / 'run.json')
+    results = jpgfolder2kml.process_tree(root, jpgfolder2kml.Options(tile_max=5, use_cache=False))
+    jpgfolder2kml.write_run_report(report_path, results)
+    with open(report_path, encoding='UTF-8') as f: report = json.load(f)
+    assert (report['folder'], report['settings']['tile_max'], report['counters']['jpg_files']) == (root, 5, 6)
@@ -0,0 +1,56 @@
+import os, threading, time
+
+import benchmark
+import jpgfolder2kml
+from conftest import jpg_files
+
+LATENCY_MS = 30 # every file open waits this long (slow media stand-in, see benchmark.SlowOpen) - well over timer and scheduling noise
+FILES = 24
+
+
+class CountingOpen(benchmark.SlowOpen):
+    # SlowOpen that counts opens waiting at the same time
+    def __init__(self, latency_ms):
+        super().__init__(latency_ms)
+        self.lock = threading.Lock()
+        self.waiting = self.max_waiting = 0
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            return super().__call__(*args, **kwargs)
+        finally:
+            with self.lock: self.waiting -= 1
+
+
+def read_details(files):
+    start = time.perf_counter()
+    details = jpgfolder2kml.get_usefuldetail_list_with_stats(files)
+    return time.perf_counter() - start, [d for d, stats in details]
+
+
+def test_prefetch_is_faster_on_slow_media(synthetic_tree, monkeypatch):
+    files = jpg_files(synthetic_tree)[:FILES]
+    monkeypatch.setattr(jpgfolder2kml, 'open', CountingOpen(LATENCY_MS), raising=False)
+    monkeypatch.setattr(jpgfolder2kml, 'PREFETCH', 0)
+    plain_seconds, plain = read_details(files)
+    assert plain_seconds >= len(files) * LATENCY_MS / 1000 # each image waits once
+    assert jpgfolder2kml.open.max_waiting == 1
+    monkeypatch.setattr(jpgfolder2kml, 'open', CountingOpen(LATENCY_MS), raising=False)
+    monkeypatch.setattr(jpgfolder2kml, 'PREFETCH', 16)
+    prefetch_seconds, prefetched = read_details(files)
+    assert prefetched == plain
+    assert jpgfolder2kml.open.max_waiting > 1 # reads overlap
+    assert prefetch_seconds < plain_seconds / 2, (prefetch_seconds, plain_seconds)
+
+
+def test_worker_processes_are_throttled_too(tmp_path, monkeypatch):
+    # with --workers, images are read in worker processes - they must wait on opens as well, or benchmark speedup is wrong
+    benchmark.generate_tree(str(tmp_path), 40, 1, 64, 48, 0)
+    latency_ms = 50
+    monkeypatch.setattr(jpgfolder2kml, 'open', benchmark.SlowOpen(latency_ms), raising=False)
+    results = jpgfolder2kml.process_tree(str(tmp_path), jpgfolder2kml.Options(workers=2, prefetch=0, use_cache=False))
+    assert results['counters']['jpg_files'] == 40
+    assert results['elapsed_s'] >= 40 * latency_ms / 1000 / 2 # 2 workers, waits do not overlap within worker
@@ -0,0 +1,16 @@
+import pstats
+
+import benchmark
+import jpgfolder2kml
+
+
+def test_pipeline_threads_are_profiled(tmp_path, monkeypatch):
+    # --profile: walker and kml writer threads have their own profilers, merged into report
+    benchmark.generate_tree(str(tmp_path), 12, 2, 64, 48, 0)
+    monkeypatch.setattr(jpgfolder2kml, 'PROFILERS', [])
+    jpgfolder2kml.process_tree(str(tmp_path), jpgfolder2kml.Options(fgb=True, use_cache=False))
+    assert len(jpgfolder2kml.PROFILERS) == 2
+    functions = {function for file, line, function in pstats.Stats(*jpgfolder2kml.PROFILERS).stats}
+    assert {'walk_folders', 'list_to_kml', 'list_to_fgb'} <= functions
+    top = jpgfolder2kml.profile_top_functions(jpgfolder2kml.PROFILERS, 1000)
+    assert any(row['function'].endswith('(list_to_kml)') for row in top)
@@ -0,0 +1,54 @@
+import os, re
+
+import numpy
+import pytest
+
+import benchmark
+import jpgfolder2kml
+from test_catalog import folder_table
+
+
+@pytest.fixture(scope='module')
+def table(synthetic_tree):
+    return folder_table(synthetic_tree)
+
+
+@pytest.mark.parametrize('max_per_tile', [1, 5, 20])
+def test_quadtree_tiles_cover_images_once(table, max_per_tile):
+    tiles = jpgfolder2kml.quadtree_tiles(table, max_per_tile)
+    assert len(tiles) >= len(table) / max_per_tile
+    assert sorted(i for quadkey, region, indexes in tiles for i in indexes) == list(range(len(table)))
+    quadkeys = [quadkey for quadkey, region, indexes in tiles]
+    assert quadkeys == sorted(quadkeys) and not any(a != b and b.startswith(a) for a in quadkeys for b in quadkeys) # leaves only
+    for quadkey, (west, south, east, north), indexes in tiles:
+        assert 0 < len(indexes) <= max_per_tile and indexes == sorted(indexes) # time order kept
+        lon_lat = table.lon_lat_alt[indexes, :2]
+        assert (lon_lat >= (west, south)).all() and (lon_lat <= (east, north)).all()
+
+
+def test_images_at_one_spot_stop_at_depth_limit(table):
+    spot = table.take(range(len(table))) # copy
+    spot.lon_lat_alt = numpy.repeat(table.lon_lat_alt[:1], len(table), axis=0)
+    (quadkey, (west, south, east, north), indexes), = jpgfolder2kml.quadtree_tiles(spot, 5)
+    assert len(quadkey) == jpgfolder2kml.TILE_MAX_DEPTH and len(indexes) == len(table)
+    assert east > west and north > south # padded, region is shown
+
+
+def test_tiled_kml_links_tiles_by_region(tmp_path):
+    root = str(tmp_path)
+    benchmark.generate_tree(root, 24, 1, 64, 48, 0)
+    kml_path = jpgfolder2kml.process_tree(root, jpgfolder2kml.Options(tile_max=5, use_cache=False))['kml_files'][0]
+    with open(kml_path, encoding='UTF-8') as f: kml = f.read()
+    links = re.findall(r'<NetworkLink><name>\S+ \((\d+)\)</name><Region><LatLonAltBox>.*?</LatLonAltBox>'
+                       r'<Lod><minLodPixels>(\d+)</minLodPixels><maxLodPixels>-1</maxLodPixels></Lod></Region>'
+                       r'<Link><href>(.*?)</href><viewRefreshMode>onRegion</viewRefreshMode></Link></NetworkLink>', kml)
+    assert len(links) == kml.count('<NetworkLink>') > 1
+    assert '<Point>' not in kml # pins are in tiles only
+    images = 0
+    for count, min_lod_pixels, href in links:
+        assert int(min_lod_pixels) == jpgfolder2kml.TILE_MIN_LOD_PIXELS
+        with open(os.path.join(root, href), encoding='UTF-8') as f: tile = f.read()
+        assert tile.count('<Point>') == int(count) <= 5
+        images += int(count)
+    assert images == 24
+    assert sorted(href.split('/')[1] for count, min_lod_pixels, href in links) == sorted(os.listdir(kml_path[:-4] + '_tiles'))
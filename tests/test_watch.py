@@ -0,0 +1,34 @@
+import os, re, shutil, threading, time
+
+import benchmark
+import jpgfolder2kml
+
+
+def test_watch_batch_keeps_rebuilt_cache(tmp_path, monkeypatch):
+    # --watch --rebuild-cache: batch adds to folder cache rebuilt by first pass, flight line continues from last cached image
+    staging, root = str(tmp_path / 'card'), str(tmp_path / 'folder')
+    benchmark.generate_tree(staging, 12, 1, 64, 48, 0)
+    os.makedirs(root)
+    names = sorted(os.listdir(staging))
+    for name in names[:10]: shutil.copy(os.path.join(staging, name), root)
+    monkeypatch.setattr(jpgfolder2kml, 'make_watcher', jpgfolder2kml.PollingWatcher)
+    monkeypatch.setattr(jpgfolder2kml, 'WATCH_POLL_SECONDS', 0.2)
+    monkeypatch.setattr(jpgfolder2kml, 'WATCH_SETTLE_SECONDS', 0.2)
+    options = jpgfolder2kml.Options(rebuild_cache=True)
+    results = jpgfolder2kml.process_tree(root, options)
+    stop, started = threading.Event(), threading.Event()
+    watch = threading.Thread(target=jpgfolder2kml.watch_tree, args=(root, options, results['index_kml']), kwargs={'on_start': lambda kml: started.set(), 'stop': stop})
+    watch.start()
+    try:
+        assert started.wait(10)
+        for name in names[10:]: shutil.copy(os.path.join(staging, name), root)
+        batch_kml = os.path.join(root, jpgfolder2kml.WATCH_DIRNAME, 'batch_0001.kml')
+        deadline = time.time() + 10
+        while not os.path.exists(batch_kml) and time.time() < deadline: time.sleep(0.1)
+    finally:
+        stop.set()
+        watch.join()
+    assert sorted(jpgfolder2kml.load_folder_cache(root)) == names
+    with open(batch_kml, encoding='UTF-8') as f:
+        flight = re.search(r'<name>flight</name>.*?<coordinates>(.*?)</coordinates>', f.read(), re.S).group(1)
+    assert len(flight.split()) == 3 # last image of first pass and 2 new ones
@@ -0,0 +1,21 @@
+import os
+
+import jpgfolder2kml
+
+
+def run(root, workers, capsys):
+    results = jpgfolder2kml.process_tree(root, jpgfolder2kml.Options(workers=workers, use_cache=False))
+    outputs = {}
+    for kml_path in results['kml_files']:
+        with open(kml_path, 'rb') as f: outputs[os.path.relpath(kml_path, root)] = f.read()
+    return outputs, results['run_stats']['errors'], capsys.readouterr().out.splitlines() # per-file lines, in same order
+
+
+def test_worker_processes_give_same_output(synthetic_tree, capsys):
+    serial = run(synthetic_tree, 1, capsys)
+    parallel = run(synthetic_tree, 3, capsys)
+    outputs, errors, printed = serial
+    assert len(outputs) == 2 and errors and len(printed) > 100 # both folders, no gps images are counted
+    assert parallel[0] == outputs # byte-identical kml
+    assert parallel[1] == errors
+    assert parallel[2] == printed